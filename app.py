@@ -1,12 +1,11 @@
 import streamlit as st
 import pandas as pd
 import datetime
-from streamlit_gsheets import GSheetsConnection
-from config.settings import MY_TEAM, OFFICIAL_GAME_TYPES, SPREADSHEET_URL
-from utils.db import load_batting_data, load_pitching_data
+from config.settings import MY_TEAM, OFFICIAL_GAME_TYPES
+from utils.db import get_cached_grounds, get_cached_opponents
 from utils.ui import load_css, fmt_player_name
 from utils.players import get_active_players
-from views import batting, pitching, team_stats, personal_stats, edit_data, analysis, ideal_order, player_management
+from utils.dataset import get_dataset, date_rows, prefetch
 
 ICON_URL = "https://raw.githubusercontent.com/kagura-bc/baseball-app/main/static/logo-192.png?v=3"
 
@@ -61,38 +60,6 @@ if not st.session_state["is_logged_in"]:
     show_login_screen()
     st.stop()
 
-# ==========================================
-# 📊 データ読み込み
-# ==========================================
-df_batting = load_batting_data()
-df_pitching = load_pitching_data()
-
-ALL_PLAYERS, PLAYER_NUMBERS = get_active_players()
-st.session_state["shared_player_numbers"] = PLAYER_NUMBERS
-def local_fmt(name):
-    return fmt_player_name(name, st.session_state.get("shared_player_numbers", {}))
-
-@st.cache_data(ttl=60)
-def get_cached_grounds():
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    try:
-        df_ground = conn.read(spreadsheet=SPREADSHEET_URL, worksheet="グラウンド登録", ttl=0)
-        return df_ground["グラウンド名"].dropna().tolist() if "グラウンド名" in df_ground.columns else ["その他"]
-    except Exception:
-        return ["その他"]
-
-@st.cache_data(ttl=60)
-def get_cached_opponents():
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    try:
-        df_opp = conn.read(spreadsheet=SPREADSHEET_URL, worksheet="相手チーム登録", ttl=0)
-        return df_opp["チーム名"].dropna().tolist() if "チーム名" in df_opp.columns else ["その他"]
-    except Exception:
-        return ["その他"]
-
-GROUND_LIST = get_cached_grounds()
-OPPONENTS_LIST = get_cached_opponents()
-
 def safe_index(lst, val):
     try:
         return lst.index(val)
@@ -109,11 +76,44 @@ page = st.sidebar.radio(
     [" 📝 試合データ入力", " 🏆 チーム成績", " 📊 個人成績", " 📈 データ分析", " 🔧 データ修正", " 👥 選手管理"]
 )
 
+# ==========================================
+# 📊 データ読み込み
+# ==========================================
+# 画面のモジュールと、その画面だけが使うマスタ（選手・グラウンド・相手チーム）は
+# 選ばれた画面の分岐の中で読み込む（開いていない画面のぶんの import や読み込みをしない）
+
+# 画面ごとに使うワークシート（キャッシュが空なら同時に読み込んでおく）
+PAGE_SHEETS = {
+    " 📝 試合データ入力": ("batting", "pitching", "players", "grounds", "opponents"),
+    " 🏆 チーム成績": ("batting", "pitching", "players"),
+    " 📊 個人成績": ("batting", "pitching", "players"),
+    " 📈 データ分析": ("batting", "pitching", "players"),
+    " 🔧 データ修正": ("batting", "pitching", "players", "grounds", "opponents"),
+}
+prefetch(*PAGE_SHEETS.get(page, ()))
+
+if page in PAGE_SHEETS:
+    # 全セッション共有のデータを、このセッション用の浅いコピーで受け取る
+    dataset = get_dataset()
+    df_batting = dataset["batting"]
+    df_pitching = dataset["pitching"]
+    # 成績画面用：打席結果の判定フラグ付き（データ更新時のみ再計算）
+    df_batting_stats = dataset["batting_stats"]
+
+def local_fmt(name):
+    return fmt_player_name(name, st.session_state.get("shared_player_numbers", {}))
+
 # ==========================================
 # 💻 メイン画面の表示制御
 # ==========================================
 if page == " 📝 試合データ入力":
-    
+    from views import batting, pitching, ideal_order, edit_data
+
+    ALL_PLAYERS, PLAYER_NUMBERS = get_active_players()
+    st.session_state["shared_player_numbers"] = PLAYER_NUMBERS
+    GROUND_LIST = get_cached_grounds()
+    OPPONENTS_LIST = get_cached_opponents()
+
     st.markdown("### 📝 試合データ入力")
 
     # --- URLパラメータからの基本復元 ---
@@ -147,8 +147,7 @@ if page == " 📝 試合データ入力":
         has_data_for_date = False
 
         if not df_batting.empty and "日付" in df_batting.columns:
-            df_batting["_date_str"] = pd.to_datetime(df_batting["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
-            date_matched = df_batting[df_batting["_date_str"] == selected_date_str]
+            date_matched = date_rows("batting", selected_date_str)
             if not date_matched.empty:
                 has_data_for_date = True
                 latest_r = date_matched.iloc[-1]
@@ -340,22 +339,27 @@ if page == " 📝 試合データ入力":
         )
 
     with tab_ideal:
-        ideal_order.show_ideal_order_tab(df_batting, df_pitching=df_pitching)
+        ideal_order.show_ideal_order_tab(df_batting_stats, df_pitching=df_pitching)
         
     with tab_edit:
         edit_data.show_edit_page(df_batting, df_pitching)
 
 elif page == " 🏆 チーム成績":
-    team_stats.show_team_stats(df_batting, df_pitching)
+    from views import team_stats
+    team_stats.show_team_stats(df_batting_stats, df_pitching)
 
 elif page == " 📊 個人成績":
-    personal_stats.show_personal_stats(df_batting, df_pitching)
+    from views import personal_stats
+    personal_stats.show_personal_stats(df_batting_stats, df_pitching)
 
 elif page == " 📈 データ分析":
-    analysis.show_analysis_page(df_batting, df_pitching)
+    from views import analysis
+    analysis.show_analysis_page(df_batting_stats, df_pitching)
 
 elif page == " 🔧 データ修正":
+    from views import edit_data
     edit_data.show_edit_page(df_batting, df_pitching)
 
 elif page == " 👥 選手管理":
+    from views import player_management
     player_management.show_player_management()
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""成績集計まわりの処理時間を、合成データのシーズン数を変えて計測する
+
+    python -m bench.run                        # 1・10・50 シーズンで計測し bench_output.txt に出力
+    python -m bench.run --seasons 1,5 --json bench.json
+    python -m bench.run --compare bench.json   # 前回の JSON と比べて遅くなった項目に印を付ける
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import streamlit as st
+from streamlit import config as st_config
+from streamlit import logger as st_logger
+
+# ==========================================
+# ⚙️ Streamlit を画面なし（bare モード）で動かす準備
+# ==========================================
+# ランタイムなしで呼ぶと、ウィジェットは既定値を返し描画内容はどこにも送られない。
+# 設定モジュールが Secrets を読むので、計測用のダミーを先に読ませておく。
+_secrets_path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "secrets.toml")
+with open(_secrets_path, "w", encoding="utf-8") as f:
+    f.write('SPREADSHEET_URL = "bench://synthetic"\nHIDDEN_PLAYERS_TOTAL = []\n')
+st_config.set_option("secrets.files", [_secrets_path])
+st_logger.set_log_level("error")
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic import make_season_data  # noqa: E402
+from utils import cache_registry  # noqa: E402
+from utils.stats_kernel import enrich_batting  # noqa: E402
+from utils.game_summary import build_game_summary  # noqa: E402
+from utils.line_score import build_line_scores, line_score_for, game_key  # noqa: E402
+from utils.ui import render_scoreboard  # noqa: E402
+from views import team_stats, personal_stats, analysis, ideal_order  # noqa: E402
+
+DATA_LOADERS = ("load_batting_data", "load_pitching_data", "_load_players_df")
+
+def _install_data(df_batting, df_pitching, df_players):
+    """シートから読む関数を合成データを返す関数に差し替え、キャッシュを空にする"""
+    frames = {
+        "load_batting_data": lambda: df_batting,
+        "load_pitching_data": lambda: df_pitching,
+        "_load_players_df": lambda: df_players,
+    }
+    for name, module in list(sys.modules.items()):
+        if not name.startswith(("utils.", "views.")):
+            continue
+        for attr in DATA_LOADERS:
+            if hasattr(module, attr):
+                setattr(module, attr, frames[attr])
+    _clear_caches()
+
+def _clear_caches():
+    for entry in cache_registry._REGISTRY.values():
+        entry["func"].clear()
+    team_stats.calc_split_metrics.clear()
+    ideal_order._lineup_inputs.clear()
+    personal_stats._ranking_engine.clear()
+    analysis._game_summary.clear()
+
+def _time(func, repeat):
+    """キャッシュを空にしてから func を repeat 回実行した所要時間（ミリ秒）"""
+    samples = []
+    for _ in range(repeat):
+        _clear_caches()
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples)}
+
+def _cases(df_b, df_p, df_players):
+    df_b_stats = enrich_batting(df_b)
+    summary = build_game_summary(df_b, df_p)
+    tables = build_line_scores(df_b, df_p)
+    keys = [game_key(d.strftime('%Y-%m-%d'), o, t) for d, o, t in summary[["日付", "対戦相手", "試合種別"]].itertuples(index=False)]
+    last = keys[0]
+
+    def _ideal_order():
+        st.session_state["ideal_order_selected_players"] = df_players["選手名"].head(12).tolist()
+        ideal_order.show_ideal_order_tab(df_b_stats, df_p)
+
+    def _all_scoreboards():
+        for key in keys:
+            render_scoreboard(None, None, key[0], key[2], "", key[1], line=line_score_for(tables, key))
+
+    return {
+        "stats_kernel.enrich_batting": lambda: enrich_batting(df_b),
+        "game_summary.build": lambda: build_game_summary(df_b, df_p),
+        "team_stats.split_metrics": lambda: team_stats.calc_split_metrics(summary),
+        "line_score.build": lambda: build_line_scores(df_b, df_p),
+        "ui.render_scoreboard (1試合・直接)": lambda: render_scoreboard(df_b, df_p, last[0], last[2], "", last[1]),
+        "ui.render_scoreboard (全試合・表引き)": _all_scoreboards,
+        "page.team_stats": lambda: team_stats.show_team_stats(df_b_stats, df_p),
+        "page.personal_stats": lambda: personal_stats.show_personal_stats(df_b_stats, df_p),
+        "page.analysis": lambda: analysis.show_analysis_page(df_b_stats, df_p),
+        "page.ideal_order": _ideal_order,
+    }
+
+def run(seasons_list, repeat, games_per_season):
+    results = []
+    for seasons in seasons_list:
+        df_b, df_p, df_players = make_season_data(seasons=seasons, games_per_season=games_per_season)
+        _install_data(df_b, df_p, df_players)
+        for name, func in _cases(df_b, df_p, df_players).items():
+            try:
+                res = _time(func, repeat)
+                res["error"] = ""
+            except Exception as e:
+                res = {"median_ms": float("nan"), "min_ms": float("nan"), "error": f"{type(e).__name__}: {e}"}
+            results.append({"seasons": seasons, "batting_rows": len(df_b), "pitching_rows": len(df_p), "case": name, **res})
+    return results
+
+def format_report(results, baseline=None, threshold=1.2):
+    """計測結果を表にする（baseline があれば比率と、threshold 倍を超えた項目に印を付ける）"""
+    base = {(r["seasons"], r["case"]): r["median_ms"] for r in (baseline or [])}
+    lines = []
+    for seasons in sorted({r["seasons"] for r in results}):
+        rows = [r for r in results if r["seasons"] == seasons]
+        lines.append(f"## {seasons} シーズン（打撃 {rows[0]['batting_rows']} 行 / 投手 {rows[0]['pitching_rows']} 行）")
+        for r in rows:
+            line = f"  {r['case']:<40} median {r['median_ms']:>10.1f} ms   min {r['min_ms']:>10.1f} ms"
+            prev = base.get((seasons, r["case"]))
+            if prev:
+                ratio = r["median_ms"] / prev
+                line += f"   x{ratio:.2f}" + ("  ⚠️ 遅くなっています" if ratio > threshold else "")
+            if r["error"]:
+                line += f"   ❌ {r['error']}"
+            lines.append(line)
+        lines.append("")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="成績集計のベンチマーク")
+    parser.add_argument("--seasons", default="1,10,50", help="計測するシーズン数（カンマ区切り）")
+    parser.add_argument("--games", type=int, default=25, help="1シーズンあたりの試合数")
+    parser.add_argument("--repeat", type=int, default=3, help="1項目あたりの計測回数")
+    parser.add_argument("--output", default="bench_output.txt", help="レポートの出力先")
+    parser.add_argument("--json", help="計測結果を JSON で保存するパス")
+    parser.add_argument("--compare", help="比較対象にする前回の JSON")
+    parser.add_argument("--threshold", type=float, default=1.2, help="遅くなったとみなす倍率")
+    args = parser.parse_args(argv)
+
+    seasons_list = [int(s) for s in args.seasons.split(",") if s.strip()]
+    results = run(seasons_list, args.repeat, args.games)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = format_report(results, baseline, args.threshold)
+    print(report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""差分取り込み（ウォーターマーク以降の行だけを読む）の結果が、全件の読み込みと一致するかを確かめる
+
+    python -m bench.sync_check               # 打撃成績・投手成績の両方を確認し、食い違いがあれば終了コード 1
+    python -m bench.sync_check --seasons 3
+
+合成データの前半をシートに書いて全件を取り込み（スナップショットを作る）、残りを別の端末が
+追記した想定で足してから、差分で追いついたデータと全件を読み直したデータを比べる。
+比べるのは読み込みの最後に通す型の詰め直し（カテゴリ型・Int16）の後の DataFrame。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import warnings
+
+import pandas as pd
+from streamlit import config as st_config
+from streamlit import logger as st_logger
+
+# ==========================================
+# ⚙️ 一時ディレクトリのローカル保存先で動かす準備
+# ==========================================
+# 保存先（CSV）とスナップショットはどちらも一時ディレクトリに置き、手元のデータには触れない。
+_workdir = tempfile.mkdtemp(prefix="sync_check_")
+_secrets_path = os.path.join(_workdir, "secrets.toml")
+with open(_secrets_path, "w", encoding="utf-8") as f:
+    f.write(
+        'SPREADSHEET_URL = "bench://synthetic"\nHIDDEN_PLAYERS_TOTAL = []\n'
+        f'STORAGE_BACKEND = "local"\nLOCAL_STORAGE_DIR = "{os.path.join(_workdir, "sheets")}"\n'
+    )
+st_config.set_option("secrets.files", [_secrets_path])
+st_logger.set_log_level("error")
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(_workdir)
+
+from bench.synthetic import make_season_data  # noqa: E402
+from utils import db  # noqa: E402
+from utils.snapshot import read_snapshot  # noqa: E402
+from utils.storage import get_storage  # noqa: E402
+
+WORKSHEETS = {"打撃成績": db._normalize_batting, "投手成績": db._normalize_pitching}
+
+def check(worksheet, normalize, sheet_df, split=0.5):
+    """sheet_df の前半を全件で、後半を差分で取り込んだ結果が、全件の読み込みと同じなら None、違えば食い違いの説明"""
+    storage = get_storage()
+    head = int(len(sheet_df) * split)
+    storage.update(worksheet, sheet_df.iloc[:head])
+    db._pull_full(worksheet, normalize)
+
+    # 別の端末からの追記（手元のスナップショットには入っていない行）
+    storage.append_records(worksheet, sheet_df.iloc[head:].to_dict("records"))
+    snap, meta = read_snapshot(worksheet)
+    synced = db._prepare(db._pull_delta(worksheet, normalize, snap, meta))
+    full = db._prepare(db._pull_full(worksheet, normalize))
+
+    try:
+        pd.testing.assert_frame_equal(synced, full)
+    except AssertionError as e:
+        return str(e)
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="差分取り込みと全件読み込みの一致確認")
+    parser.add_argument("--seasons", type=int, default=1, help="合成データのシーズン数")
+    args = parser.parse_args(argv)
+
+    df_b, df_p, _ = make_season_data(seasons=args.seasons)
+    sheets = {"打撃成績": df_b, "投手成績": df_p}
+    failed = False
+    for worksheet, normalize in WORKSHEETS.items():
+        sheet_df = db.to_sheet_frame(sheets[worksheet]).drop(columns=["Year"])
+        diff = check(worksheet, normalize, sheet_df)
+        print(f"{worksheet}: {'OK' if diff is None else '❌ 食い違いがあります'}")
+        if diff is not None:
+            print(diff)
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import datetime
+import numpy as np
+import pandas as pd
+from config.settings import OFFICIAL_GAME_TYPES
+from utils.db import _normalize_batting, _normalize_pitching, _prepare
+
+# ==========================================
+# 🧪 ベンチマーク用の合成データ
+# ==========================================
+# 実際のシートと同じ列構成・結果の語彙で、打撃成績／投手成績／選手登録を
+# 任意のシーズン数ぶん生成する。シード固定なので毎回同じデータになる。
+# 読み込み直後と同じ形にするため、最後に utils.db の正規化と派生列・型の詰め直しを通す。
+
+# 結果の出現比率（草野球の1打席あたりの目安）
+BAT_RESULTS = {
+    "凡退(ゴロ)": 0.24, "凡退(フライ)": 0.18, "三振": 0.17, "単打": 0.12, "二塁打": 0.04,
+    "三塁打": 0.01, "本塁打": 0.01, "四球": 0.10, "死球": 0.02, "犠打(ゴロ)": 0.02,
+    "犠打(フライ)": 0.01, "犠飛": 0.01, "失策(ゴロ)": 0.03, "失策(フライ)": 0.01,
+    "野選": 0.01, "併殺打": 0.01,
+}
+OUT_COUNTS = {
+    "凡退(ゴロ)": 1, "凡退(フライ)": 1, "三振": 1, "犠打(ゴロ)": 1, "犠打(フライ)": 1,
+    "犠飛": 1, "野選": 1, "併殺打": 2,
+}
+HIT_RESULTS = {"単打", "二塁打", "三塁打", "本塁打"}
+POSITIONS = ["投", "捕", "一", "二", "三", "遊", "左", "中", "右"]
+GAME_TYPES = ["練習試合"] * 3 + OFFICIAL_GAME_TYPES
+OPPONENTS = [f"チーム{c}" for c in "ABCDEFGHIJKLMNOPQRST"]
+GROUNDS = [f"グラウンド{i}" for i in range(1, 9)]
+INNINGS_PER_GAME = 7
+
+def make_players(n_players=30):
+    """選手登録シート相当の DataFrame"""
+    return pd.DataFrame({
+        "選手名": [f"選手{i:02d}" for i in range(n_players)],
+        "背番号": [str(i + 1) for i in range(n_players)],
+        "成績非表示": [False] * n_players,
+        "オーダー非表示": [False] * n_players,
+    })
+
+def _half_inning(rng, results, weights):
+    """3アウトになるまでの打席結果の列"""
+    seq, outs = [], 0
+    while outs < 3:
+        res = results[rng.choice(len(results), p=weights)]
+        seq.append(res)
+        outs += OUT_COUNTS.get(res, 0)
+    return seq
+
+def _runs_for(rng, res):
+    if res == "本塁打":
+        return 1 + int(rng.integers(0, 3))
+    if res in HIT_RESULTS or res.startswith("失策"):
+        return int(rng.random() < 0.35)
+    return int(res == "犠飛")
+
+def make_season_data(seasons=1, games_per_season=25, n_players=30, team_record_ratio=0.15, seed=0):
+    """(打撃成績, 投手成績, 選手登録) の DataFrame を返す"""
+    rng = np.random.default_rng(seed)
+    players = make_players(n_players)
+    names = players["選手名"].tolist()
+    pitchers = names[:4]
+    results = list(BAT_RESULTS)
+    weights = np.array(list(BAT_RESULTS.values()))
+    weights = weights / weights.sum()
+
+    bat_rows, pit_rows = [], []
+    start_year = datetime.date.today().year - seasons + 1
+    for season in range(seasons):
+        year = start_year + season
+        days = np.sort(rng.choice(np.arange(60, 330), size=games_per_season, replace=False))
+        for day in days:
+            date_str = (datetime.date(year, 1, 1) + datetime.timedelta(days=int(day))).strftime("%Y-%m-%d")
+            game = {
+                "日付": date_str, "グラウンド": GROUNDS[rng.integers(len(GROUNDS))],
+                "対戦相手": OPPONENTS[rng.integers(len(OPPONENTS))],
+                "試合種別": GAME_TYPES[rng.integers(len(GAME_TYPES))], "スコアラー": names[-1],
+            }
+
+            # 一部の試合は試合後にチーム記録だけをまとめて入力した想定
+            if rng.random() < team_record_ratio:
+                is_top = rng.random() < 0.5
+                bat_rows.append({**game, "イニング": "まとめ入力", "選手名": "チーム記録", "位置": "先攻" if is_top else "後攻",
+                                 "結果": "", "得点": int(rng.integers(0, 12)), "打点": 0, "盗塁": int(rng.integers(0, 5))})
+                pit_rows.append({**game, "イニング": "まとめ入力", "選手名": "チーム記録", "投手名": "チーム記録",
+                                 "結果": "", "失点": int(rng.integers(0, 12)), "自責点": 0, "アウト数": 21, "勝敗": "ー"})
+                continue
+
+            is_top = rng.random() < 0.5
+            lineup = list(rng.choice(names, size=9, replace=False))
+            bat_side, pit_side = ("表", "裏") if is_top else ("裏", "表")
+            innings = INNINGS_PER_GAME + int(rng.random() < 0.05) * int(rng.integers(1, 3))
+            batter = 0
+            runs_for = runs_against = 0
+            starter = pitchers[rng.integers(len(pitchers))]
+
+            for inn in range(1, innings + 1):
+                for res in _half_inning(rng, results, weights):
+                    runs = _runs_for(rng, res)
+                    runs_for += runs
+                    bat_rows.append({
+                        **game, "イニング": f"{inn}回{bat_side}", "選手名": lineup[batter % 9],
+                        "位置": POSITIONS[batter % 9], "打順": batter % 9 + 1, "打球方向": POSITIONS[rng.integers(len(POSITIONS))],
+                        "攻守": "先攻 (表)" if is_top else "後攻 (裏)", "結果": res, "得点": runs, "打点": runs,
+                        "盗塁": int(res in HIT_RESULTS and rng.random() < 0.15), "種別": "詳細",
+                    })
+                    batter += 1
+
+                for idx, res in enumerate(_half_inning(rng, results, weights)):
+                    runs = _runs_for(rng, res)
+                    runs_against += runs
+                    pit_rows.append({
+                        **game, "イニング": f"{inn}回{pit_side}", "選手名": starter, "投手名": starter,
+                        "結果": res, "失点": runs, "自責点": 0 if res.startswith("失策") else runs,
+                        "アウト数": OUT_COUNTS.get(res, 0), "被安打": int(res in HIT_RESULTS),
+                        "奪三振": int(res == "三振"), "処理野手": POSITIONS[rng.integers(len(POSITIONS))],
+                        "勝敗": "ー", "種別": f"詳細:{idx + 1}番打者",
+                    })
+
+            if runs_for != runs_against:
+                pit_rows.append({**game, "イニング": "試合終了", "選手名": starter, "投手名": starter, "結果": "",
+                                 "失点": 0, "自責点": 0, "アウト数": 0,
+                                 "勝敗": "勝利" if runs_for > runs_against else "敗戦"})
+
+    df_batting = _prepare(_normalize_batting(pd.DataFrame(bat_rows)))
+    df_pitching = _prepare(_normalize_pitching(pd.DataFrame(pit_rows)))
+    return df_batting, df_pitching, players
@@ -7,6 +7,26 @@ MY_TEAM = "KAGURA"
 # スプレッドシート情報 (Secretsから取得)
 SPREADSHEET_URL = st.secrets["SPREADSHEET_URL"]
 
+# ローカルスナップショットの保存先と、シートへ差分を確認しに行くまでの秒数
+SNAPSHOT_DIR = ".snapshots"
+SNAPSHOT_MAX_AGE = 60
+# シート上で直接編集された分を拾うため、全件を取り直す間隔（秒）
+FULL_SYNC_INTERVAL = 60 * 30
+
+# データの保存先（"gsheets" またはオフライン検証・負荷計測用の "local"）
+STORAGE_BACKEND = st.secrets.get("STORAGE_BACKEND", "gsheets")
+# local のときの CSV の置き場所と、1操作ごとに待たせる秒数（通信待ちの再現用）
+LOCAL_STORAGE_DIR = st.secrets.get("LOCAL_STORAGE_DIR", ".local_sheets")
+LOCAL_STORAGE_LATENCY = float(st.secrets.get("LOCAL_STORAGE_LATENCY", 0))
+
+# 試合中の記録をシートへまとめて送る間隔（秒）と1回に送る最大行数、失敗時の再送間隔の上限（秒）
+WRITE_FLUSH_INTERVAL = 2
+WRITE_BATCH_SIZE = 50
+WRITE_RETRY_MAX_BACKOFF = 60
+# 送信前の記録を書き残すジャーナル（SQLite）の置き場所と、送信済みの行を残す日数
+JOURNAL_PATH = ".journal/write_journal.sqlite3"
+JOURNAL_RETENTION_DAYS = 7
+
 # ポジションリスト
 ALL_POSITIONS = ["", "DH", "投", "捕", "一", "二", "三", "遊", "左", "中", "右"] 
 
@@ -0,0 +1,44 @@
+# ==========================================
+# 🗂️ キャッシュレジストリ
+# ==========================================
+# st.cache_data.clear() はアプリ内のすべてのキャッシュを捨ててしまうため、
+# 書き込み後は関係するキャッシュだけを名前で指定して破棄する。
+# 依存関係（例：選手一覧 → 成績表示用の選手一覧）を登録しておけば、
+# 依存元を破棄したときに依存先もまとめて破棄される。
+
+_REGISTRY = {}
+
+def register_cache(name, depends_on=()):
+    """st.cache_data / st.cache_resource / swr_cache 関数を名前付きで登録するデコレーター"""
+    def decorator(func):
+        _REGISTRY[name] = {"func": func, "depends_on": tuple(depends_on)}
+        if hasattr(func, "on_refresh"):
+            # swr_cache が裏で値を入れ替えたら、古い値から作った依存先も作り直させる
+            func.on_refresh = lambda: invalidate_dependents(name)
+        return func
+    return decorator
+
+def _with_dependents(names):
+    targets = []
+    queue = list(names)
+    while queue:
+        name = queue.pop(0)
+        if name in targets:
+            continue
+        targets.append(name)
+        queue.extend(n for n, entry in _REGISTRY.items() if name in entry["depends_on"])
+    return targets
+
+def invalidate(*names):
+    """指定したキャッシュと、それに依存するキャッシュだけを破棄する"""
+    for name in _with_dependents(names):
+        entry = _REGISTRY.get(name)
+        if entry is not None:
+            entry["func"].clear()
+
+def invalidate_dependents(*names):
+    """指定したキャッシュに依存するキャッシュだけを破棄する（指定したもの自体は残す）"""
+    for name in _with_dependents(names):
+        entry = _REGISTRY.get(name)
+        if entry is not None and name not in names:
+            entry["func"].clear()
@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from types import MappingProxyType
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.cache_registry import register_cache
+from utils.db import load_batting_data, load_pitching_data, get_cached_grounds, get_cached_opponents, data_version, _stamp_version
+from utils.players import _load_players_df
+from utils.stats_kernel import enrich_batting
+
+# ==========================================
+# 🗃️ 全セッション共有のデータセット
+# ==========================================
+# st.cache_data は呼ぶたびに DataFrame を複製して返すため、利用者が増えると
+# そのぶんだけメモリを使う。読み込み済みの打撃・投手データ（と判定フラグ付きの打撃データ）は
+# st.cache_resource で1つだけ持ち、全セッションで同じものを参照する。
+#
+# 共有している DataFrame そのものは書き換えない約束。各画面には get_dataset() で
+# 浅いコピーを渡すので、列を足したり値を書き換えたりしても共有側には響かない
+# （pandas 3 で常に有効な Copy-on-Write により、書き換えた列だけがその場で複製される）。
+#
+# あわせて game_id・date_str ごとの行位置の索引を作っておき、入力画面などで
+# 「この試合（この日）の行」を全件を走査せずに取り出せるようにしている。
+
+INDEX_KEYS = ("game_id", "date_str")
+
+# ==========================================
+# 🚀 ワークシートの並行読み込み
+# ==========================================
+# キャッシュが空のとき（起動直後・更新直後）は、画面が使うワークシートを1枚ずつ
+# 順に読むと通信待ちが枚数ぶん積み重なる。prefetch() はキャッシュ名で指定した
+# 読み込み関数をスレッドで同時に呼び、それぞれのキャッシュを埋めておく。
+# 待ち時間はいちばん遅い1枚ぶんで済み、画面側の通常の呼び出しはキャッシュから返る。
+# 読み込みで例外が出た場合はここでは握りつぶし、画面側の呼び出しで改めて扱う。
+
+SHEET_LOADERS = {
+    "batting": load_batting_data,
+    "pitching": load_pitching_data,
+    "players": _load_players_df,
+    "grounds": get_cached_grounds,
+    "opponents": get_cached_opponents,
+}
+
+def prefetch(*names):
+    """names（キャッシュ名）の読み込みを並行して済ませておく"""
+    loaders = [SHEET_LOADERS[name] for name in names]
+    if len(loaders) < 2:
+        return
+    ctx = get_script_run_ctx()
+
+    def _attach_ctx():
+        # st.error などをこのセッションの画面に出せるよう、実行中のスクリプトの文脈を引き継ぐ
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    with ThreadPoolExecutor(max_workers=len(loaders), initializer=_attach_ctx) as pool:
+        for future in [pool.submit(loader) for loader in loaders]:
+            future.exception()
+
+def _positions(df):
+    """キーの値 → 行位置（昇順の配列）の辞書をキーごとに作る"""
+    if df.empty:
+        return {key: {} for key in INDEX_KEYS}
+    return {key: df.groupby(key, sort=False).indices for key in INDEX_KEYS}
+
+@register_cache("dataset", depends_on=("batting", "pitching"))
+@st.cache_resource(ttl=60)
+def _shared():
+    prefetch("batting", "pitching")
+    batting = load_batting_data()
+    pitching = load_pitching_data()
+    batting_stats = enrich_batting(batting)
+    # 判定フラグ付きの打撃データは元の打撃データから決まるので、バージョンもそこから付ける
+    _stamp_version(batting_stats, f"{data_version(batting)}:stats")
+    frames = {
+        "batting": batting,
+        "pitching": pitching,
+        # 成績画面用：打席結果の判定フラグ付き（データ更新時のみ再計算）
+        "batting_stats": batting_stats,
+    }
+    batting_pos = _positions(batting)
+    # 判定フラグ付きの打撃データは元の打撃データと行の並びが同じなので索引を共用する
+    positions = {"batting": batting_pos, "pitching": _positions(pitching), "batting_stats": batting_pos}
+    return MappingProxyType(frames), MappingProxyType(positions)
+
+def get_dataset():
+    """共有データセットを {"batting", "pitching", "batting_stats"} の浅いコピーで返す"""
+    frames, _ = _shared()
+    return {name: df.copy(deep=False) for name, df in frames.items()}
+
+def _rows_for(name, key, value):
+    frames, positions = _shared()
+    df = frames[name]
+    pos = positions[name][key].get(value)
+    return df.iloc[pos] if pos is not None else df.iloc[0:0]
+
+def game_rows(name, game_id):
+    """共有データセット name から1試合分の行を取り出す（試合の行数ぶんの手間で済む）"""
+    return _rows_for(name, "game_id", game_id)
+
+def date_rows(name, date_str):
+    """共有データセット name からその日の行を取り出す"""
+    return _rows_for(name, "date_str", date_str)
@@ -1,67 +1,342 @@
+import hashlib
+import time
 import streamlit as st
 import pandas as pd
-from streamlit_gsheets import GSheetsConnection
-from config.settings import SPREADSHEET_URL
+from pandas.io.parsers import TextParser
+from config.settings import SNAPSHOT_MAX_AGE, FULL_SYNC_INTERVAL
+from utils.storage import get_storage
+from utils.write_queue import pending_records, flush_pending
+from utils.cache_registry import register_cache
+from utils.swr import swr_cache
+from utils.snapshot import read_snapshot, write_snapshot, write_meta, is_fresh, invalidate_snapshot, drop_snapshot
 
-# 接続オブジェクトの作成
-def get_connection():
-    return st.connection("gsheets", type=GSheetsConnection)
+# ==========================================
+# 📝 差分書き込み
+# ==========================================
+# conn.update() はシートを全消去してから全行を書き直すため、1打席ごとに
+# 履歴全体を送信することになる。ここでは追加行・変更セルだけを送る。
+# なお読み込んだ DataFrame の index ラベル i はシートの i+2 行目に対応する
+# （1行目はヘッダー、dropna しても index は振り直さない）。
 
-@st.cache_data(ttl=60)
-def load_batting_data():
-    conn = get_connection()
-    expected_cols = ["日付", "打点", "盗塁", "得点", "位置", "グラウンド", "対戦相手", "試合種別", "イニング", "選手名", "結果", "種別", "Year", "スコアラー"]
+def append_rows(worksheet, rows, on_appended=None):
+    """新しい行だけをシート末尾に追記する（既存の履歴は再送しない）
+
+    on_appended はシートへの追記が済んでから、手元のスナップショットに足し込む前に呼ぶ
+    （書き込みキューが送信待ちから外すため。先に足し込むと、送信待ちとして重ねる行と二重に見える）。
+    """
+    new_df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    if new_df.empty:
+        return
+
+    start_row = get_storage().append_records(worksheet, new_df.to_dict("records"))
+    if on_appended is not None:
+        on_appended()
+    _patch_snapshot_rows(worksheet, new_df, start_row)
+
+def _patch_snapshot_rows(worksheet, new_df, start_row):
+    """追記した行を手元のスナップショットへ直接足し込み、シートの取り直しを不要にする"""
+    normalize = _NORMALIZERS.get(worksheet)
+    snap, meta = read_snapshot(worksheet)
+
+    # 他の端末が先に追記していた場合などは行番号がずれるので、次回の差分取得に任せる
+    if normalize is None or snap is None or "watermark" not in meta or start_row != meta["watermark"] + 2:
+        invalidate_snapshot(worksheet)
+        return
+
+    rows = new_df.copy()
+    rows.index = range(meta["watermark"], meta["watermark"] + len(rows))
+    data = pd.concat([snap, normalize(rows)])
+    write_snapshot(worksheet, data, **{**meta, "watermark": meta["watermark"] + len(rows)})
+
+def update_cells(worksheet, row_labels, column, value):
+    """指定した行の1列だけを書き換える（row_labels は読み込み時の index ラベル）"""
+    row_labels = list(row_labels)
+    if not row_labels:
+        return
+
+    # 送信待ちの行の行番号はまだ確定していないので、先に送り切っておく
+    flush_pending(worksheet)
+    get_storage().update_column(worksheet, [int(label) + 2 for label in row_labels], column, value)
+
+    # 手元のスナップショットも同じセルだけ書き換える（行数は変わらないので取り直し不要）
+    snap, meta = read_snapshot(worksheet)
+    if snap is not None and column in snap.columns:
+        labels = [label for label in row_labels if label in snap.index]
+        snap.loc[labels, column] = value
+        write_snapshot(worksheet, snap, **meta)
+
+def save_worksheet(worksheet, df):
+    """編集後の DataFrame でシート全体を書き換える（データ修正画面用）"""
+    flush_pending(worksheet)
+    df = to_sheet_frame(df).reset_index(drop=True)
+    get_storage().update(worksheet, df)
+
+    # 行の削除・並べ替えはウォーターマークでは追えないので、書き込んだ内容でスナップショットを置き換える
+    normalize = _NORMALIZERS.get(worksheet)
+    if normalize is None:
+        drop_snapshot(worksheet)
+        return
+    write_snapshot(worksheet, normalize(df.copy()), watermark=len(df), full_synced_at=time.time())
+
+# ==========================================
+# 📥 読み込み（スナップショット経由）
+# ==========================================
+BATTING_COLS = ["日付", "打点", "盗塁", "得点", "位置", "グラウンド", "対戦相手", "試合種別", "イニング", "選手名", "結果", "種別", "Year", "スコアラー"]
+PITCHING_COLS = ["日付", "アウト数", "球数", "失点", "自責点", "グラウンド", "対戦相手", "試合種別", "処理野手", "イニング", "投手名", "結果", "勝敗", "選手名", "Year", "スコアラー"]
+
+def _normalize_batting(data):
+    for col in BATTING_COLS:
+        if col not in data.columns:
+            data[col] = 0 if col in ["打点", "盗塁", "得点"] else ""
+
+    # 日付から "Year" を自動生成する処理を追加（テスト入力時に年が抜けるのを防ぐため）
+    data["日付"] = pd.to_datetime(data["日付"], errors='coerce')
+    data["Year"] = data["日付"].dt.strftime('%Y').fillna("不明")
+    data["日付"] = data["日付"].dt.date
+
+    return data.dropna(how="all")
+
+def _normalize_pitching(data):
+    for col in PITCHING_COLS: 
+        if col not in data.columns: 
+            if col in ["グラウンド", "対戦相手", "試合種別", "処理野手", "投手名", "選手名", "結果", "イニング", "勝敗", "Year", "スコアラー"]:
+                data[col] = ""
+            else:
+                data[col] = 0
     
-    target_worksheet = "打撃成績"
+    # 投手データに「選手名」が欠けている場合は「投手名」をコピーする
+    data.loc[data["選手名"] == "", "選手名"] = data["投手名"]
     
+    # 日付から "Year" を自動生成する処理を追加
+    data["日付"] = pd.to_datetime(data["日付"], errors='coerce')
+    data["Year"] = data["日付"].dt.strftime('%Y').fillna("不明")
+    data["日付"] = data["日付"].dt.date
+    
+    return data.dropna(how="all")
+
+# ==========================================
+# 🗜️ 列の型を詰める（カテゴリ型・小さい整数型）
+# ==========================================
+# 選手名や結果などは同じ値の繰り返しなので、読み込み時に一度だけ前後の空白を落として
+# カテゴリ型にする。カテゴリは値を並べ替えた固定の集合で、"" も必ず含めておく
+# （fillna("") がそのまま使える）。数値の列は欠損を許す Int16 にする
+# （Int8 だと行どうしの足し算で桁あふれするため）。
+# スナップショットには素の型で保存し、詰めるのは読み込んだ最後だけにする。
+CATEGORY_COLS = ["選手名", "結果", "イニング", "対戦相手", "試合種別", "グラウンド", "位置", "打球方向", "スコアラー"]
+SMALL_INT_COLS = ["打点", "得点", "盗塁", "失点", "自責点", "アウト数", "球数"]
+
+def _to_category(col):
+    values = col.map({v: str(v).strip() for v in col.dropna().unique()})
+    categories = sorted(set(values.dropna()) | {""})
+    return pd.Categorical(values, categories=categories)
+
+def _to_small_int(col):
+    values = pd.to_numeric(col, errors='coerce')
+    # 小数が入っている列は丸めずにそのまま残す
+    if (values.dropna() % 1 != 0).any():
+        return values
+    return values.astype("Int16")
+
+def _compact(data):
+    """表示・集計用に列の型を詰める（元の DataFrame は書き換えない）"""
+    if data.empty:
+        return data
+    data = data.copy()
+    for col in CATEGORY_COLS:
+        if col in data.columns:
+            data[col] = _to_category(data[col])
+    for col in SMALL_INT_COLS:
+        if col in data.columns:
+            data[col] = _to_small_int(data[col])
+    return data
+
+# ==========================================
+# 📅 日付まわりの派生列
+# ==========================================
+# 各画面で日付を何度も解釈し直さないよう、読み込み時に一度だけ作っておく。
+#   date        … 日付（datetime64。解釈できない日付は NaT）
+#   date_str    … "YYYY-MM-DD"
+#   year_month  … "YYYY-MM"
+#   game_id     … "日付_対戦相手_試合種別"（1試合を表すキー）
+# 年は従来どおり "Year" 列（"YYYY"、不明なら "不明"）を使う。
+# どれもシートには無い列なので、書き戻すときは to_sheet_frame() で落とす。
+DERIVED_COLS = ["date", "date_str", "year_month", "game_id"]
+
+def _text(data, col):
+    if col not in data.columns:
+        return pd.Series("", index=data.index)
+    return data[col].astype(object).fillna("").astype(str)
+
+def make_game_id(date_str, opp_name, m_type):
+    """1試合の game_id（derive_date_keys が各行に付けるものと同じ形）"""
+    return f"{date_str}_{str(opp_name).strip()}_{str(m_type).strip()}"
+
+def derive_date_keys(data):
+    """日付の派生列を足した DataFrame を返す（画面側で行を足したときにも使う）"""
+    data = data.copy()
+    dates = pd.to_datetime(data["日付"], errors='coerce') if "日付" in data.columns else pd.Series(pd.NaT, index=data.index)
+    data["date"] = dates
+    data["date_str"] = dates.dt.strftime('%Y-%m-%d')
+    data["year_month"] = dates.dt.strftime('%Y-%m')
+    data["game_id"] = data["date_str"].fillna("") + "_" + _text(data, "対戦相手") + "_" + _text(data, "試合種別")
+    return data
+
+def _prepare(data):
+    """読み込んだ最後に一度だけ通す（派生列を足し、列の型を詰め、バージョンを付ける）"""
+    return _stamp_version(derive_date_keys(_compact(data)))
+
+def to_sheet_frame(df):
+    """読み込み時に足した派生列を落とし、詰めた列を素の型に戻す（編集画面やシートへの書き戻し用）"""
+    df = df.drop(columns=DERIVED_COLS, errors="ignore")
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif isinstance(df[col].dtype, pd.Int16Dtype):
+            df[col] = df[col].astype("float64" if df[col].hasnans else "int64")
+    return df
+
+# ==========================================
+# 🔖 データのバージョン
+# ==========================================
+# 読み込んだ DataFrame には、中身から作った短いハッシュを attrs["data_version"] に付ける。
+# 中身が同じなら読み直しても同じ値、1行でも違えば別の値になる。
+# 画面側の重い集計は (data_version, 絞り込み条件) をキーに st.cache_data でメモ化し、
+# DataFrame 自体は "_" で始まる引数で渡してハッシュ計算を省く。
+#   @st.cache_data(ttl=600, max_entries=32)
+#   def _summary(version, year, _df): ...
+#   _summary(data_version(df), year, df)
+# attrs は絞り込んだ DataFrame にも引き継がれるため、行数と先頭・末尾の行ラベルも一緒に
+# 覚えておき、食い違えばその DataFrame の中身から計算し直す
+# （列を足しただけの DataFrame は元と同じバージョンのまま）。
+
+def _content_hash(df):
+    h = hashlib.blake2b(digest_size=8)
+    h.update("\x1f".join(map(str, df.columns)).encode())
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _row_fingerprint(df):
+    return (len(df), df.index[0], df.index[-1]) if len(df) else (0, None, None)
+
+def _stamp_version(df, version=None):
+    df.attrs["data_version"] = (version or _content_hash(df), _row_fingerprint(df))
+    return df
+
+def data_version(df):
+    """DataFrame の中身のバージョン（読み込み時に付けたもの。行が変わっていれば計算し直す）"""
+    stamped = df.attrs.get("data_version")
+    if not stamped or stamped[1] != _row_fingerprint(df):
+        stamped = _stamp_version(df).attrs["data_version"]
+    return stamped[0]
+
+_NORMALIZERS = {
+    "打撃成績": _normalize_batting,
+    "投手成績": _normalize_pitching,
+}
+
+def _fetch_rows_after(target_worksheet, watermark):
+    """watermark 行目（データ部の件数）より後ろの行だけを取得する。戻り値は (DataFrame, 取得した行数)"""
+    header, rows = get_storage().read_rows_after(target_worksheet, watermark + 2)
+    if not rows or not header:
+        return pd.DataFrame(), 0
+
+    width = len(header)
+    rows = [(list(r) + [""] * width)[:width] for r in rows]
+    delta = TextParser([header] + rows, header=0).read()
+    delta.index = range(watermark, watermark + len(rows))
+    return delta.dropna(how="all"), len(rows)
+
+def _pull_full(target_worksheet, normalize):
+    data = get_storage().read(target_worksheet)
+    watermark = int(data.index.max()) + 1 if not data.empty else 0
+    if not data.empty:
+        data = normalize(data)
+    write_snapshot(target_worksheet, data, watermark=watermark, full_synced_at=time.time())
+    return data
+
+def _pull_delta(target_worksheet, normalize, snap, meta):
+    delta, n_rows = _fetch_rows_after(target_worksheet, meta["watermark"])
+    if n_rows == 0:
+        write_meta(target_worksheet, {**meta, "saved_at": time.time()})
+        return snap
+
+    data = snap
+    if not delta.empty:
+        data = pd.concat([snap, normalize(delta)])
+    write_snapshot(target_worksheet, data, watermark=meta["watermark"] + n_rows, full_synced_at=meta["full_synced_at"])
+    return data
+
+def _load_worksheet(target_worksheet, normalize, expected_cols, label, raise_on_error=False):
+    """スナップショットが新しければそれを返し、古ければシートから差分（または全件）を取り込む
+
+    raise_on_error なら失敗時に保存済みのデータや空の DataFrame で代用せず、例外をそのまま投げる
+    （画面の無い裏での読み直し用。代用した値で共有キャッシュを上書きしないため）。
+    """
+    snap, meta = read_snapshot(target_worksheet)
+    if snap is not None and is_fresh(meta, SNAPSHOT_MAX_AGE):
+        return snap
+
     try:
-        data = conn.read(spreadsheet=SPREADSHEET_URL, worksheet=target_worksheet, ttl=0)
-        
+        # シート上で直接編集された分を拾うため、一定時間ごとに全件を取り直す
+        if snap is not None and "watermark" in meta and is_fresh(meta, FULL_SYNC_INTERVAL, key="full_synced_at"):
+            data = _pull_delta(target_worksheet, normalize, snap, meta)
+        else:
+            data = _pull_full(target_worksheet, normalize)
+
         if data.empty:
-             return pd.DataFrame(columns=expected_cols)
-        
-        for col in expected_cols:
-            if col not in data.columns:
-                data[col] = 0 if col in ["打点", "盗塁", "得点"] else ""
-
-        # 日付から "Year" を自動生成する処理を追加（テスト入力時に年が抜けるのを防ぐため）
-        data["日付"] = pd.to_datetime(data["日付"], errors='coerce')
-        data["Year"] = data["日付"].dt.strftime('%Y').fillna("不明")
-        data["日付"] = data["日付"].dt.date
-        
-        return data.dropna(how="all")
+            return pd.DataFrame(columns=expected_cols)
+        return data
     except Exception as e:
-        st.error(f"打撃データの読み込みに失敗しました ({target_worksheet}): {e}")
+        if raise_on_error:
+            raise
+        if snap is not None:
+            # 通信できないときは手元のスナップショットで表示を続ける
+            st.warning(f"{label}の最新化に失敗したため、保存済みのデータを表示しています ({target_worksheet}): {e}")
+            return snap
+        st.error(f"{label}の読み込みに失敗しました ({target_worksheet}): {e}")
         return pd.DataFrame(columns=expected_cols)
 
+def _with_pending(target_worksheet, data, normalize):
+    """書き込みキューで送信待ちの行を末尾に重ねる（行番号はシートに届いたときの見込み）"""
+    pending = pending_records(target_worksheet)
+    if not pending:
+        return data
+    _, meta = read_snapshot(target_worksheet)
+    start = meta.get("watermark", int(data.index.max()) + 1 if not data.empty else 0)
+    rows = pd.DataFrame(pending)
+    rows.index = range(start, start + len(rows))
+    return pd.concat([data, normalize(rows)])
+
+@register_cache("batting")
+@swr_cache(ttl=60)
+def load_batting_data(raise_on_error=False):
+    data = _load_worksheet("打撃成績", _normalize_batting, BATTING_COLS, "打撃データ", raise_on_error)
+    return _prepare(_with_pending("打撃成績", data, _normalize_batting))
+
+@register_cache("pitching")
+@swr_cache(ttl=60)
+def load_pitching_data(raise_on_error=False):
+    data = _load_worksheet("投手成績", _normalize_pitching, PITCHING_COLS, "投手データ", raise_on_error)
+    return _prepare(_with_pending("投手成績", data, _normalize_pitching))
+
+# ==========================================
+# 📋 マスタ（グラウンド・相手チーム）
+# ==========================================
+@register_cache("grounds")
 @st.cache_data(ttl=60)
-def load_pitching_data():
-    conn = get_connection()
-    expected_cols = ["日付", "アウト数", "球数", "失点", "自責点", "グラウンド", "対戦相手", "試合種別", "処理野手", "イニング", "投手名", "結果", "勝敗", "選手名", "Year", "スコアラー"]
-    
-    target_worksheet = "投手成績"
-    
+def get_cached_grounds():
     try:
-        data = conn.read(spreadsheet=SPREADSHEET_URL, worksheet=target_worksheet, ttl=0)
-        if data.empty:
-            return pd.DataFrame(columns=expected_cols)
+        df_ground = get_storage().read("グラウンド登録")
+        return df_ground["グラウンド名"].dropna().tolist() if "グラウンド名" in df_ground.columns else ["その他"]
+    except Exception:
+        return ["その他"]
 
-        for col in expected_cols: 
-            if col not in data.columns: 
-                if col in ["グラウンド", "対戦相手", "試合種別", "処理野手", "投手名", "選手名", "結果", "イニング", "勝敗", "Year", "スコアラー"]:
-                    data[col] = ""
-                else:
-                    data[col] = 0
-        
-        # 投手データに「選手名」が欠けている場合は「投手名」をコピーする
-        data.loc[data["選手名"] == "", "選手名"] = data["投手名"]
-        
-        # 日付から "Year" を自動生成する処理を追加
-        data["日付"] = pd.to_datetime(data["日付"], errors='coerce')
-        data["Year"] = data["日付"].dt.strftime('%Y').fillna("不明")
-        data["日付"] = data["日付"].dt.date
-        
-        return data.dropna(how="all")
-    except Exception as e:
-        st.error(f"投手データの読み込みに失敗しました ({target_worksheet}): {e}")
-        return pd.DataFrame(columns=expected_cols)
\ No newline at end of file
+@register_cache("opponents")
+@st.cache_data(ttl=60)
+def get_cached_opponents():
+    try:
+        df_opp = get_storage().read("相手チーム登録")
+        return df_opp["チーム名"].dropna().tolist() if "チーム名" in df_opp.columns else ["その他"]
+    except Exception:
+        return ["その他"]
@@ -0,0 +1,226 @@
+from abc import ABC, abstractmethod
+import pandas as pd
+import streamlit as st
+from utils.db import _content_hash
+
+# ==========================================
+# 🧮 入力中の試合の状態（打撃・投手）
+# ==========================================
+# 入力画面は1打席登録するたびに再実行されるが、その試合の打順・アウト数・
+# 各打者の今日の成績表示は、増えた行のぶんだけ更新すれば足りる。
+# 試合ごとの状態をセッションに1つ持ち、読み込み結果のうち未反映の行だけを取り込む。
+#
+# 取り込み済みの行の中身（ハッシュ）が前回と変わっていたとき
+# （データ修正画面での前の行の修正・削除、打点や位置の書き換えなど）は、その試合の行から作り直す。
+# ハッシュの計算は行の畳み込みと違ってまとめて済むので、毎回確かめても軽い。
+
+# 打席としてカウントする（打順を進める）結果
+PA_RESULTS = [
+    "凡退(ゴロ)", "凡退(フライ)", "単打", "二塁打", "三塁打", "本塁打",
+    "三振", "四球", "死球", "犠打(ゴロ)", "犠打(フライ)", "犠飛",
+    "失策(ゴロ)", "失策(フライ)", "野選", "併殺打", "振り逃げ三振", "打撃妨害"
+]
+# 1つアウトが増える結果（併殺打は2つ）
+SINGLE_OUT_RESULTS = ["凡退(ゴロ)", "凡退(フライ)", "三振", "犠打(ゴロ)", "犠打(フライ)", "犠飛", "走塁死", "盗塁死", "振り逃げ三振", "野選", "牽制死"]
+LINEUP_RESULTS = ["スタメン", "守備変更", "交代", "試合前"]
+# 打席履歴に出さない行
+NON_HISTORY_RESULTS = ["スタメン", "守備変更", "交代", "ベンチ"]
+# 打席の番号を振らない走塁の記録
+RUNNING_RESULTS = ["盗塁死", "走塁死", "牽制死", "走塁記録"]
+HIT_RESULTS = ["単打", "二塁打", "三塁打", "本塁打"]
+RESULT_SHORT = {
+    "本塁打": "本", "三塁打": "三", "二塁打": "二", "単打": "安",
+    "三振": "振", "凡退(ゴロ)": "ゴ", "凡退(フライ)": "飛", "四球": "球", "死球": "死", "犠打(ゴロ)": "犠", "犠打(フライ)": "犠", "犠飛": "犠飛", "失策(ゴロ)": "失", "失策(フライ)": "失", "野選": "野", "併殺打": "併",
+    "振り逃げ三振": "逃", "打撃妨害": "妨"
+}
+IGNORED_INNINGS = ["まとめ入力", "試合終了", "", "nan"]
+# 打者が塁に出る結果（投手側の走者数の見込みに使う）
+ON_BASE_RESULTS = ["単打", "二塁打", "三塁打", "四球", "死球", "失策(ゴロ)", "失策(フライ)", "打撃妨害"]
+# 走者が1人アウトになる結果
+RUNNER_OUT_RESULTS = ["盗塁死", "牽制死", "走塁死", "併殺打"]
+
+def _int(v):
+    v = pd.to_numeric(v, errors="coerce")
+    return int(v) if pd.notna(v) else 0
+
+def _str(v):
+    return "" if pd.isna(v) else str(v).strip()
+
+class _GameState(ABC):
+    """試合の行を先頭から順に畳み込んでいく状態の共通部分"""
+
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.seen = 0
+        self.seen_hash = None
+        self._reset()
+
+    def sync(self, game_df):
+        """試合の行（読み込み順）のうち、まだ取り込んでいない行だけを反映する"""
+        if self.seen > len(game_df) or (self.seen and _content_hash(game_df.iloc[:self.seen]) != self.seen_hash):
+            self.__init__(self.game_id)
+        new_rows = game_df.iloc[self.seen:]
+        if new_rows.empty:
+            return self
+        touched = set()
+        for row in new_rows.to_dict("records"):
+            key = self._apply(row)
+            if key is not None:
+                touched.add(key)
+        self.seen = len(game_df)
+        self.seen_hash = _content_hash(game_df)
+        self._refresh(touched)
+        return self
+
+    @abstractmethod
+    def _reset(self):
+        """状態を空にする（__init__ と作り直しのときに呼ばれる）"""
+
+    @abstractmethod
+    def _apply(self, row):
+        """1行を状態に反映し、表示を作り直す必要があるもののキー（無ければ None）を返す"""
+
+    def _refresh(self, touched):
+        """_apply が返したキーの表示を作り直す（既定では何もしない）"""
+
+    def _add_outs(self, inning, res):
+        if res in SINGLE_OUT_RESULTS:
+            self.inning_outs[inning] = self.inning_outs.get(inning, 0) + 1
+        elif res == "併殺打":
+            self.inning_outs[inning] = self.inning_outs.get(inning, 0) + 2
+
+    def outs(self, inning):
+        """そのイニングのアウト数（3つ以上のこともある）"""
+        return self.inning_outs.get(inning, 0)
+
+class BattingGameState(_GameState):
+    """1試合分の打撃入力の状態（打順・守備位置・イニングごとのアウト数・打者ごとの打席履歴）"""
+
+    def _reset(self):
+        self.lineup = {}
+        self.fielders = {}
+        self.position_log = {}
+        self.has_lineup = False
+        self.bench = set()
+        self.last_inning = None
+        self.last_scorer = None
+        self.pa_count = 0
+        self.inning_outs = {}
+        self.players = {}
+        self.history = {}
+
+    def _refresh(self, touched):
+        for name in touched:
+            self.history[name] = self._render(self.players[name])
+
+    def _apply(self, row):
+        """1行を状態に反映し、打席履歴が変わった選手名を返す"""
+        res = _str(row.get("結果"))
+        name = _str(row.get("選手名"))
+        inning = _str(row.get("イニング"))
+
+        if res in LINEUP_RESULTS:
+            order = pd.to_numeric(row.get("打順"), errors="coerce")
+            if pd.notna(order) and 1 <= order <= 15 and name and name not in ["nan", "チーム記録"]:
+                pos = _str(row.get("位置"))
+                self.lineup[int(order) - 1] = {"name": name, "pos": pos if pos and pos != "nan" else "－"}
+                # 守備位置 → 今その位置を守っている選手（交代・守備変更のたびに打順の並びから引き直す）
+                self.fielders = {
+                    info["pos"]: info["name"] for _, info in sorted(self.lineup.items()) if info["pos"] != "－"
+                }
+        if res == "スタメン":
+            self.has_lineup = True
+        if res == "ベンチ":
+            self.bench.add(name)
+        elif "ベンチ" not in (inning, _str(row.get("種別"))):
+            # 選手ごとの (イニング, 守備位置) の記録（試合後の守備位置の並びの復元に使う）
+            pos = row.get("守備位置", row.get("守備", row.get("位置")))
+            self.position_log.setdefault(name, []).append((inning, "" if pd.isna(pos) else str(pos)))
+        if inning not in IGNORED_INNINGS:
+            self.last_inning = inning
+        scorer = _str(row.get("スコアラー"))
+        if scorer not in ["", "0", "nan"]:
+            self.last_scorer = row.get("スコアラー")
+        if res in PA_RESULTS:
+            self.pa_count += 1
+        self._add_outs(inning, res)
+
+        if res in NON_HISTORY_RESULTS:
+            return None
+        player = self.players.setdefault(name, {"entries": [], "steals": 0, "runs": 0})
+        player["runs"] += _int(row.get("得点"))
+        if res == "盗塁":
+            player["steals"] += 1
+        elif res not in RUNNING_RESULTS:
+            raw_dir = row.get("打球方向")
+            p_dir = str(raw_dir) if pd.notna(raw_dir) and raw_dir != "---" else ""
+            player["entries"].append((res, p_dir, _int(row.get("打点"))))
+        return name
+
+    def _render(self, player):
+        history_html = []
+        for count, (res, p_dir, rbi_num) in enumerate(player["entries"], start=1):
+            res_short = RESULT_SHORT.get(res, res[:2])
+            disp_text = f"{p_dir}{res_short}" if p_dir else f"{res_short}"
+            if rbi_num > 0:
+                disp_text = f"{disp_text}・{rbi_num}"
+
+            color_style = ""
+            if res in HIT_RESULTS:
+                color_style = "color: red;" if rbi_num > 0 else "color: blue;"
+            history_html.append(f"<span style='{color_style}'>{count}({disp_text})</span>")
+
+        if player["steals"] > 0:
+            history_html.append(f"<span style='color: #800080;'>盗{player['steals']}</span>")
+        if player["runs"] > 0:
+            history_html.append(f"<span style='color: green;'>得{player['runs']}</span>")
+        return " ".join(history_html)
+
+class PitchingGameState(_GameState):
+    """その日の守備イニングごとのアウト数・失点・走者数（結果から見込んだ人数）"""
+
+    def _reset(self):
+        self.inning_outs = {}
+        self.inning_runs = {}
+        self.inning_runners = {}
+
+    def _apply(self, row):
+        res = _str(row.get("結果"))
+        inning = _str(row.get("イニング"))
+        runs = _int(row.get("失点"))
+        self._add_outs(inning, res)
+        self.inning_runs[inning] = self.inning_runs.get(inning, 0) + runs
+
+        runners = self.inning_runners.get(inning, 0)
+        if res == "本塁打":
+            runners = 0
+        else:
+            if res in ON_BASE_RESULTS:
+                runners += 1
+            elif res in RUNNER_OUT_RESULTS:
+                runners -= 1
+            runners = min(max(runners - runs, 0), 3)
+        self.inning_runners[inning] = 0 if self.outs(inning) >= 3 else runners
+        return None
+
+    def runs(self, inning):
+        return self.inning_runs.get(inning, 0)
+
+    def runners(self, inning):
+        return self.inning_runners.get(inning, 0)
+
+def _session_state(key, cls, game_id, game_df):
+    state = st.session_state.get(key)
+    if state is None or state.game_id != game_id:
+        state = cls(game_id)
+        st.session_state[key] = state
+    return state.sync(game_df)
+
+def batting_game_state(game_id, game_df):
+    """セッションに持つ試合の状態を、読み込み結果に追いつかせて返す（試合が変われば作り直す）"""
+    return _session_state("batting_game_state", BattingGameState, game_id, game_df)
+
+def pitching_game_state(date_str, day_df):
+    """投手入力の状態（その日の投手成績の行から作る）"""
+    return _session_state("pitching_game_state", PitchingGameState, date_str, day_df)
+
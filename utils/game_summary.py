@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.cache_registry import register_cache
+from utils.db import load_batting_data, load_pitching_data, derive_date_keys
+
+# ==========================================
+# 🧾 試合単位のサマリーテーブル
+# ==========================================
+# チーム成績・データ分析・個人成績の各画面が、それぞれ試合ごとに groupby して
+# ループで集計していたものを、打撃・投手データそれぞれ一度のグループ集計で作る。
+# 1行 = 1試合（日付・対戦相手・試合種別）で、得点・失点・安打・失策・本塁打・盗塁・
+# 先攻後攻・先制イニング・勝敗を持つ。チーム記録がある試合はその値を優先する。
+
+GAME_KEYS = ["date_str", "対戦相手", "試合種別"]
+NO_SCORE_INNING = 99
+
+AB_RESULTS = ["単打", "二塁打", "三塁打", "本塁打", "三振", "凡退", "失策", "併殺打", "野選", "振り逃げ三振", "犠飛"]
+HIT_RESULTS = ["単打", "二塁打", "三塁打", "本塁打", "安打"]
+
+SUMMARY_COLUMNS = [
+    "日付", "Year", "対戦相手", "試合種別", "グラウンド", "先攻後攻",
+    "得点", "失点", "打数", "安打", "本塁打", "盗塁", "自責点", "投球回", "失策",
+    "has_team_record", "FirstScoreInning", "FirstScore", "Result",
+]
+
+def _col(df, name, default=""):
+    return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+def _num_col(df, name):
+    return pd.to_numeric(_col(df, name, 0), errors='coerce').fillna(0)
+
+def _with_game_key(df):
+    # 読み込み済みのデータには date_str が付いているので、そのまま使う
+    return df if "date_str" in df.columns else derive_date_keys(df)
+
+def _inning_numbers(innings):
+    """「3回」→ 3。イニング番号として読めない行は NO_SCORE_INNING"""
+    inn = innings.astype(str)
+    nums = pd.to_numeric(inn.str.replace("回", "", regex=False), errors='coerce')
+    return nums.where(inn.str.contains("回") & nums.notna(), NO_SCORE_INNING)
+
+def _first_inning(df, runs_col):
+    """試合ごとに、点が入った最も早いイニング番号"""
+    inn = _inning_numbers(_col(df, "イニング"))
+    return inn.where(_num_col(df, runs_col) > 0, NO_SCORE_INNING).groupby([df[k] for k in GAME_KEYS], observed=True).min()
+
+def _side_from_innings(innings, keys, top, bottom):
+    """イニング表記の「表」「裏」から先攻後攻を判定する（表が優先）"""
+    inn = innings.dropna().astype(str)
+    flags = pd.DataFrame({
+        "top": inn.str.contains("表"),
+        "bottom": inn.str.contains("裏"),
+    }).groupby([k.loc[inn.index] for k in keys], observed=True).any()
+    return pd.Series(np.select([flags["top"], flags["bottom"]], [top, bottom], "不明"), index=flags.index)
+
+def _batting_side(df):
+    keys = [df[k] for k in GAME_KEYS]
+    is_team = _col(df, "選手名").astype(str) == "チーム記録"
+    indiv = ~is_team
+    runs = _num_col(df, "得点")
+
+    # 打数・安打などが入っていない行は「結果」から数える
+    res = _col(df, "結果").astype(str).str.strip()
+    ab = _num_col(df, "打数").astype(int)
+    hits = _num_col(df, "安打").astype(int)
+    hr = _num_col(df, "本塁打").astype(int)
+    has_counts = (ab > 0) | (hits > 0)
+    is_ab_res = res.isin(AB_RESULTS) | res.str.contains("凡退") | res.str.contains("失策")
+
+    work = pd.DataFrame({
+        "team_runs": runs.where(is_team, 0),
+        "indiv_runs": runs.where(_col(df, "イニング") != "まとめ入力", 0),
+        "has_team_record": is_team,
+        "打数": np.where(has_counts, ab, is_ab_res.astype(int)) * indiv,
+        "安打": np.where(has_counts, hits, res.isin(HIT_RESULTS).astype(int)) * indiv,
+        "本塁打": np.where(has_counts, hr, (res == "本塁打").astype(int)) * indiv,
+        "盗塁": _num_col(df, "盗塁").astype(int) * indiv,
+        "グラウンド": _col(df, "グラウンド"),
+    }, index=df.index)
+    g = work.groupby(keys, observed=True).agg({
+        "team_runs": "sum", "indiv_runs": "sum", "has_team_record": "any",
+        "打数": "sum", "安打": "sum", "本塁打": "sum", "盗塁": "sum", "グラウンド": "first",
+    })
+    g["得点"] = g["team_runs"].where(g["has_team_record"], g["indiv_runs"])
+
+    # 先攻後攻：イニング表記 → チーム記録の「位置」の順で判定する
+    side = _side_from_innings(_col(df, "イニング"), keys, "先攻", "後攻").reindex(g.index).fillna("不明")
+    team_pos = _col(df, "位置")[is_team].astype(str).groupby([k[is_team] for k in keys], observed=True).first().reindex(g.index).fillna("")
+    pos_side = np.select(
+        [team_pos.str.contains("後攻|裏"), team_pos.str.contains("先攻|表")], ["後攻", "先攻"], "不明")
+    g["先攻後攻"] = side.where(side != "不明", pos_side)
+
+    g["自チーム初得点回"] = _first_inning(df, "得点")
+    return g[["得点", "打数", "安打", "本塁打", "盗塁", "has_team_record", "グラウンド", "先攻後攻", "自チーム初得点回"]]
+
+def _pitching_side(df):
+    keys = [df[k] for k in GAME_KEYS]
+    is_team = _col(df, "選手名").astype(str) == "チーム記録"
+    if "投手名" in df.columns:
+        indiv = df["投手名"] != "チーム記録"
+    else:
+        indiv = ~is_team
+    lost = _num_col(df, "失点")
+    col_err = _num_col(df, "失策")
+
+    if "アウト数" in df.columns:
+        ip = _num_col(df, "アウト数") / 3
+    else:
+        ip = _num_col(df, "投球回")
+
+    work = pd.DataFrame({
+        "has_team": is_team,
+        "team_lost": lost.where(is_team, 0),
+        "all_lost": lost,
+        "team_err": col_err.where(is_team, 0),
+        "all_err": col_err,
+        "res_err": _col(df, "結果").astype(str).str.contains("失策").astype(int),
+        "自責点": _num_col(df, "自責点").where(indiv, 0),
+        "投球回": ip.where(indiv, 0),
+        "グラウンド": _col(df, "グラウンド"),
+    }, index=df.index)
+    g = work.groupby(keys, observed=True).agg({
+        "has_team": "any", "team_lost": "sum", "all_lost": "sum", "team_err": "sum", "all_err": "sum",
+        "res_err": "sum", "自責点": "sum", "投球回": "sum", "グラウンド": "first",
+    })
+    g["失点"] = g["team_lost"].where(g["has_team"], g["all_lost"])
+    g["失策"] = g["team_err"].where(g["has_team"], g["all_err"]) + g["res_err"]
+
+    # 守備側のイニング表記なので、表 → 後攻・裏 → 先攻
+    g["先攻後攻"] = _side_from_innings(_col(df, "イニング"), keys, "後攻", "先攻").reindex(g.index).fillna("不明")
+    g["相手初得点回"] = _first_inning(df, "失点")
+    return g[["失点", "自責点", "投球回", "失策", "グラウンド", "先攻後攻", "相手初得点回"]]
+
+def build_game_summary(df_batting, df_pitching):
+    """打撃・投手データから 1行 = 1試合 のサマリーを作る"""
+    parts = []
+    if not df_batting.empty:
+        parts.append(_batting_side(_with_game_key(df_batting)).add_prefix("b_"))
+    if not df_pitching.empty:
+        parts.append(_pitching_side(_with_game_key(df_pitching)).add_prefix("p_"))
+    if not parts:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    g = pd.concat(parts, axis=1, join="outer")
+    for c in ["b_得点", "b_打数", "b_安打", "b_本塁打", "b_盗塁", "p_失点", "p_自責点", "p_投球回", "p_失策"]:
+        if c not in g.columns:
+            g[c] = 0
+    for c in ["b_グラウンド", "p_グラウンド", "b_先攻後攻", "p_先攻後攻", "b_has_team_record"]:
+        if c not in g.columns:
+            g[c] = np.nan
+    for c in ["b_自チーム初得点回", "p_相手初得点回"]:
+        if c not in g.columns:
+            g[c] = NO_SCORE_INNING
+
+    out = pd.DataFrame(index=g.index)
+    out["グラウンド"] = g["b_グラウンド"].where(g["b_グラウンド"].notna(), g["p_グラウンド"])
+    b_side = g["b_先攻後攻"].fillna("不明")
+    out["先攻後攻"] = b_side.where(b_side != "不明", g["p_先攻後攻"].fillna("不明"))
+    for c in ["得点", "打数", "安打", "本塁打", "盗塁"]:
+        out[c] = g[f"b_{c}"].fillna(0)
+    for c in ["失点", "自責点", "投球回", "失策"]:
+        out[c] = g[f"p_{c}"].fillna(0)
+    out["has_team_record"] = g["b_has_team_record"].fillna(False).astype(bool)
+
+    # 先制：点が入った最も早いイニングで比べる（同じイニングなら「なし」扱い）
+    my_inn = g["b_自チーム初得点回"].fillna(NO_SCORE_INNING)
+    opp_inn = g["p_相手初得点回"].fillna(NO_SCORE_INNING)
+    first_inn = np.minimum(my_inn, opp_inn)
+    out["FirstScoreInning"] = first_inn.where(first_inn < NO_SCORE_INNING)
+    out["FirstScore"] = np.select([my_inn < opp_inn, opp_inn < my_inn], ["自チーム", "相手"], "なし(0-0)")
+    out["Result"] = np.select([out["得点"] > out["失点"], out["得点"] < out["失点"]], ["Win", "Lose"], "Draw")
+
+    out = out.reset_index()
+    out["日付"] = pd.to_datetime(out["date_str"])
+    out["Year"] = out["日付"].dt.strftime('%Y')
+    return out[SUMMARY_COLUMNS].sort_values("日付", ascending=False).reset_index(drop=True)
+
+@register_cache("game_summary", depends_on=("batting", "pitching"))
+@st.cache_data(ttl=60)
+def load_game_summary():
+    return build_game_summary(load_batting_data(), load_pitching_data())
@@ -0,0 +1,86 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import streamlit as st
+from config.settings import JOURNAL_PATH, JOURNAL_RETENTION_DAYS
+from utils.storage import to_cell_value
+
+# ==========================================
+# 📓 書き込みジャーナル（SQLite）
+# ==========================================
+# 打撃・投手の記録は、シートへ送る前にまずサーバー上の SQLite に書き残す。
+# 通信が切れていても記録は失われず、書き込みキューが通信の回復後に
+# 古い順に送り直す（アプリを再起動しても未送信分は残る）。
+# 送信済みの行も JOURNAL_RETENTION_DAYS 日は履歴として残しておく。
+# シートへの追記が成功した直後にプロセスが落ちた場合だけは、
+# 同じ行が二重に送られることがある（取りこぼすよりは重複を選ぶ）。
+
+_lock = threading.Lock()
+
+@st.cache_resource
+def _db():
+    os.makedirs(os.path.dirname(JOURNAL_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(JOURNAL_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            worksheet TEXT NOT NULL,
+            record TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS journal_unsent ON journal (worksheet, sent_at, id)")
+    conn.execute("DELETE FROM journal WHERE sent_at IS NOT NULL AND sent_at < ?",
+                  (time.time() - JOURNAL_RETENTION_DAYS * 86400,))
+    return conn
+
+def _json_value(v):
+    v = to_cell_value(v)
+    return None if v == "" else v
+
+def append(worksheet, records):
+    """記録をジャーナルに書き込む（戻るまでにディスクへ確定している）"""
+    now = time.time()
+    rows = [
+        (worksheet, json.dumps({k: _json_value(v) for k, v in rec.items()}, ensure_ascii=False), now)
+        for rec in records
+    ]
+    with _lock:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany("INSERT INTO journal (worksheet, record, created_at) VALUES (?, ?, ?)", rows)
+        db.execute("COMMIT")
+
+def unsent(worksheet, limit=None):
+    """未送信の記録を古い順に [(id, dict), ...] で返す"""
+    sql = "SELECT id, record FROM journal WHERE worksheet = ? AND sent_at IS NULL ORDER BY id"
+    params = [worksheet]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    with _lock:
+        rows = _db().execute(sql, params).fetchall()
+    return [(row_id, json.loads(record)) for row_id, record in rows]
+
+def unsent_counts():
+    """ワークシートごとの未送信件数"""
+    with _lock:
+        rows = _db().execute(
+            "SELECT worksheet, COUNT(*) FROM journal WHERE sent_at IS NULL GROUP BY worksheet"
+        ).fetchall()
+    return dict(rows)
+
+def mark_sent(ids):
+    ids = list(ids)
+    if not ids:
+        return
+    with _lock:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany("UPDATE journal SET sent_at = ? WHERE id = ?", [(time.time(), i) for i in ids])
+        db.execute("COMMIT")
@@ -0,0 +1,129 @@
+import pandas as pd
+import streamlit as st
+from utils.cache_registry import register_cache
+from utils.db import load_batting_data, load_pitching_data, derive_date_keys
+
+# ==========================================
+# 🧮 ラインスコア（イニング別得点・H・E）
+# ==========================================
+# スコアボードのたびにイニングごとに isin で絞り込むのをやめ、
+# 全試合分の「試合 × イニング」の得点表を一度のグループ集計で作っておく。
+# スコアボードは試合キー（日付・対戦相手・試合種別）で引くだけになる。
+# イニング数はデータにある最大値まで自動で伸びる（延長戦にも対応）。
+# 入力画面の「延長表／延長裏」は9回の次の回として数える（延長が何回あっても1つの回にまとまる）。
+
+REGULATION_INNINGS = 9
+LINE_KEYS = ["date_str", "_opp", "_type"]
+HIT_RESULTS = ["単打", "二塁打", "三塁打", "本塁打", "安打"]
+_INNING_RE = r"^(\d+)回(?:表|裏)?$"
+_EXTRA_RE = r"^延長(?:表|裏)?$"
+EXTRA_INNING = REGULATION_INNINGS + 1
+
+def game_key(date_txt, opp_name, m_type):
+    return (str(date_txt), str(opp_name).strip(), str(m_type).strip())
+
+def _keyed(df):
+    df = df.copy() if "date_str" in df.columns else derive_date_keys(df)
+    df["_opp"] = df["対戦相手"].astype(str).str.strip()
+    df["_type"] = df["試合種別"].astype(str).str.strip()
+    return df
+
+def _inning_numbers(innings):
+    """「3回表」→ 3、「延長表」→ EXTRA_INNING。イニングとして読めない行（まとめ入力など）は NaN"""
+    txt = innings.astype(str).str.strip()
+    inn = pd.to_numeric(txt.str.extract(_INNING_RE)[0], errors='coerce')
+    return inn.mask(txt.str.match(_EXTRA_RE), EXTRA_INNING)
+
+def _inning_table(df, runs_col):
+    """試合 × イニングごとの得点と「✖」の有無"""
+    inn = _inning_numbers(df["イニング"])
+    rows = df[inn.notna()]
+    work = pd.DataFrame({
+        "inn": inn[inn.notna()].astype(int),
+        "runs": pd.to_numeric(rows[runs_col], errors='coerce').fillna(0) if runs_col in rows.columns else 0,
+        "x": rows["結果"] == "✖" if "結果" in rows.columns else False,
+    }, index=rows.index)
+    return work.groupby([rows[k] for k in LINE_KEYS] + [work["inn"]], observed=True).agg(runs=("runs", "sum"), x=("x", "any"))
+
+def _sum_col(df, col):
+    if col not in df.columns:
+        return pd.Series(0, index=df.index)
+    return pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+def _hit_count(df):
+    if "結果" not in df.columns:
+        return pd.Series(0, index=df.index)
+    return df["結果"].isin(HIT_RESULTS).astype(int)
+
+def build_line_scores(b_df, p_df):
+    """打撃・投手データに含まれる全試合のラインスコア表を作る"""
+    empty = pd.DataFrame(columns=["runs", "x"])
+    tables = {"bat": empty, "pit": empty, "totals": pd.DataFrame()}
+    totals = []
+
+    if not b_df.empty and "日付" in b_df.columns:
+        b = _keyed(b_df)
+        tables["bat"] = _inning_table(b, "得点")
+        totals.append(pd.DataFrame({"k_h": _hit_count(b), "opp_e": _sum_col(b, "失策")})
+                      .groupby([b[k] for k in LINE_KEYS], observed=True).sum())
+
+    if not p_df.empty and "日付" in p_df.columns:
+        p = _keyed(p_df)
+        tables["pit"] = _inning_table(p, "失点")
+        opp_h = _sum_col(p, "被安打") if "被安打" in p.columns else _hit_count(p)
+        finished = p["勝敗"].astype(str).str.contains("勝利|敗戦|勝|負") if "勝敗" in p.columns else False
+        totals.append(pd.DataFrame({"opp_h": opp_h, "k_e": _sum_col(p, "失策"), "finished": finished}, index=p.index)
+                      .groupby([p[k] for k in LINE_KEYS], observed=True).agg({"opp_h": "sum", "k_e": "sum", "finished": "any"}))
+
+    if totals:
+        tables["totals"] = pd.concat(totals, axis=1)
+    return tables
+
+def _game_rows(table, key):
+    if table.empty:
+        return table
+    try:
+        return table.xs(key, level=[0, 1, 2])
+    except KeyError:
+        return table.iloc[0:0]
+
+def line_score_for(tables, key):
+    """ラインスコア表から1試合分を取り出す"""
+    bat = _game_rows(tables["bat"], key)
+    pit = _game_rows(tables["pit"], key)
+    totals = tables["totals"]
+    tot = totals.loc[key] if not totals.empty and key in totals.index else pd.Series(dtype=object)
+
+    def _get(name):
+        v = tot.get(name, 0)
+        return 0 if pd.isna(v) else v
+
+    return {
+        "k_runs": bat["runs"].astype(int).to_dict(), "k_x": bat["x"].to_dict(),
+        "opp_runs": pit["runs"].astype(int).to_dict(), "opp_x": pit["x"].to_dict(),
+        "k_h": int(_get("k_h")), "opp_h": int(_get("opp_h")),
+        "k_e": int(_get("k_e")), "opp_e": int(_get("opp_e")),
+        "finished": bool(_get("finished")),
+    }
+
+def prefer_team_record(b_df, p_df):
+    """チーム記録がある試合は、チーム記録の行だけを残す（試合詳細のスコアボード用）"""
+    if b_df.empty:
+        return b_df, p_df
+    b = _keyed(b_df)
+    is_team_b = b["選手名"] == "チーム記録"
+    team_games = pd.MultiIndex.from_frame(b.loc[is_team_b, LINE_KEYS]).unique()
+
+    b_in = pd.MultiIndex.from_frame(b[LINE_KEYS]).isin(team_games)
+    b_df = b_df[~b_in | is_team_b.to_numpy()]
+    if not p_df.empty:
+        p = _keyed(p_df)
+        p_in = pd.MultiIndex.from_frame(p[LINE_KEYS]).isin(team_games)
+        p_df = p_df[~p_in | (p["選手名"] == "チーム記録").to_numpy()]
+    return b_df, p_df
+
+@register_cache("line_scores", depends_on=("batting", "pitching"))
+@st.cache_data(ttl=60)
+def load_line_scores():
+    """試合詳細ビューワー用に、保存済みの全試合のラインスコア表を作っておく"""
+    return build_line_scores(*prefer_team_record(load_batting_data(), load_pitching_data()))
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 📐 セイバーメトリクス計算（列単位）
+# ==========================================
+# 集計済みの DataFrame の列（Series）や数値を受け取り、行ごとの apply を使わずに
+# 列全体をまとめて計算する。分母が 0 の行は default の値になる。
+# 試合は7イニング制なので、防御率・奪三振率は 7 回あたりで計算する。
+
+INNINGS_PER_GAME = 7
+
+def _num(x):
+    if isinstance(x, pd.Series):
+        return pd.to_numeric(x, errors="coerce").fillna(0).astype(float)
+    return np.asarray(x, dtype=float)
+
+def _like(values, *refs):
+    """入力に Series があれば、その index を持つ Series で返す"""
+    for ref in refs:
+        if isinstance(ref, pd.Series):
+            return pd.Series(values, index=ref.index)
+    return values
+
+def safe_div(num, den, default=0.0):
+    """分母が 0 以下の行は default にする割り算（default には列も指定できる）"""
+    n, d = _num(num), _num(den)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(d > 0, n / np.where(d > 0, d, 1), _num(default))
+    return _like(out, num, den)
+
+# --- 打撃 ---
+def total_bases(b1, b2, b3, hr):
+    return _like(_num(b1) + _num(b2) * 2 + _num(b3) * 3 + _num(hr) * 4, b1, b2, b3, hr)
+
+def batting_avg(hits, ab):
+    return safe_div(hits, ab)
+
+def on_base_pct(hits, bb, denom):
+    """出塁率（分母は画面ごとに 打数+四死球+犠飛 など）"""
+    return safe_div(_like(_num(hits) + _num(bb), hits, bb), denom)
+
+def slugging_pct(tb, ab):
+    return safe_div(tb, ab)
+
+def k_rate(so, pa):
+    return safe_div(so, pa)
+
+def sb_success_rate(sb, cs):
+    return safe_div(sb, _like(_num(sb) + _num(cs), sb, cs))
+
+def bb_per_k(bb, so):
+    """三振 0 のときは四死球の数そのもの"""
+    return safe_div(bb, so, default=bb)
+
+def runs_created(hits, bb, tb, ab):
+    """RC = (安打 + 四死球) × 塁打 ÷ (打数 + 四死球)"""
+    on_base = _num(hits) + _num(bb)
+    return safe_div(_like(on_base * _num(tb), hits, tb), _like(_num(ab) + _num(bb), ab, bb))
+
+def batting_rates(h, ab, bb, sf, tb, so, pa=None):
+    """打率・出塁率・長打率・OPS・三振率・RC・RC/打席 をまとめて返す（pa 省略時は 打数+四死球+犠飛）"""
+    if pa is None:
+        pa = _like(_num(ab) + _num(bb) + _num(sf), ab, bb, sf)
+    rates = pd.DataFrame({
+        "AVG": batting_avg(h, ab),
+        "OBP": on_base_pct(h, bb, _like(_num(ab) + _num(bb) + _num(sf), ab, bb, sf)),
+        "SLG": slugging_pct(tb, ab),
+        "K_rate": k_rate(so, pa),
+        "RC": runs_created(h, bb, tb, ab),
+    })
+    rates["OPS"] = rates["OBP"] + rates["SLG"]
+    rates["RC_per_PA"] = safe_div(rates["RC"], pa)
+    return rates
+
+# --- 投手 ---
+def innings(outs):
+    return _like(_num(outs) / 3, outs)
+
+def era(er, outs, default=0.0):
+    return safe_div(_like(_num(er) * INNINGS_PER_GAME, er), innings(outs), default)
+
+def k_per_game(so, outs, default=0.0):
+    return safe_div(_like(_num(so) * INNINGS_PER_GAME, so), innings(outs), default)
+
+def whip(bb, hits, outs, default=0.0):
+    return safe_div(_like(_num(bb) + _num(hits), bb, hits), innings(outs), default)
+
+def win_pct(wins, losses):
+    return safe_div(wins, _like(_num(wins) + _num(losses), wins, losses))
+
+def innings_str(outs):
+    """アウト数を「回.端数」の表記にする（例：10 → "3.1"）"""
+    o = pd.Series(outs).fillna(0).astype(float).astype(int)
+    return (o // 3).astype(str) + "." + (o % 3).astype(str)
+
+def pitching_score(inn, era_val, so):
+    """投手貢献度：投球回・奪三振に、防御率 3.50 を基準とした加減点を足す（防御率 90 以上は対象外）"""
+    inn, era_val, so = _num(inn), _num(era_val), _num(so)
+    era_weight = np.where(era_val <= 3.50, 0.5, 0.2)
+    score = inn * 1.0 + so * 0.3 + (3.50 - era_val) * inn * era_weight
+    score = np.where((inn <= 0) | (era_val >= 90), 0.0, np.maximum(0.0, score))
+    return score
+
+# --- 守備 ---
+def fielding_pct(chances, errors, default=1.0):
+    return safe_div(_like(_num(chances) - _num(errors), chances, errors), chances, default)
@@ -1,17 +1,20 @@
 import streamlit as st
 import pandas as pd
-from streamlit_gsheets import GSheetsConnection
-from config.settings import SPREADSHEET_URL
+from utils.storage import get_storage
+from utils.cache_registry import register_cache
+from utils.swr import swr_cache
 
-@st.cache_data(ttl=60)
-def _load_players_df():
-    conn = st.connection("gsheets", type=GSheetsConnection)
+@register_cache("players")
+@swr_cache(ttl=60)
+def _load_players_df(raise_on_error=False):
     try:
-        df = conn.read(spreadsheet=SPREADSHEET_URL, worksheet="選手登録", ttl=0)
+        df = get_storage().read("選手登録")
         if df.empty:
             return pd.DataFrame(columns=["選手名", "背番号", "成績非表示", "オーダー非表示"])
         return df
     except Exception as e:
+        if raise_on_error:
+            raise
         st.error(f"選手情報の読み込みに失敗しました: {e}")
         return pd.DataFrame(columns=["選手名", "背番号", "成績非表示", "オーダー非表示"])
 
@@ -70,6 +73,7 @@ def get_active_players():
     df = _load_players_df()
     return _extract_lists(df)
 
+@register_cache("stats_players", depends_on=("players",))
 @st.cache_data(ttl=60)
 def get_stats_active_players():
     df = _load_players_df()
@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import pandas as pd
+import pyarrow as pa
+from config.settings import SNAPSHOT_DIR
+
+# ==========================================
+# 💾 ローカルスナップショット
+# ==========================================
+# 正規化済みの DataFrame をワークシート単位で Parquet に保存しておき、
+# コールドスタートやキャッシュ切れのときはシートを読みに行かずにここから復元する。
+# 付随するメタ情報（保存時刻など）は同名の .json に置く。
+
+def _paths(name):
+    base = os.path.join(SNAPSHOT_DIR, name)
+    return base + ".parquet", base + ".json"
+
+def _to_arrow_safe(df):
+    """数値と文字列が混ざった object 列は Parquet に書けないので文字列へ寄せる"""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+def read_meta(name):
+    _, meta_path = _paths(name)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def read_snapshot(name):
+    """保存済みのスナップショットを (DataFrame, メタ情報) で返す。無ければ (None, {})"""
+    data_path, _ = _paths(name)
+    meta = read_meta(name)
+    if not meta or not os.path.exists(data_path):
+        return None, {}
+    try:
+        return pd.read_parquet(data_path), meta
+    except Exception:
+        return None, {}
+
+def write_snapshot(name, df, **meta):
+    """DataFrame とメタ情報を保存する（書きかけのファイルを読まないよう一時ファイル経由で置き換える）"""
+    data_path, meta_path = _paths(name)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        _to_arrow_safe(df).to_parquet(data_path + ".tmp")
+        os.replace(data_path + ".tmp", data_path)
+
+        write_meta(name, {"saved_at": time.time(), **meta, "rows": len(df)})
+    except Exception:
+        # スナップショットはあくまで高速化のため。失敗しても読み込み自体は続行する
+        pass
+
+def write_meta(name, meta):
+    _, meta_path = _paths(name)
+    try:
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+    except OSError:
+        pass
+
+def is_fresh(meta, max_age, key="saved_at"):
+    return bool(meta) and (time.time() - meta.get(key, 0)) < max_age
+
+def invalidate_snapshot(name):
+    """次回の読み込みでシートに差分を確認しに行くよう、保存時刻だけをリセットする"""
+    meta = read_meta(name)
+    if meta:
+        write_meta(name, {**meta, "saved_at": 0})
+
+def drop_snapshot(name):
+    """差分では追えない変更があったときに、次回は全件を取り直させる"""
+    meta = read_meta(name)
+    if meta:
+        write_meta(name, {**meta, "saved_at": 0, "full_synced_at": 0})
@@ -0,0 +1,64 @@
+import re
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 🧮 打席結果の判定テーブル
+# ==========================================
+# 「結果」の種類は数十通りしかないので、文字列ごとに一度だけ判定して
+# ルックアップテーブルを作り、全行へは NumPy の take で展開する。
+# 判定ルールは各画面で使っていた str.contains の条件と同じ。
+
+NON_AB_PATTERN = "四球|死球|四死球|犠打|犠飛|打撃妨害|得点|盗塁|牽制|代走|走塁|暴投|捕逸|ボーク|守備|交代"
+EMPTY_RESULTS = ["", "nan", "None", "-"]
+
+FLAG_RULES = {
+    "is_hit": "単打|二塁打|三塁打|本塁打",
+    "is_hr": "本塁打",
+    "is_so": "三振",
+    "is_1b": "単打",
+    "is_2b": "二塁打",
+    "is_3b": "三塁打",
+    "is_bb": "四球|死球|四死球",
+    "is_sf": "犠飛",
+    "is_sh": "犠打|バント",
+    "is_int": "妨害",
+}
+FLAG_COLUMNS = list(FLAG_RULES) + ["is_ab", "is_pa", "bases"]
+
+def _classify(result):
+    """1種類の結果文字列から各フラグを求める"""
+    flags = {col: int(bool(re.search(pattern, result))) for col, pattern in FLAG_RULES.items()}
+    flags["is_ab"] = int(result not in EMPTY_RESULTS and not re.search(NON_AB_PATTERN, result))
+    flags["is_pa"] = int(flags["is_ab"] or flags["is_bb"] or flags["is_sf"] or flags["is_sh"] or flags["is_int"])
+    flags["bases"] = flags["is_1b"] + flags["is_2b"] * 2 + flags["is_3b"] * 3 + flags["is_hr"] * 4
+    return [flags[col] for col in FLAG_COLUMNS]
+
+def clean_results(results):
+    return results.astype(str).str.replace(r"\s+", "", regex=True)
+
+def result_flags(results):
+    """結果列（空白除去済み）から判定フラグの DataFrame を作る"""
+    codes, uniques = pd.factorize(results, use_na_sentinel=False)
+    table = np.array([_classify(str(u)) for u in uniques], dtype=np.int8).reshape(len(uniques), len(FLAG_COLUMNS))
+    return pd.DataFrame(table.take(codes, axis=0), index=results.index, columns=FLAG_COLUMNS)
+
+def enrich_batting(df):
+    """打撃データに判定フラグと数値化した打点・盗塁・得点を付与する（付与済みならそのまま返す）"""
+    if all(col in df.columns for col in FLAG_COLUMNS):
+        return df
+
+    df = df.copy()
+    if df.empty or "結果" not in df.columns:
+        for col in FLAG_COLUMNS:
+            df[col] = 0
+        return df
+
+    df["結果"] = clean_results(df["結果"])
+    df[FLAG_COLUMNS] = result_flags(df["結果"])
+
+    for c in ["打点", "盗塁", "得点", "盗塁死"]:
+        if c not in df.columns:
+            df[c] = 0
+        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+    return df
@@ -0,0 +1,187 @@
+import csv
+import datetime
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+import streamlit as st
+from gspread.utils import rowcol_to_a1
+from streamlit_gsheets import GSheetsConnection
+from config.settings import SPREADSHEET_URL, STORAGE_BACKEND, LOCAL_STORAGE_DIR, LOCAL_STORAGE_LATENCY
+
+# ==========================================
+# 💾 保存先（ストレージ）の切り替え
+# ==========================================
+# シートへの読み書きはすべてここを通す。本番は Google スプレッドシート、
+# オフライン検証や負荷計測ではワークシートごとの CSV ファイルを使う。
+# どちらも同じ操作を持ち、読み込んだ DataFrame の index ラベル i が
+# シートの i+2 行目（1行目はヘッダー）に対応する点も揃えてある。
+#
+#   read(ws)                         … 全件を DataFrame で読む（空行は落とすが index は振り直さない）
+#   update(ws, df)                   … 全件を書き直す
+#   append_records(ws, records)      … 行を末尾に追記し、書き込んだ先頭行の行番号を返す
+#   update_column(ws, rows, col, v)  … 指定行（シートの行番号）の1列だけを書き換える
+#   read_rows_after(ws, start)       … start 行目以降を (ヘッダー, 行のリスト) で返す
+
+def to_cell_value(v):
+    """シートに書き込める素の値へ変換する"""
+    if v is None:
+        return ""
+    if isinstance(v, (pd.Timestamp, datetime.date)):
+        return v.strftime('%Y-%m-%d') if pd.notna(v) else ""
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and np.isnan(v):
+        return ""
+    if v is pd.NA or v is pd.NaT:
+        return ""
+    return v
+
+class GSheetsStorage:
+    """Google スプレッドシート（st-gsheets-connection と gspread）"""
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def _conn(self):
+        return st.connection("gsheets", type=GSheetsConnection)
+
+    def _worksheet(self, worksheet):
+        return self._conn().client._select_worksheet(spreadsheet=self.spreadsheet, worksheet=worksheet)
+
+    def _ensure_header(self, ws, columns):
+        """ヘッダー行を取得し、足りない列があれば右端に追加する"""
+        header = ws.row_values(1)
+        missing = [c for c in columns if c not in header]
+        if missing:
+            header = header + missing
+            if len(header) > ws.col_count:
+                ws.add_cols(len(header) - ws.col_count)
+            ws.update(range_name="A1", values=[header])
+        return header
+
+    def read(self, worksheet):
+        return self._conn().read(spreadsheet=self.spreadsheet, worksheet=worksheet, ttl=0)
+
+    def update(self, worksheet, df):
+        self._conn().update(spreadsheet=self.spreadsheet, worksheet=worksheet, data=df)
+
+    def append_records(self, worksheet, records):
+        ws = self._worksheet(worksheet)
+        header = self._ensure_header(ws, list(dict.fromkeys(k for rec in records for k in rec)))
+        values = [[to_cell_value(rec.get(col)) for col in header] for rec in records]
+        res = ws.append_rows(values, value_input_option="USER_ENTERED", table_range="A1")
+        updated_range = ((res or {}).get("updates") or {}).get("updatedRange", "")
+        m = re.search(r"![A-Z]+(\d+)", updated_range)
+        return int(m.group(1)) if m else None
+
+    def update_column(self, worksheet, sheet_rows, column, value):
+        ws = self._worksheet(worksheet)
+        header = self._ensure_header(ws, [column])
+        col_no = header.index(column) + 1
+        cell_value = to_cell_value(value)
+        updates = [{"range": rowcol_to_a1(row, col_no), "values": [[cell_value]]} for row in sheet_rows]
+        ws.batch_update(updates, value_input_option="USER_ENTERED")
+
+    def read_rows_after(self, worksheet, start):
+        ws = self._worksheet(worksheet)
+        if start > ws.row_count:
+            return [], []
+        # 全件の読み込み（get_as_dataframe(evaluate_formulas=True)）と同じ形で受け取る。
+        # 数式は計算結果、日付は表示どおりの文字列にそろえないと、差分で足した行だけ型が変わる
+        header_range, rows = ws.batch_get(
+            ["1:1", f"{start}:{ws.row_count}"],
+            value_render_option="UNFORMATTED_VALUE",
+            date_time_render_option="FORMATTED_STRING",
+        )
+        return (header_range[0] if header_range else []), rows
+
+class LocalStorage:
+    """ワークシートごとの CSV ファイル（オフライン検証・負荷計測用）
+
+    latency 秒を1操作ごとに待つので、通信待ちを含めた計測を再現できる。
+    """
+
+    def __init__(self, directory, latency=0.0):
+        self.directory = directory
+        self.latency = latency
+        os.makedirs(directory, exist_ok=True)
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _path(self, worksheet):
+        return os.path.join(self.directory, f"{worksheet}.csv")
+
+    def _load(self, worksheet):
+        """(ヘッダー, 行のリスト)。ファイルがなければ空"""
+        path = self._path(worksheet)
+        if not os.path.exists(path):
+            return [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            table = list(csv.reader(f))
+        return (table[0], table[1:]) if table else ([], [])
+
+    def _save(self, worksheet, header, rows):
+        path = self._path(worksheet)
+        tmp = f"{path}.tmp"
+        width = len(header)
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows((list(r) + [""] * width)[:width] for r in rows)
+        os.replace(tmp, path)
+
+    def read(self, worksheet):
+        self._wait()
+        if not os.path.exists(self._path(worksheet)):
+            return pd.DataFrame()
+        try:
+            data = pd.read_csv(self._path(worksheet), skip_blank_lines=False)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        return data.dropna(how="all")
+
+    def update(self, worksheet, df):
+        self._wait()
+        rows = [[to_cell_value(v) for v in rec] for rec in df.itertuples(index=False)]
+        self._save(worksheet, [str(c) for c in df.columns], rows)
+
+    def append_records(self, worksheet, records):
+        self._wait()
+        header, rows = self._load(worksheet)
+        header = header + [c for c in dict.fromkeys(k for rec in records for k in rec) if c not in header]
+        start = len(rows) + 2
+        rows += [[to_cell_value(rec.get(col)) for col in header] for rec in records]
+        self._save(worksheet, header, rows)
+        return start
+
+    def update_column(self, worksheet, sheet_rows, column, value):
+        self._wait()
+        header, rows = self._load(worksheet)
+        if column not in header:
+            header = header + [column]
+        col_idx = header.index(column)
+        width = len(header)
+        cell_value = to_cell_value(value)
+        for row in sheet_rows:
+            i = row - 2
+            while len(rows) <= i:
+                rows.append([""] * width)
+            rows[i] = (list(rows[i]) + [""] * width)[:width]
+            rows[i][col_idx] = cell_value
+        self._save(worksheet, header, rows)
+
+    def read_rows_after(self, worksheet, start):
+        self._wait()
+        header, rows = self._load(worksheet)
+        return header, rows[start - 2:]
+
+@st.cache_resource
+def get_storage():
+    """設定（STORAGE_BACKEND）に応じた保存先を返す"""
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(LOCAL_STORAGE_DIR, latency=LOCAL_STORAGE_LATENCY)
+    return GSheetsStorage(SPREADSHEET_URL)
@@ -0,0 +1,74 @@
+import functools
+import threading
+import time
+import pandas as pd
+
+# ==========================================
+# ♻️ stale-while-revalidate キャッシュ
+# ==========================================
+# st.cache_data(ttl=...) は期限が切れると、その直後に来た利用者がシートの読み込みを
+# 待つことになる。swr_cache は期限切れでも手元の値をすぐ返し、裏で1回だけ読み直す。
+#   ・値がまだ無いとき（起動直後・clear() の直後）だけは、その場で読み込んで待つ
+#   ・同時に来た呼び出しは1つの読み込みにまとめる（重複してシートを読まない）
+#   ・clear() より前に始まった読み直しの結果は捨てる（書き込み直後に古い値へ戻さない）
+#   ・裏での読み直しに失敗したら手元の値をそのまま使い続ける
+#   ・読み直した値に入れ替えたら on_refresh()（cache_registry が依存先の破棄を設定する）を呼ぶ
+# 全セッションで1つの値を共有する。raise_on_error 引数だけを取る読み込み関数専用。
+# 裏での読み直しは画面の無いスレッドで動くので raise_on_error=True で呼び、
+# 読み込み関数は st.error などで代わりの値（空の DataFrame など）を返さず例外を投げること。
+
+def swr_cache(ttl):
+    """期限切れの値を返しつつ裏で読み直すキャッシュのデコレーター（clear() で破棄）"""
+    def decorator(func):
+        lock = threading.Lock()
+        state = {"value": None, "loaded_at": 0.0, "has_value": False, "refreshing": False, "generation": 0}
+
+        def _store(value, generation):
+            if generation != state["generation"]:
+                return False
+            state.update(value=value, loaded_at=time.time(), has_value=True)
+            return True
+
+        def _refresh(generation):
+            try:
+                value = func(raise_on_error=True)
+                with lock:
+                    stored = _store(value, generation)
+            except Exception:
+                # 読み直しに失敗したら手元の値のまま。次の呼び出しでまた試す
+                stored = False
+            finally:
+                with lock:
+                    state["refreshing"] = False
+            if stored and wrapper.on_refresh is not None:
+                wrapper.on_refresh()
+
+        @functools.wraps(func)
+        def wrapper():
+            with lock:
+                if state["has_value"]:
+                    if time.time() - state["loaded_at"] >= ttl and not state["refreshing"]:
+                        state["refreshing"] = True
+                        threading.Thread(
+                            target=_refresh, args=(state["generation"],), name=f"swr-{func.__name__}", daemon=True
+                        ).start()
+                    return _copy(state["value"])
+
+                # 値が無いときはロックを持ったまま読み込み、後から来た呼び出しはその結果を待つ
+                generation = state["generation"]
+                value = func()
+                _store(value, generation)
+                return _copy(value)
+
+        def clear():
+            with lock:
+                state.update(value=None, has_value=False, generation=state["generation"] + 1)
+
+        wrapper.clear = clear
+        wrapper.on_refresh = None
+        return wrapper
+    return decorator
+
+def _copy(value):
+    # 共有している値を呼び出し側が書き換えても響かないよう、DataFrame は浅いコピーで渡す
+    return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
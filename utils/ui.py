@@ -3,6 +3,8 @@ import pandas as pd
 from config.settings import MY_TEAM
 from streamlit_gsheets import GSheetsConnection
 from config.settings import SPREADSHEET_URL
+from utils.write_queue import pending_count, last_error
+from utils.line_score import REGULATION_INNINGS, build_line_scores, line_score_for, game_key
 
 def load_css():
     st.markdown("""
@@ -21,75 +23,48 @@ def fmt_player_name(name, player_numbers_dict):
     num = player_numbers_dict.get(name, "")
     return f"{name} ({num})" if num else name
 
-def render_scoreboard(b_df, p_df, date_txt, m_type, g_name, opp_name, is_top_first=True):
+def render_scoreboard(b_df, p_df, date_txt, m_type, g_name, opp_name, is_top_first=True, line=None, errors=None):
+    """スコアボードを描画する（line にラインスコアを渡せば集計を省略、errors で (自チーム, 相手) の失策数を上書き）"""
     st.markdown(f"### 📅 {date_txt} ({m_type}) &nbsp;&nbsp; 🏟️ {g_name}")
     st.subheader(f"⚾ {MY_TEAM} vs {opp_name}")
-    
-    # --- 該当する試合（日付・対戦相手・試合種別）のデータだけに厳密に絞り込む ---
-    if not b_df.empty and "日付" in b_df.columns:
-        b_df = b_df.copy()
-        b_df["_date_str"] = pd.to_datetime(b_df["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
-        b_df = b_df[
-            (b_df["_date_str"] == str(date_txt)) & 
-            (b_df["対戦相手"].astype(str).str.strip() == str(opp_name).strip()) & 
-            (b_df["試合種別"].astype(str).str.strip() == str(m_type).strip())
-        ]
-        
-    if not p_df.empty and "日付" in p_df.columns:
-        p_df = p_df.copy()
-        p_df["_date_str"] = pd.to_datetime(p_df["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
-        p_df = p_df[
-            (p_df["_date_str"] == str(date_txt)) & 
-            (p_df["対戦相手"].astype(str).str.strip() == str(opp_name).strip()) & 
-            (p_df["試合種別"].astype(str).str.strip() == str(m_type).strip())
-        ]
-
-    # --- 試合終了（勝敗確定）の判定 ---
-    is_game_finished = False
-    if not p_df.empty and "勝敗" in p_df.columns and p_df["勝敗"].astype(str).str.contains("勝利|敗戦|勝|負").any():
-        is_game_finished = True
-        
+
+    # --- 該当する試合（日付・対戦相手・試合種別）のラインスコアを引く ---
+    if line is None:
+        line = line_score_for(build_line_scores(b_df, p_df), game_key(date_txt, opp_name, m_type))
+    if errors is not None:
+        line = {**line, "k_e": int(errors[0]), "opp_e": int(errors[1])}
+
     # --- 最終イニング（データが存在する最大のイニング）を特定 ---
-    max_inning_played = 0
-    for i in range(1, 10):
-        target_innings = [f"{i}回", f"{i}回表", f"{i}回裏"]
-        b_has = not b_df.empty and not b_df[b_df["イニング"].isin(target_innings)].empty
-        p_has = not p_df.empty and not p_df[p_df["イニング"].isin(target_innings)].empty
-        if b_has or p_has:
-            max_inning_played = i
+    played = set(line["k_runs"]) | set(line["opp_runs"])
+    max_inning_played = max(played) if played else 0
+    n_innings = max(REGULATION_INNINGS, max_inning_played)
 
     k_inning, opp_inning = [], []
     total_k, total_opp = 0, 0
-    
-    # 9回まで計算
-    for i in range(1, 10):
-        target_innings = [f"{i}回", f"{i}回表", f"{i}回裏"]
-        
-        inn_bat_data = b_df[b_df["イニング"].isin(target_innings)] if not b_df.empty else pd.DataFrame()
-        inn_pit_data = p_df[p_df["イニング"].isin(target_innings)] if not p_df.empty else pd.DataFrame()
-
-        if not inn_bat_data.empty and not inn_bat_data[inn_bat_data["結果"] == "✖"].empty:
+
+    for i in range(1, n_innings + 1):
+        k_exists = i in line["k_runs"]
+        opp_exists = i in line["opp_runs"]
+
+        if line["k_x"].get(i, False):
             k_disp = "✖"
             k_runs = 0
         else:
-            k_runs = int(pd.to_numeric(inn_bat_data["得点"], errors='coerce').sum()) if not inn_bat_data.empty else 0
+            k_runs = line["k_runs"].get(i, 0)
             k_disp = str(k_runs)
-        
-        if not inn_pit_data.empty and not inn_pit_data[inn_pit_data["結果"] == "✖"].empty:
+
+        if line["opp_x"].get(i, False):
             opp_disp = "✖"
             opp_runs = 0
         else:
-            opp_runs = int(pd.to_numeric(inn_pit_data["失点"], errors='coerce').fillna(0).sum()) if not inn_pit_data.empty else 0
+            opp_runs = line["opp_runs"].get(i, 0)
             opp_disp = str(opp_runs)
 
-        k_exists = not inn_bat_data.empty
-        opp_exists = not inn_pit_data.empty
-        
         total_k += k_runs
         total_opp += opp_runs
-        
+
         # 試合終了時の「✖」追加ロジック (後攻チームの最終イニング)
-        if is_game_finished and i == max_inning_played:
+        if line["finished"] and i == max_inning_played:
             if is_top_first:
                 if not opp_exists:
                     opp_disp = "✖"
@@ -106,18 +81,8 @@ def render_scoreboard(b_df, p_df, date_txt, m_type, g_name, opp_name, is_top_fir
         k_inning.append(k_disp if k_exists else "")
         opp_inning.append(opp_disp if opp_exists else "")
 
-    # --- 安打数 (H) の安全な集計 ---
-    hit_list = ["単打", "二塁打", "三塁打", "本塁打", "安打"]
-    k_h = b_df[b_df["結果"].isin(hit_list)].shape[0] if not b_df.empty and "結果" in b_df.columns else 0
-    
-    if not p_df.empty and "被安打" in p_df.columns:
-        opp_h = int(pd.to_numeric(p_df["被安打"], errors='coerce').fillna(0).sum())
-    else:
-        opp_h = p_df[p_df["結果"].isin(hit_list)].shape[0] if not p_df.empty and "結果" in p_df.columns else 0
-
-    # --- 失策数 (E) の安全な集計（爆発防止） ---
-    k_e = int(pd.to_numeric(p_df["失策"], errors='coerce').fillna(0).sum()) if not p_df.empty and "失策" in p_df.columns else 0
-    opp_e = int(pd.to_numeric(b_df["失策"], errors='coerce').fillna(0).sum()) if not b_df.empty and "失策" in b_df.columns else 0
+    k_h, opp_h = line["k_h"], line["opp_h"]
+    k_e, opp_e = line["k_e"], line["opp_e"]
 
     if is_top_first:
         names = [MY_TEAM, opp_name]
@@ -167,19 +132,19 @@ def render_scoreboard(b_df, p_df, date_txt, m_type, g_name, opp_name, is_top_fir
             <tr>
                 <th>チーム</th>
     """
-    for i in range(1, 10):
+    for i in range(1, n_innings + 1):
         html_content += f"<th><a href='#inning-{i}' title='{i}回詳細へジャンプ'>{i}</a></th>"
     html_content += "<th>R</th><th>H</th><th>E</th></tr></thead><tbody>"
 
     # 1行目（先攻または相手チーム）
     html_content += f"<tr><td>{names[0]}</td>"
-    for i in range(9):
+    for i in range(n_innings):
         html_content += f"<td>{scores[0][i]}</td>"
     html_content += f"<td>{R[0]}</td><td>{H[0]}</td><td>{E[0]}</td></tr>"
 
     # 2行目（後攻または自チーム）
     html_content += f"<tr><td>{names[1]}</td>"
-    for i in range(9):
+    for i in range(n_innings):
         html_content += f"<td>{scores[1][i]}</td>"
     html_content += f"<td>{R[1]}</td><td>{H[1]}</td><td>{E[1]}</td></tr>"
 
@@ -187,6 +152,15 @@ def render_scoreboard(b_df, p_df, date_txt, m_type, g_name, opp_name, is_top_fir
 
     st.markdown(html_content, unsafe_allow_html=True)
 
+def render_write_status():
+    """書き込みキューの送信待ち件数と、送信失敗中ならその内容を表示する"""
+    n_pending = pending_count()
+    if n_pending:
+        st.caption(f"📤 シートへの送信待ち: {n_pending} 件")
+        err = last_error()
+        if err:
+            st.warning(f"シートへの送信に失敗しています。通信が戻れば自動で再送します: {err}")
+
 def show_homerun_effect():
     st.markdown("""
     <style>
@@ -0,0 +1,116 @@
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from config.settings import WRITE_FLUSH_INTERVAL, WRITE_BATCH_SIZE, WRITE_RETRY_MAX_BACKOFF
+from utils.cache_registry import invalidate
+from utils import journal
+
+# ==========================================
+# 📤 書き込みキュー（write-behind）
+# ==========================================
+# 試合中の1打席ごとの記録は、まず手元のキューに積んですぐ画面へ反映し、
+# シートへの送信はバックグラウンドのスレッドがまとめて行う。
+# WRITE_FLUSH_INTERVAL 秒ぶんの記録を1回の追記で送り、失敗したら
+# 間隔を倍々に空けて（最大 WRITE_RETRY_MAX_BACKOFF 秒）送り直す。
+# 送信待ちの行は読み込み時に末尾へ重ねて返すので、送信前でも表示・集計に出る。
+# キューの中身は utils.journal（SQLite）に置くので、通信断や再起動でも失われず、
+# 未送信の行が残っていれば読み込みのついでに送信スレッドを起こして送り直す。
+
+WORKSHEET_CACHES = {"打撃成績": "batting", "投手成績": "pitching"}
+
+@st.cache_resource
+def _state():
+    lock = threading.RLock()
+    return {
+        "lock": lock,
+        "wakeup": threading.Condition(lock),
+        "send_lock": threading.Lock(),
+        "last_error": None,
+        "thread": None,
+    }
+
+def _ensure_worker():
+    state = _state()
+    with state["lock"]:
+        if state["thread"] is None or not state["thread"].is_alive():
+            state["thread"] = threading.Thread(target=_worker, name="sheet-write-queue", daemon=True)
+            state["thread"].start()
+
+def enqueue_rows(worksheet, rows):
+    """追記する行をキューに積む（シートへの送信はバックグラウンドで行う）"""
+    new_df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    if new_df.empty:
+        return
+    # 先にジャーナルへ確定させてから送信スレッドに知らせる
+    journal.append(worksheet, new_df.to_dict("records"))
+    state = _state()
+    with state["lock"]:
+        state["wakeup"].notify()
+    _ensure_worker()
+
+def pending_records(worksheet):
+    """まだシートへ送れていない行（古い順）"""
+    records = [rec for _, rec in journal.unsent(worksheet)]
+    if records:
+        # 前回の起動時や通信断で残った分も、ここで送信スレッドを起こして送り直す
+        _ensure_worker()
+    return records
+
+def pending_count(worksheet=None):
+    counts = journal.unsent_counts()
+    if worksheet is not None:
+        return counts.get(worksheet, 0)
+    return sum(counts.values())
+
+def last_error():
+    """直近の送信失敗の内容（成功したら None に戻る）"""
+    return _state()["last_error"]
+
+def _send_batch(worksheet):
+    """先頭から最大 WRITE_BATCH_SIZE 行を送り、送れた分をキューから外す"""
+    # utils.db が読み込み時にこのモジュールを使うため、ここで遅れて import する
+    from utils.db import append_rows
+
+    state = _state()
+    # バックグラウンドと flush_pending が同じ行を二重に送らないよう、送信は1つずつ
+    with state["send_lock"]:
+        batch = journal.unsent(worksheet, limit=WRITE_BATCH_SIZE)
+        if not batch:
+            return 0
+
+        # 送信済みにしてからスナップショットに足し込む（その間に読んだ人に同じ行が二重に見えないように）
+        append_rows(
+            worksheet, [rec for _, rec in batch],
+            on_appended=lambda: journal.mark_sent(row_id for row_id, _ in batch),
+        )
+        with state["lock"]:
+            state["last_error"] = None
+    if worksheet in WORKSHEET_CACHES:
+        invalidate(WORKSHEET_CACHES[worksheet])
+    return len(batch)
+
+def flush_pending(worksheet):
+    """送信待ちの行をこの場で送り切る（行番号を使う書き込みの前に呼ぶ）"""
+    while pending_count(worksheet) > 0:
+        _send_batch(worksheet)
+
+def _worker():
+    state = _state()
+    backoff = 0
+    while True:
+        with state["lock"]:
+            while not journal.unsent_counts():
+                state["wakeup"].wait()
+        # 少し待って、その間に入力された記録もまとめて送る
+        time.sleep(backoff or WRITE_FLUSH_INTERVAL)
+        worksheets = list(journal.unsent_counts())
+        try:
+            for worksheet in worksheets:
+                while _send_batch(worksheet):
+                    pass
+            backoff = 0
+        except Exception as e:
+            with state["lock"]:
+                state["last_error"] = f"{type(e).__name__}: {e}"
+            backoff = min(max(backoff * 2, WRITE_FLUSH_INTERVAL), WRITE_RETRY_MAX_BACKOFF)
@@ -1,12 +1,11 @@
 import streamlit as st
 import datetime
 from config.settings import MY_TEAM, OFFICIAL_GAME_TYPES
-from utils.db import load_batting_data, load_pitching_data
+from utils.dataset import get_dataset
 from utils.ui import load_css
 from streamlit_option_menu import option_menu
 
-# 各ページ（View）の読み込み
-from views import batting, pitching, team_stats, personal_stats, edit_data, analysis
+# 各ページ（View）は表示するときに読み込む（画面の分岐の中で import）
 
 # 1. GitHub上の実際のファイル名 (logo-192.png) に合わせる
 ICON_URL = "https://raw.githubusercontent.com/kagura-bc/baseball-app/main/static/logo-192.png?v=3"
@@ -56,9 +55,10 @@ if not st.session_state["is_logged_in"]:
     show_login_screen()
     st.stop()
 
-# --- データ読み込み ---
-df_batting = load_batting_data()
-df_pitching = load_pitching_data()
+# --- データ読み込み（打撃は判定フラグ付き） ---
+dataset = get_dataset()
+df_batting = dataset["batting_stats"]
+df_pitching = dataset["pitching"]
 
 # ==========================================
 # ✨ ヘッダーエリア
@@ -91,8 +91,11 @@ page = option_menu(
 
 # --- 画面表示 ---
 if page == "チーム成績":
+    from views import team_stats
     team_stats.show_team_stats(df_batting, df_pitching)
 elif page == "個人成績":
+    from views import personal_stats
     personal_stats.show_personal_stats(df_batting, df_pitching)
 elif page == "データ分析":
+    from views import analysis
     analysis.show_analysis_page(df_batting, df_pitching)
\ No newline at end of file
@@ -1 +0,0 @@
-from . import batting, pitching, team_stats, personal_stats, edit_data, analysis, ideal_order, player_management
\ No newline at end of file
@@ -8,6 +8,10 @@ from streamlit_gsheets import GSheetsConnection
 from config.settings import OFFICIAL_GAME_TYPES, SPREADSHEET_URL
 from utils.players import get_stats_active_players
 from utils.ui import fmt_player_name
+from utils.stats_kernel import enrich_batting
+from utils import metrics
+from utils.game_summary import build_game_summary
+from utils.db import data_version
 # 🌟 ideal_order ビューの読み込み
 from views.ideal_order import show_ideal_order_tab
 
@@ -37,6 +41,16 @@ def filter_players(df, exclude_set):
 
     return df[mask]
 
+
+@st.cache_data(ttl=600, max_entries=32)
+def _game_summary(version, _df_b, _df_p):
+    """絞り込み済みの打撃・投手データの試合サマリー（打撃の行がある試合だけ。version は絞り込み条件を含むキー）"""
+    if _df_b.empty:
+        _df_p = _df_p.iloc[0:0]
+    else:
+        _df_p = _df_p[_df_p["game_id"].isin(_df_b["game_id"].unique())]
+    return build_game_summary(_df_b, _df_p)
+
 # =========================================================
 # メインの表示関数
 # =========================================================
@@ -52,6 +66,8 @@ def show_analysis_page(df_batting, df_pitching):
 
     # 個人成績と同様に、非表示対象の選手をデータフレームからあらかじめ除外する
     allowed_names = STATS_PLAYERS + ["チーム記録"]
+    # 試合サマリーのキャッシュは絞り込む前のデータのバージョンで引く
+    version = (data_version(df_batting), data_version(df_pitching), tuple(allowed_names))
     
     if not df_batting.empty:
         df_batting = df_batting[df_batting["選手名"].isin(allowed_names)].copy()
@@ -76,59 +92,12 @@ def show_analysis_page(df_batting, df_pitching):
     df_b_all = df_batting.copy()
     df_p_all = df_pitching.copy()
 
-    required_columns = ["is_hit", "is_ab", "is_hr", "is_so", "is_1b",
-                        "is_2b", "is_3b", "is_bb", "is_sf", "is_sh", "is_int", "is_pa", "bases", "打点", "盗塁", "得点"]
-    for col in required_columns:
-        if col not in df_b_all.columns:
-            df_b_all[col] = 0
-
-    if not df_b_all.empty and "結果" in df_b_all.columns:
-        df_b_all["結果"] = df_b_all["結果"].astype(str).str.replace(r"\s+", "", regex=True)
-
-        df_b_all["is_hit"] = df_b_all["結果"].str.contains(
-            "単打|二塁打|三塁打|本塁打", na=False).astype(int)
-
-        non_ab_pattern = "四球|死球|四死球|犠打|犠飛|打撃妨害|得点|盗塁|牽制|代走|走塁|暴投|捕逸|ボーク|守備|交代"
-        is_valid = ~df_b_all["結果"].isin(["", "nan", "None", "-"])
-        is_not_excluded = ~df_b_all["結果"].str.contains(non_ab_pattern, na=False)
-        df_b_all["is_ab"] = (is_valid & is_not_excluded).astype(int)
-
-        df_b_all["is_hr"] = df_b_all["結果"].str.contains("本塁打", na=False).astype(int)
-        df_b_all["is_so"] = df_b_all["結果"].str.contains("三振", na=False).astype(int)
-        df_b_all["is_1b"] = df_b_all["結果"].str.contains("単打", na=False).astype(int)
-        df_b_all["is_2b"] = df_b_all["結果"].str.contains("二塁打", na=False).astype(int)
-        df_b_all["is_3b"] = df_b_all["結果"].str.contains("三塁打", na=False).astype(int)
-        
-        df_b_all["is_bb"] = df_b_all["結果"].str.contains("四球|死球|四死球", na=False).astype(int)
-        df_b_all["is_sf"] = df_b_all["結果"].str.contains("犠飛", na=False).astype(int)
-        df_b_all["is_sh"] = df_b_all["結果"].str.contains("犠打|バント", na=False).astype(int)
-        df_b_all["is_int"] = df_b_all["結果"].str.contains("妨害", na=False).astype(int)
-
-        df_b_all["is_pa"] = ((df_b_all["is_ab"] > 0) | 
-                             (df_b_all["is_bb"] > 0) | 
-                             (df_b_all["is_sf"] > 0) | 
-                             (df_b_all["is_sh"] > 0) | 
-                             (df_b_all["is_int"] > 0)).astype(int)
-
-        df_b_all["bases"] = (
-            df_b_all["is_1b"] * 1 + df_b_all["is_2b"] * 2 +
-            df_b_all["is_3b"] * 3 + df_b_all["is_hr"] * 4
-        )
-
-        for c in ["打点", "盗塁", "得点"]:
-            df_b_all[c] = pd.to_numeric(df_b_all[c], errors='coerce').fillna(0)
+    # 打席結果の判定フラグ（安打・打数・塁打・打席など）は共通カーネルで付与する
+    df_b_all = enrich_batting(df_b_all)
 
     # 名前の強力クリーニング
     df_b_all["選手名"] = df_b_all["選手名"].astype(str).str.replace(" ", " ").str.strip()
 
-    # 日付変換とYear列の作成
-    df_b_all["Date"] = pd.to_datetime(df_b_all["日付"], errors='coerce')
-    df_b_all["Year"] = df_b_all["Date"].dt.year.astype(str).str.replace('.0', '', regex=False)
-    
-    if not df_p_all.empty:
-        df_p_all["Date"] = pd.to_datetime(df_p_all["日付"], errors='coerce')
-        df_p_all["Year"] = df_p_all["Date"].dt.year.astype(str).str.replace('.0', '', regex=False)
-
     df_b_unfiltered = df_b_all.copy()
 
     # =========================================================
@@ -162,61 +131,12 @@ def show_analysis_page(df_batting, df_pitching):
     # ---------------------------------------------------------
     # ゲーム単位のデータセット作成 (得点計算 + FirstScore判定)
     # ---------------------------------------------------------
-    games_list = []
-    for (d, opp, m_type), g_b in df_b.groupby(["Date", "対戦相手", "試合種別"]):
-        g_p = df_p[(df_p["Date"] == d) & (df_p["対戦相手"] == opp)
-                   & (df_p["試合種別"] == m_type)]
-
-        is_team_rec = g_b["選手名"].astype(str).str.contains("チーム記録", na=False)
-        team_rows = g_b[is_team_rec]
-        indiv_rows = g_b[~is_team_rec]
-
-        if not team_rows.empty:
-            my_score = pd.to_numeric(
-                team_rows["得点"], errors='coerce').fillna(0).sum()
-        else:
-            my_score = pd.to_numeric(
-                indiv_rows["得点"], errors='coerce').fillna(0).sum()
-
-        is_p_team_rec = g_p["選手名"].astype(str).str.contains("チーム記録", na=False)
-        p_team_rows = g_p[is_p_team_rec]
-        p_indiv_rows = g_p[~is_p_team_rec]
-
-        if not p_team_rows.empty:
-            opp_score = pd.to_numeric(
-                p_team_rows["失点"], errors='coerce').fillna(0).sum()
-        else:
-            opp_score = pd.to_numeric(
-                p_indiv_rows["失点"], errors='coerce').fillna(0).sum()
-
-        res = "Win" if my_score > opp_score else (
-            "Lose" if my_score < opp_score else "Draw")
-
-        def get_inn_num(t):
-            t = str(t).replace("回", "")
-            return int(t) if t.isdigit() else 99
+    # 除外選手・年度・試合種別で絞り込んだ後のデータから作る（除外選手の得点や安打は含めない）
+    df_games = _game_summary((*version, tuple(sorted(exclude_set)), selected_year, selected_type), df_b, df_p)
 
-        my_inn_scores = g_b[g_b["イニング"].astype(str).str.contains("回")].copy()
-        my_inn_scores["InnNum"] = my_inn_scores["イニング"].apply(get_inn_num)
-        my_score_inns = my_inn_scores[pd.to_numeric(
-            my_inn_scores["得点"], errors='coerce') > 0].sort_values("InnNum")
-        min_my_inn = my_score_inns["InnNum"].iloc[0] if not my_score_inns.empty else 99
-
-        opp_inn_scores = g_p[g_p["イニング"].astype(str).str.contains("回")].copy()
-        opp_inn_scores["InnNum"] = opp_inn_scores["イニング"].apply(get_inn_num)
-        opp_score_inns = opp_inn_scores[pd.to_numeric(
-            opp_inn_scores["失点"], errors='coerce') > 0].sort_values("InnNum")
-        min_opp_inn = opp_score_inns["InnNum"].iloc[0] if not opp_score_inns.empty else 99
-
-        first_score_team = "自チーム" if min_my_inn < min_opp_inn else (
-            "相手" if min_opp_inn < min_my_inn else "なし(0-0)")
-
-        games_list.append({
-            "Date": d, "Opponent": opp, "MyScore": my_score,
-            "OppScore": opp_score, "Result": res, "FirstScore": first_score_team
-        })
-
-    df_games = pd.DataFrame(games_list)
+    df_games = df_games.rename(columns={
+        "日付": "Date", "対戦相手": "Opponent", "得点": "MyScore", "失点": "OppScore"
+    })[["Date", "Opponent", "MyScore", "OppScore", "Result", "FirstScore"]]
 
     # ---------------------------------------------------------
     # タブ構成
@@ -386,7 +306,7 @@ def show_analysis_page(df_batting, df_pitching):
                         str).str.match(r"^[1-9]回$")]
                     df_i["得点"] = pd.to_numeric(
                         df_i[score_col], errors='coerce').fillna(0)
-                    return df_i.groupby("イニング")["得点"].sum()
+                    return df_i.groupby("イニング", observed=True)["得点"].sum()
 
                 inn_scores = aggregate_innings(df_b, "得点")
                 inn_lost = aggregate_innings(df_p, "失点")
@@ -438,11 +358,7 @@ def show_analysis_page(df_batting, df_pitching):
                 平均失点=("OppScore", "mean")
             ).reset_index()
 
-            opp_stats["勝率"] = opp_stats.apply(
-                lambda x: x["勝利"] / (x["勝利"] + x["敗戦"]
-                                     ) if (x["勝利"] + x["敗戦"]) > 0 else 0,
-                axis=1
-            )
+            opp_stats["勝率"] = metrics.win_pct(opp_stats["勝利"], opp_stats["敗戦"])
 
             opp_stats = opp_stats.sort_values(
                 "試合数", ascending=False).reset_index(drop=True)
@@ -484,9 +400,9 @@ def show_analysis_page(df_batting, df_pitching):
         st.markdown("## 🔍 詳細投打データ分析 (2026年以降)")
         st.caption("※詳細な記録を取り始めた2026年以降のデータを集計しています。打球の種類ごとの傾向を追加しました。")
 
-        df_b_detail = df_batting[pd.to_datetime(df_batting["日付"], errors='coerce').dt.year >= 2026].copy(
+        df_b_detail = df_batting[df_batting["date"].dt.year >= 2026].copy(
         ) if not df_batting.empty else pd.DataFrame()
-        df_p_detail = df_pitching[pd.to_datetime(df_pitching["日付"], errors='coerce').dt.year >= 2026].copy(
+        df_p_detail = df_pitching[df_pitching["date"].dt.year >= 2026].copy(
         ) if not df_pitching.empty else pd.DataFrame()
 
         def remove_outfield_goro_error(df):
@@ -883,7 +799,7 @@ def show_analysis_page(df_batting, df_pitching):
                     elif "三振" in df_calc.columns:
                         agg_dict["三振"] = "sum"
 
-                    stats = df_calc.groupby("選手名").agg(agg_dict).reset_index()
+                    stats = df_calc.groupby("選手名", observed=True).agg(agg_dict).reset_index()
 
                     rename_dict = {
                         "is_pa": "PA",
@@ -912,18 +828,9 @@ def show_analysis_page(df_batting, df_pitching):
                     stats = stats[stats["AB"] >= min_ab]
 
                     if not stats.empty:
-                        stats["AVG"] = stats.apply(lambda x: x["Hit"] / x["AB"] if x["AB"] > 0 else 0, axis=1)
-                        stats["OBP_Denom"] = stats["AB"] + stats["BB"] + stats["SF"]
-                        stats["OBP"] = stats.apply(lambda x: (x["Hit"] + x["BB"]) / x["OBP_Denom"] if x["OBP_Denom"] > 0 else 0, axis=1)
-                        stats["SLG"] = stats.apply(lambda x: x["TB"] / x["AB"] if x["AB"] > 0 else 0, axis=1)
-                        stats["OPS"] = stats["OBP"] + stats["SLG"]
-                        stats["K_rate"] = stats.apply(lambda x: x["SO"] / x["PA"] if x["PA"] > 0 else 0, axis=1)
-                        
-                        stats["RC"] = stats.apply(
-                            lambda x: ((x["Hit"] + x["BB"]) * x["TB"]) / (x["AB"] + x["BB"]) if (x["AB"] + x["BB"]) > 0 else 0, 
-                            axis=1
-                        )
-                        stats["RC_per_PA"] = stats.apply(lambda x: x["RC"] / x["PA"] if x["PA"] > 0 else 0, axis=1)
+                        rates = metrics.batting_rates(stats["Hit"], stats["AB"], stats["BB"], stats["SF"], stats["TB"], stats["SO"], pa=stats["PA"])
+                        for col in ["AVG", "OBP", "SLG", "OPS", "K_rate", "RC", "RC_per_PA"]:
+                            stats[col] = rates[col]
 
                         candidates = stats.copy()
 
@@ -988,30 +895,15 @@ def show_analysis_page(df_batting, df_pitching):
                                 temp_so = df_p_calc["結果"].isin(["三振", "振り逃げ三振"]).astype(int) if "結果" in df_p_calc.columns else 0
                                 df_p_calc["total_so"] = df_p_calc[["奪三振", "is_so"]].max(axis=1) if "奪三振" in df_p_calc.columns else temp_so
 
-                                p_agg = df_p_calc.groupby("選手名").agg(
+                                p_agg = df_p_calc.groupby("選手名", observed=True).agg(
                                     outs=("アウト数", "sum"),
                                     er=("自責点", "sum"),
                                     so=("total_so", "sum")
                                 ).reset_index()
 
                                 p_agg["投球回"] = p_agg["outs"] / 3
-                                p_agg["投手_防御率"] = p_agg.apply(lambda x: (x["er"] * 7) / x["投球回"] if x["投球回"] > 0 else 99.0, axis=1)
-
-                                def calc_pitching_score(row):
-                                    p_inn = row.get("投球回", 0)
-                                    p_era = row.get("投手_防御率", 99.0)
-                                    p_so = row.get("so", 0)
-                                    if p_inn <= 0 or p_era >= 90:
-                                        return 0.0
-                                    inn_pts = p_inn * 1.0
-                                    so_pts = p_so * 0.3
-                                    if p_era <= 3.50:
-                                        era_pts = (3.50 - p_era) * p_inn * 0.5
-                                    else:
-                                        era_pts = (3.50 - p_era) * p_inn * 0.2
-                                    return max(0.0, inn_pts + so_pts + era_pts)
-
-                                p_agg["Pitching_Score"] = p_agg.apply(calc_pitching_score, axis=1)
+                                p_agg["投手_防御率"] = metrics.era(p_agg["er"], p_agg["outs"], default=99.0)
+                                p_agg["Pitching_Score"] = metrics.pitching_score(p_agg["投球回"], p_agg["投手_防御率"], p_agg["so"])
                                 
                                 valid_candidates = set(candidates["選手名"])
                                 p_agg_filtered = p_agg[p_agg["選手名"].isin(valid_candidates)]
@@ -1066,7 +958,7 @@ def show_analysis_page(df_batting, df_pitching):
                         p_df = df_calc[df_calc["選手名"].isin(other_used) & df_calc["位置"].isin(FIELD_POSITIONS)] if "位置" in df_calc.columns else pd.DataFrame()
                         
                         if not p_df.empty:
-                            pos_counts = p_df.groupby(["選手名", "位置"]).size().reset_index(name="count")
+                            pos_counts = p_df.groupby(["選手名", "位置"], observed=True).size().reset_index(name="count")
                             pos_counts = pos_counts.sort_values("count", ascending=False)
                         else:
                             pos_counts = pd.DataFrame(columns=["選手名", "位置", "count"])
@@ -1172,16 +1064,16 @@ def show_analysis_page(df_batting, df_pitching):
                 df_order_base["打順_num"] = df_order_base["打順"].apply(safe_extract_order)
 
                 # 9番までの試合のみを抽出
-                game_max_order = df_order_base.groupby(["Date", "対戦相手", "試合種別"])["打順_num"].max().reset_index()
-                valid_games = game_max_order[(game_max_order["打順_num"] >= 1) & (game_max_order["打順_num"] <= 9)][["Date", "対戦相手", "試合種別"]]
+                game_max_order = df_order_base.groupby("game_id")["打順_num"].max()
+                valid_games = game_max_order[(game_max_order >= 1) & (game_max_order <= 9)].index
                 
-                df_order_base = pd.merge(df_order_base, valid_games, on=["Date", "対戦相手", "試合種別"], how="inner")
-                df_order = pd.merge(df_order, valid_games, on=["Date", "対戦相手", "試合種別"], how="inner")
+                df_order_base = df_order_base[df_order_base["game_id"].isin(valid_games)]
+                df_order = df_order[df_order["game_id"].isin(valid_games)]
 
                 df_order = df_order[(df_order["打順_num"] >= 1) & (df_order["打順_num"] <= 9)]
                 df_order["打順_num"] = df_order["打順_num"].astype(int)
 
-                total_games_local = len(df_order_base[["Date", "対戦相手", "試合種別"]].drop_duplicates())
+                total_games_local = df_order_base["game_id"].nunique()
 
                 if not df_order.empty and total_games_local > 0:
                     order_stats = df_order.groupby("打順_num").agg(
@@ -1198,19 +1090,10 @@ def show_analysis_page(df_batting, df_pitching):
                     
                     order_stats["1試合PA"] = order_stats["PA"] / total_games_local
 
-                    order_stats["AVG"] = order_stats.apply(lambda x: x["Hit"] / x["AB"] if x["AB"] > 0 else 0, axis=1)
-                    order_stats["OBP_Denom"] = order_stats["AB"] + order_stats["BB"] + order_stats["SF"]
-                    order_stats["OBP"] = order_stats.apply(
-                        lambda x: (x["Hit"] + x["BB"]) / x["OBP_Denom"] if x["OBP_Denom"] > 0 else 0, axis=1
-                    )
-                    order_stats["SLG"] = order_stats.apply(lambda x: x["TB"] / x["AB"] if x["AB"] > 0 else 0, axis=1)
-                    order_stats["OPS"] = order_stats["OBP"] + order_stats["SLG"]
-                    
-                    # 🌟 RC（得点創出）の計算を追加
-                    order_stats["RC"] = order_stats.apply(
-                        lambda x: ((x["Hit"] + x["BB"]) * x["TB"]) / (x["AB"] + x["BB"]) if (x["AB"] + x["BB"]) > 0 else 0, 
-                        axis=1
-                    )
+                    # 🌟 打率・出塁率・長打率・OPS・RC（得点創出）をまとめて計算
+                    rates = metrics.batting_rates(order_stats["Hit"], order_stats["AB"], order_stats["BB"], order_stats["SF"], order_stats["TB"], 0, pa=order_stats["PA"])
+                    for col in ["AVG", "OBP", "SLG", "OPS", "RC"]:
+                        order_stats[col] = rates[col]
 
                     disp_df = order_stats[["打順_num", "1試合PA", "AVG", "OBP", "OPS", "RC", "HR", "RBI"]].copy()
                     disp_df = disp_df.rename(columns={"打順_num": "打順", "AVG": "打率", "OBP": "出塁率", "RC": "RC", "HR": "本塁打", "RBI": "打点"})
@@ -1,22 +1,19 @@
 import streamlit as st
 import pandas as pd
 import datetime
-from streamlit_gsheets import GSheetsConnection
-from config.settings import ALL_POSITIONS, SPREADSHEET_URL
+from config.settings import ALL_POSITIONS
+from utils.db import make_game_id
+from utils.dataset import game_rows
+from utils.game_state import batting_game_state
+from utils.write_queue import enqueue_rows
+from utils.cache_registry import invalidate
 from utils.players import get_active_players
-from utils.ui import render_scoreboard, render_out_indicator_3, show_homerun_effect, fmt_player_name
+from utils.ui import render_scoreboard, render_out_indicator_3, render_write_status, show_homerun_effect, fmt_player_name
 
 # --- ヘルパー関数 ---
 def local_fmt(name):
     return fmt_player_name(name, st.session_state.get("shared_player_numbers", {}))
 
-# ★ 打席としてカウントする（打順を進める）結果のリスト
-PA_RESULTS = [
-    "凡退(ゴロ)", "凡退(フライ)", "単打", "二塁打", "三塁打", "本塁打", 
-    "三振", "四球", "死球", "犠打(ゴロ)", "犠打(フライ)", "犠飛", 
-    "失策(ゴロ)", "失策(フライ)", "野選", "併殺打", "振り逃げ三振", "打撃妨害"
-]
-
 # ==========================================
 # メイン表示関数
 # ==========================================
@@ -24,7 +21,6 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
     ALL_PLAYERS, PLAYER_NUMBERS = get_active_players()
     st.session_state["shared_player_numbers"] = PLAYER_NUMBERS
     
-    conn = st.connection("gsheets", type=GSheetsConnection)
     
     ws_batting = "打撃成績"
     ws_pitching = "投手成績"
@@ -67,14 +63,12 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
         st.session_state["display_order_count"] = 9
 
     # ==========================================
-    # 2. データの読み込み & 即時反映キャッシュの適用
+    # 2. データの読み込み
     # ==========================================
+    # 登録した打席は書き込みキュー経由で読み込み結果に重なるので、画面側で別に抱えない
     is_kagura_top = (kagura_order == "先攻 (表)")
     target_date_str = pd.to_datetime(selected_date_str, errors='coerce').strftime('%Y-%m-%d')
-
-    cache_key = f"cache_batting_{selected_date_str}_{opp_team}_{match_type}"
-    if cache_key in st.session_state:
-        df_batting = st.session_state[cache_key]
+    game_id = make_game_id(target_date_str, opp_team, match_type)
 
     expected_batting_cols = ["日付", "イニング", "選手名", "位置", "結果", "打点", "得点", "グラウンド", "対戦相手", "試合種別", "打順", "打球方向", "スコアラー", "攻守"]
     if df_batting.empty:
@@ -90,57 +84,34 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
             if col not in df_pitching.columns:
                 df_pitching[col] = ""
 
-    if "日付" in df_batting.columns:
-        df_batting["_date_str"] = pd.to_datetime(df_batting["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
-        today_batting_df = df_batting[
-            (df_batting["_date_str"] == target_date_str) & 
-            (df_batting["対戦相手"].astype(str).str.strip() == str(opp_team).strip()) & 
-            (df_batting["試合種別"].astype(str).str.strip() == str(match_type).strip())
-        ]
-    else:
+    # この試合の行は game_id の索引から直接引く（履歴全体を走査しない）
+    today_batting_df = game_rows("batting", game_id)
+    if today_batting_df.empty:
         today_batting_df = pd.DataFrame(columns=expected_batting_cols)
-
-    if not df_pitching.empty and "日付" in df_pitching.columns:
-        df_pitching["_date_str"] = pd.to_datetime(df_pitching["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
-        today_pitching_df = df_pitching[
-            (df_pitching["_date_str"] == target_date_str) & 
-            (df_pitching["対戦相手"].astype(str).str.strip() == str(opp_team).strip()) & 
-            (df_pitching["試合種別"].astype(str).str.strip() == str(match_type).strip())
-        ]
     else:
-        today_pitching_df = pd.DataFrame()
+        for col in expected_batting_cols:
+            if col not in today_batting_df.columns:
+                today_batting_df[col] = ""
+
+    today_pitching_df = game_rows("pitching", game_id) if not df_pitching.empty else pd.DataFrame()
+    if not today_pitching_df.empty:
+        for col in expected_pitching_cols:
+            if col not in today_pitching_df.columns:
+                today_pitching_df[col] = ""
 
     if "lineup_states" not in st.session_state:
         st.session_state["lineup_states"] = {}
 
-    if not today_batting_df.empty:
-        lineup_event_df = today_batting_df[today_batting_df["結果"].astype(str).isin(["スタメン", "守備変更", "交代", "試合前"])]
-        for i in range(15):
-            order_num = i + 1
-            order_rows = lineup_event_df[pd.to_numeric(lineup_event_df["打順"], errors='coerce') == order_num]
-            if not order_rows.empty:
-                latest_row = order_rows.iloc[-1]
-                latest_name = str(latest_row.get("選手名", "")).strip()
-                latest_pos = str(latest_row.get("位置", "")).strip()
-                if latest_name and latest_name not in ["nan", "チーム記録", ""]:
-                    st.session_state["lineup_states"][i] = {
-                        "name": latest_name,
-                        "pos": latest_pos if latest_pos and latest_pos != "nan" else "－"
-                    }
+    # この試合の状態（打順・アウト数・打席履歴）は増えた行だけを取り込んで更新する
+    game_state = batting_game_state(game_id, today_batting_df)
+    st.session_state["lineup_states"].update(game_state.lineup)
 
     if not match_changed and not today_batting_df.empty:
-        valid_inn_df = today_batting_df[~today_batting_df["イニング"].astype(str).isin(["まとめ入力", "試合終了", "", "nan"])]
-        if not valid_inn_df.empty:
-            st.session_state["persistent_inn"] = valid_inn_df.iloc[-1]["イニング"]
-
-        if "scorer_name_ui" not in st.session_state:
-            valid_scorer_df = today_batting_df[
-                (today_batting_df["スコアラー"].astype(str).str.strip() != "") & 
-                (today_batting_df["スコアラー"].astype(str).str.strip() != "0") &
-                (today_batting_df["スコアラー"].astype(str).str.strip() != "nan")
-            ]
-            if not valid_scorer_df.empty:
-                st.session_state["scorer_name_ui"] = valid_scorer_df.iloc[-1]["スコアラー"]
+        if game_state.last_inning:
+            st.session_state["persistent_inn"] = game_state.last_inning
+
+        if "scorer_name_ui" not in st.session_state and game_state.last_scorer is not None:
+            st.session_state["scorer_name_ui"] = game_state.last_scorer
 
         for idx in range(15):
             name_key = f"sn{idx}"
@@ -168,72 +139,11 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
         scoreboard_df = today_batting_df
 
     render_scoreboard(scoreboard_df, today_pitching_df, selected_date_str, match_type, ground_name, opp_team, is_kagura_top)
+    render_write_status()
     st.divider()
 
     # ==========================================
-    # 4. 高速化のための事前一括集計 (辞書化)
-    # ==========================================
-    player_history_dict = {}
-    if not today_batting_df.empty:
-        valid_history_df = today_batting_df[~today_batting_df["結果"].isin(["スタメン", "守備変更", "交代", "ベンチ"])]
-        if not valid_history_df.empty:
-            for clean_name, group in valid_history_df.groupby("選手名"):
-                history_html = []
-                count = 0
-                stolen_base_count = 0
-                total_runs = 0
-                
-                for _, row in group.iterrows():
-                    res = row['結果']
-                    runs_val = pd.to_numeric(row['得点'], errors='coerce')
-                    rbi_val = pd.to_numeric(row['打点'], errors='coerce')
-                    
-                    r_val = int(runs_val) if pd.notna(runs_val) else 0
-                    total_runs += r_val
-                    
-                    if res == "盗塁":
-                        stolen_base_count += 1
-                        continue
-                    elif res in ["盗塁死", "走塁死", "牽制死", "走塁記録"]:
-                        continue
-                    
-                    count += 1
-                    res_short = {
-                        "本塁打":"本", "三塁打":"三", "二塁打":"二", "単打":"安", 
-                        "三振":"振", "凡退(ゴロ)":"ゴ", "凡退(フライ)":"飛", "四球":"球", "死球":"死", "犠打(ゴロ)":"犠", "犠打(フライ)":"犠", "犠飛":"犠飛", "失策(ゴロ)":"失", "失策(フライ)":"失", "野選":"野", "併殺打":"併", 
-                        "振り逃げ三振":"逃", "打撃妨害":"妨"
-                    }.get(res, res[:2])
-                    
-                    raw_dir = row['打球方向']
-                    p_dir = str(raw_dir) if pd.notna(raw_dir) and raw_dir != "---" else ""
-                    
-                    rbi_num = int(rbi_val) if pd.notna(rbi_val) else 0
-                    
-                    if rbi_num > 0:
-                        disp_text = f"{p_dir}{res_short}・{rbi_num}" if p_dir else f"{res_short}・{rbi_num}"
-                    else:
-                        disp_text = f"{p_dir}{res_short}" if p_dir else f"{res_short}"
-                    
-                    color_style = ""
-                    is_hit = res in ["単打", "二塁打", "三塁打", "本塁打"]
-                    
-                    if is_hit and rbi_num > 0:
-                        color_style = "color: red;"
-                    elif is_hit:
-                        color_style = "color: blue;"
-                        
-                    history_html.append(f"<span style='{color_style}'>{count}({disp_text})</span>")
-                
-                if stolen_base_count > 0:
-                    history_html.append(f"<span style='color: #800080;'>盗{stolen_base_count}</span>")
-                
-                if total_runs > 0:
-                    history_html.append(f"<span style='color: green;'>得{total_runs}</span>")
-                
-                player_history_dict[str(clean_name).strip()] = " ".join(history_html)
-
-    # ==========================================
-    # 5. 登録処理関数 (submit_everything) の定義
+    # 4. 登録処理関数 (submit_everything) の定義
     # ==========================================
     def submit_everything(inn_val):
         rows_to_add = []
@@ -249,11 +159,7 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
         if "saved_lineup" not in st.session_state:
             st.session_state["saved_lineup"] = {}
 
-        has_today_lineup = False
-        if not today_batting_df.empty:
-            has_today_lineup = not today_batting_df[today_batting_df["結果"].astype(str) == "スタメン"].empty
-
-        if not has_today_lineup:
+        if not game_state.has_lineup:
             for i in range(display_count):
                 name_val = st.session_state.get(f"sn{i}")
                 pos_val = st.session_state.get(f"sp{i}")
@@ -335,12 +241,7 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
                         st.session_state["lineup_states"][i] = {"name": clean_name, "pos": current_pos}
 
         selected_bench = st.session_state.get("persistent_bench", [])
-        registered_bench_names = set()
-        if not today_batting_df.empty:
-            registered_bench_names = set(
-                today_batting_df[today_batting_df["結果"].astype(str) == "ベンチ"]["選手名"]
-                .astype(str).str.strip()
-            )
+        registered_bench_names = set(game_state.bench)
 
         for b_name in selected_bench:
             clean_b_name = b_name.split(" (")[0].strip()
@@ -378,13 +279,7 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
                     active_orders = idx_check + 1
                     break
             
-            if not today_batting_df.empty:
-                pa_df = today_batting_df[today_batting_df["結果"].astype(str).isin(PA_RESULTS)]
-            else:
-                pa_df = pd.DataFrame()
-            
-            total_pa = len(pa_df)
-            batter_idx = (total_pa + st.session_state.get("batter_offset", 0)) % active_orders
+            batter_idx = (game_state.pa_count + st.session_state.get("batter_offset", 0)) % active_orders
             target_batter_name = st.session_state.get(f"sn{batter_idx}", "")
             
             if target_batter_name:
@@ -437,18 +332,16 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
                     })
 
         if rows_to_add:
-            new_df_to_append = pd.DataFrame(rows_to_add)
+            # シートへ送るのは今回の追加行だけ
+            rows_for_sheet = pd.DataFrame(rows_to_add)
             dt_parsed = pd.to_datetime(selected_date_str, errors='coerce')
-            formatted_date = dt_parsed.strftime('%Y-%m-%d') if pd.notna(dt_parsed) else current_date_formatted
             
-            new_df_to_append["日付_dt"] = dt_parsed
-            new_df_to_append["Year"] = dt_parsed.year if pd.notna(dt_parsed) else datetime.datetime.now().year
-            new_df_to_append["_date_str"] = formatted_date
+            rows_for_sheet["Year"] = dt_parsed.year if pd.notna(dt_parsed) else datetime.datetime.now().year
 
-            updated_full_df = pd.concat([df_batting, new_df_to_append], ignore_index=True)
             try:
-                conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_batting, data=updated_full_df)
-                st.session_state[cache_key] = updated_full_df
+                # シートへはバックグラウンドでまとめて送る（画面にはすぐ反映される）
+                enqueue_rows(ws_batting, rows_for_sheet)
+                invalidate("batting")
                 
                 st.session_state["quick_clear_counter"] = st.session_state.get("quick_clear_counter", 0) + 1
 
@@ -460,32 +353,25 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
             st.warning("登録する内容がありません。打席結果やスタメンを入力してください。")
 
     # ==========================================
-    # 6. 詳細入力部分（st.fragment で部分リフレッシュに対応）
+    # 5. 詳細入力部分（st.fragment で部分リフレッシュに対応）
     # ==========================================
     this_year = datetime.datetime.now().year
-    if not df_batting.empty:
-        df_batting["日付_dt"] = pd.to_datetime(df_batting["日付"], errors='coerce')
-        df_this_season = df_batting[df_batting["日付_dt"].dt.year == this_year].copy()
+    if not df_batting.empty and "date" in df_batting.columns:
+        df_this_season = df_batting[df_batting["date"].dt.year == this_year].copy()
     else:
         df_this_season = pd.DataFrame()
 
     inn_list = [f"{i}回{b_inning_suffix}" for i in range(1, 10)] + [f"延長{b_inning_suffix}"]
     current_inn_val = st.session_state.get("persistent_inn", f"1回{b_inning_suffix}")
     
-    if not today_batting_df.empty:
-        inn_df_check = today_batting_df[today_batting_df["イニング"] == current_inn_val]
-        single_out_list = ["凡退(ゴロ)", "凡退(フライ)", "三振", "犠打(ゴロ)", "犠打(フライ)", "犠飛", "走塁死", "盗塁死", "振り逃げ三振", "野選", "牽制死"]
-        s_outs = len(inn_df_check[inn_df_check["結果"].isin(single_out_list)])
-        d_outs = len(inn_df_check[inn_df_check["結果"] == "併殺打"]) * 2
-        
-        if (s_outs + d_outs) >= 3:
-            try:
-                curr_idx = inn_list.index(current_inn_val)
-                if curr_idx < len(inn_list) - 1:
-                    current_inn_val = inn_list[curr_idx + 1]
-                    st.session_state["persistent_inn"] = current_inn_val
-            except ValueError:
-                pass
+    if game_state.outs(current_inn_val) >= 3:
+        try:
+            curr_idx = inn_list.index(current_inn_val)
+            if curr_idx < len(inn_list) - 1:
+                current_inn_val = inn_list[curr_idx + 1]
+                st.session_state["persistent_inn"] = current_inn_val
+        except ValueError:
+            pass
 
     col_adj1, col_adj2, col_adj3, col_adj4 = st.columns([2.5, 1.0, 1.0, 1.0])
     with col_adj1:
@@ -519,13 +405,7 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
             st.session_state["persistent_inn"] = curr_inn
         
         with c_outs:
-            disp_outs = 0
-            if not today_batting_df.empty:
-                inn_df = today_batting_df[today_batting_df["イニング"] == curr_inn]
-                single_out_list = ["凡退(ゴロ)", "凡退(フライ)", "三振", "犠打(ゴロ)", "犠打(フライ)", "犠飛", "走塁死", "盗塁死", "振り逃げ三振", "野選", "牽制死"]
-                s_outs = len(inn_df[inn_df["結果"].isin(single_out_list)])
-                d_outs = len(inn_df[inn_df["結果"] == "併殺打"]) * 2
-                disp_outs = (s_outs + d_outs) % 3
+            disp_outs = game_state.outs(curr_inn) % 3
             st.markdown(render_out_indicator_3(disp_outs), unsafe_allow_html=True)
 
         active_orders = 9
@@ -535,13 +415,7 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
                 active_orders = i + 1
                 break
 
-        if not today_batting_df.empty:
-            valid_pa_df = today_batting_df[today_batting_df["結果"].astype(str).isin(PA_RESULTS)]
-            total_pa_count = len(valid_pa_df)
-        else:
-            total_pa_count = 0
-
-        current_batter_index = (total_pa_count + st.session_state.get("batter_offset", 0)) % active_orders
+        current_batter_index = (game_state.pa_count + st.session_state.get("batter_offset", 0)) % active_orders
         current_order_num = current_batter_index + 1
         
         raw_batter_name = st.session_state.get(f"sn{current_batter_index}", "")
@@ -640,8 +514,7 @@ def show_batting_page(df_batting, df_pitching, selected_date_str, match_type, gr
                     history_text = ""
                     if sel_p_name_raw:
                         clean_name = sel_p_name_raw.split(" (")[0].strip()
-                        if clean_name in player_history_dict:
-                            history_text = player_history_dict[clean_name]
+                        history_text = game_state.history.get(clean_name, "")
                     st.markdown(f"<div style='font-size:15px; line-height:1.4; padding-top:6px; color:#444; overflow-x:auto; white-space:nowrap;'>{history_text}</div>", unsafe_allow_html=True)
 
         if submitted:
@@ -1,30 +1,7 @@
 import streamlit as st
-import pandas as pd
-from streamlit_gsheets import GSheetsConnection
-from config.settings import SPREADSHEET_URL
 from utils.players import get_active_players
-
-# 🌟 キャッシュを利用したリスト取得関数
-@st.cache_data(ttl=60)
-def get_cached_grounds():
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    try:
-        df_ground = conn.read(spreadsheet=SPREADSHEET_URL, worksheet="グラウンド登録", ttl=0)
-        return df_ground["グラウンド名"].dropna().tolist() if "グラウンド名" in df_ground.columns else ["その他"]
-    except Exception:
-        return ["その他"]
-
-@st.cache_data(ttl=60)
-def get_cached_opponents():
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    try:
-        df_opp = conn.read(spreadsheet=SPREADSHEET_URL, worksheet="相手チーム登録", ttl=0)
-        return df_opp["チーム名"].dropna().tolist() if "チーム名" in df_opp.columns else ["その他"]
-    except Exception:
-        return ["その他"]
-
-GROUND_LIST = get_cached_grounds()
-OPPONENTS_LIST = get_cached_opponents()
+from utils.db import save_worksheet, to_sheet_frame, get_cached_grounds, get_cached_opponents
+from utils.cache_registry import invalidate
 
 # --- 各種プルダウン用の選択肢を定義 ---
 RESULT_OPTIONS = [
@@ -43,6 +20,8 @@ def show_edit_page(df_batting, df_pitching, is_test_mode=False):
 
     # スプレッドシートから最新の選手一覧と背番号を取得
     ALL_PLAYERS, PLAYER_NUMBERS = get_active_players()
+    GROUND_LIST = get_cached_grounds()
+    OPPONENTS_LIST = get_cached_opponents()
 
     # 🧪 テストモード判定で書き込むシートを切り替え
     ws_batting = "打撃成績_テスト" if is_test_mode else "打撃成績"
@@ -56,24 +35,22 @@ def show_edit_page(df_batting, df_pitching, is_test_mode=False):
     # 🌟 打撃データ: 日付の新しい順、かつイニングの数字が大きい順（降順）にソート
     if not df_batting.empty and "日付" in df_batting.columns:
         df_batting = df_batting.copy()
-        df_batting["日付_dt"] = pd.to_datetime(df_batting["日付"], errors="coerce")
         df_batting["イニング_num"] = df_batting["イニング"].apply(extract_inning_num)
         
         df_batting = df_batting.sort_values(
-            by=["日付_dt", "イニング_num"], 
+            by=["date", "イニング_num"], 
             ascending=[False, False]
-        ).drop(columns=["日付_dt", "イニング_num"]).reset_index(drop=True)
+        ).drop(columns=["イニング_num"]).reset_index(drop=True)
 
     # 🌟 投手データ: 日付の新しい順、かつイニングの数字が大きい順（降順）にソート
     if not df_pitching.empty and "日付" in df_pitching.columns:
         df_pitching = df_pitching.copy()
-        df_pitching["日付_dt"] = pd.to_datetime(df_pitching["日付"], errors="coerce")
         df_pitching["イニング_num"] = df_pitching["イニング"].apply(extract_inning_num)
         
         df_pitching = df_pitching.sort_values(
-            by=["日付_dt", "イニング_num"], 
+            by=["date", "イニング_num"], 
             ascending=[False, False]
-        ).drop(columns=["日付_dt", "イニング_num"]).reset_index(drop=True)
+        ).drop(columns=["イニング_num"]).reset_index(drop=True)
 
     # --- Primaryボタンの色を「赤」に塗り替えるCSS ---
     st.markdown("""
@@ -102,7 +79,7 @@ def show_edit_page(df_batting, df_pitching, is_test_mode=False):
     # ========================================================
     with t1:
         st.subheader("打撃データの編集・削除")
-        df_b_work = df_batting.copy()
+        df_b_work = to_sheet_frame(df_batting)
         df_b_work.insert(0, "削除選択", False)
         
         # 🌟 指定された項目をプルダウン化
@@ -135,8 +112,8 @@ def show_edit_page(df_batting, df_pitching, is_test_mode=False):
 
         if st.button("チェックした行を削除 ＆ 修正内容を保存", type="primary", use_container_width=True, key="del_bat_btn"):
             new_df = edited_b[edited_b["削除選択"] == False].drop(columns=["削除選択"])
-            conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_batting, data=new_df)
-            st.cache_data.clear()
+            save_worksheet(ws_batting, new_df)
+            invalidate("batting")
             st.success("更新しました")
             import time
             time.sleep(0.5)
@@ -147,7 +124,7 @@ def show_edit_page(df_batting, df_pitching, is_test_mode=False):
     # ========================================================
     with t2:
         st.subheader("投手データの編集・削除")
-        df_p_work = df_pitching.copy()
+        df_p_work = to_sheet_frame(df_pitching)
         df_p_work.insert(0, "削除選択", False)
         
         # 🌟 指定された項目をプルダウン化
@@ -182,8 +159,8 @@ def show_edit_page(df_batting, df_pitching, is_test_mode=False):
 
         if st.button("チェックした行を削除 ＆ 修正内容を保存 ", type="primary", use_container_width=True, key="del_pitch_btn"):
             new_df = edited_p[edited_p["削除選択"] == False].drop(columns=["削除選択"])
-            conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_pitching, data=new_df)
-            st.cache_data.clear()
+            save_worksheet(ws_pitching, new_df)
+            invalidate("pitching")
             st.success("更新しました")
             import time
             time.sleep(0.5)
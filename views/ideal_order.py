@@ -3,6 +3,9 @@ import streamlit as st
 import pandas as pd
 from utils.players import get_active_players
 from utils.ui import fmt_player_name
+from utils.stats_kernel import enrich_batting
+from utils.db import data_version
+from utils import metrics
 
 
 def local_fmt(name):
@@ -12,17 +15,9 @@ def local_fmt(name):
 def calculate_saber_metrics(stats):
     """集計された成績データからセイバーメトリクス指標とRC、各専用スコアを算出する"""
     stats["PA"] = stats["AB"] + stats["BB"] + stats["SF"]
-    stats["AVG"] = stats.apply(lambda x: x["Hit"] / x["AB"] if x["AB"] > 0 else 0, axis=1)
-    stats["OBP"] = stats.apply(lambda x: (x["Hit"] + x["BB"]) / x["PA"] if x["PA"] > 0 else 0, axis=1)
-    stats["SLG"] = stats.apply(lambda x: x["TB"] / x["AB"] if x["AB"] > 0 else 0, axis=1)
-    stats["OPS"] = stats["OBP"] + stats["SLG"]
-    stats["K_rate"] = stats.apply(lambda x: x["SO"] / x["PA"] if x["PA"] > 0 else 0, axis=1)
-    
-    stats["RC"] = stats.apply(
-        lambda x: ((x["Hit"] + x["BB"]) * x["TB"]) / (x["AB"] + x["BB"]) if (x["AB"] + x["BB"]) > 0 else 0, 
-        axis=1
-    )
-    stats["RC_per_PA"] = stats.apply(lambda x: x["RC"] / x["PA"] if x["PA"] > 0 else 0, axis=1)
+    rates = metrics.batting_rates(stats["Hit"], stats["AB"], stats["BB"], stats["SF"], stats["TB"], stats["SO"], pa=stats["PA"])
+    for col in ["AVG", "OBP", "SLG", "OPS", "K_rate", "RC", "RC_per_PA"]:
+        stats[col] = rates[col]
 
     stats["Score_1"] = (
         stats["OBP"] * 2.0
@@ -91,30 +86,15 @@ def assign_and_display_lineup(stats, pos_df, selected_players, season_pa_dict=No
             temp_so = df_p_sel["結果"].isin(["三振", "振り逃げ三振"]).astype(int) if "結果" in df_p_sel.columns else 0
             df_p_sel["total_so"] = df_p_sel[["奪三振", "is_so"]].max(axis=1) if "奪三振" in df_p_sel.columns else temp_so
 
-            p_agg = df_p_sel.groupby("選手名").agg(
+            p_agg = df_p_sel.groupby("選手名", observed=True).agg(
                 outs=("アウト数", "sum"),
                 er=("自責点", "sum"),
                 so=("total_so", "sum")
             ).reset_index()
 
             p_agg["投球回"] = p_agg["outs"] / 3
-            p_agg["投手_防御率"] = p_agg.apply(lambda x: (x["er"] * 7) / x["投球回"] if x["投球回"] > 0 else 99.0, axis=1)
-
-            def calc_pitching_score(row):
-                p_inn = row.get("投球回", 0)
-                p_era = row.get("投手_防御率", 99.0)
-                p_so = row.get("so", 0)
-                if p_inn <= 0 or p_era >= 90:
-                    return 0.0
-                inn_pts = p_inn * 1.0
-                so_pts = p_so * 0.3
-                if p_era <= 3.50:
-                    era_pts = (3.50 - p_era) * p_inn * 0.5
-                else:
-                    era_pts = (3.50 - p_era) * p_inn * 0.2
-                return max(0.0, inn_pts + so_pts + era_pts)
-
-            p_agg["Pitching_Score"] = p_agg.apply(calc_pitching_score, axis=1)
+            p_agg["投手_防御率"] = metrics.era(p_agg["er"], p_agg["outs"], default=99.0)
+            p_agg["Pitching_Score"] = metrics.pitching_score(p_agg["投球回"], p_agg["投手_防御率"], p_agg["so"])
             p_sorted = p_agg.sort_values(by="Pitching_Score", ascending=False)
             if not p_sorted.empty and p_sorted.iloc[0]["Pitching_Score"] > 0:
                 ace_player = p_sorted.iloc[0]["選手名"]
@@ -122,7 +102,7 @@ def assign_and_display_lineup(stats, pos_df, selected_players, season_pa_dict=No
     if not ace_player and pos_df is not None and not pos_df.empty:
         p_pitchers = pos_df[(pos_df["選手名"].isin(selected_players)) & (pos_df["位置"] == "投")]
         if not p_pitchers.empty:
-            ace_counts = p_pitchers.groupby("選手名").size().reset_index(name="count")
+            ace_counts = p_pitchers.groupby("選手名", observed=True).size().reset_index(name="count")
             ace_player = ace_counts.sort_values("count", ascending=False).iloc[0]["選手名"]
 
     if not ace_player and selected_players:
@@ -166,7 +146,7 @@ def assign_and_display_lineup(stats, pos_df, selected_players, season_pa_dict=No
     p_df = pos_df[pos_df["選手名"].isin(other_used) & pos_df["位置"].isin(valid_positions)] if pos_df is not None and not pos_df.empty else pd.DataFrame()
     
     if not p_df.empty:
-        pos_counts = p_df.groupby(["選手名", "位置"]).size().reset_index(name="count")
+        pos_counts = p_df.groupby(["選手名", "位置"], observed=True).size().reset_index(name="count")
         pos_counts = pos_counts.sort_values("count", ascending=False)
     else:
         pos_counts = pd.DataFrame(columns=["選手名", "位置", "count"])
@@ -260,6 +240,54 @@ def assign_and_display_lineup(stats, pos_df, selected_players, season_pa_dict=No
         st.info(f"📌 **条件未到達等のため配置外の選手**: {', '.join(unassigned)}")
 
 
+STAT_AGG = {
+    "is_ab": "sum", "is_hit": "sum", "is_bb": "sum", "is_sf": "sum",
+    "bases": "sum", "盗塁": "sum", "打点": "sum", "is_hr": "sum", "is_so": "sum"
+}
+STAT_NAMES = {
+    "is_ab": "AB", "is_hit": "Hit", "is_bb": "BB", "is_sf": "SF",
+    "bases": "TB", "盗塁": "SB", "打点": "RBI", "is_hr": "HR", "is_so": "SO"
+}
+
+@st.cache_data(ttl=600, max_entries=32)
+def _lineup_inputs(version, cleaned_selected_players, current_year, _df_batting):
+    """選択選手の打席データと通算・直近10打席の集計（データのバージョンと選択が同じなら使い回す）"""
+    df_calc = enrich_batting(_df_batting[_df_batting["選手名"] != "チーム記録"]).copy()
+    # このタブでは犠打・打撃妨害を打席数に含めない
+    df_calc["is_pa"] = ((df_calc["is_ab"] == 1) | (df_calc["is_bb"] == 1) | (df_calc["is_sf"] == 1)).astype(int)
+
+    # データ側の選手名も安全のためにクレンジング用列を作成
+    df_calc["選手名_clean"] = df_calc["選手名"].astype(str).apply(lambda x: x.split(" (")[0])
+    
+    df_selected = df_calc[df_calc["選手名_clean"].isin(cleaned_selected_players)].copy()
+    if df_selected.empty:
+        return None
+
+    df_this_season = df_selected[df_selected["date"].dt.year == current_year]
+    season_pa_dict = df_this_season.groupby("選手名", observed=True)["is_pa"].sum().to_dict()
+
+    # 通算：規定打数10打数以上
+    stats_all = df_selected.groupby("選手名", observed=True).agg(STAT_AGG).reset_index().rename(columns=STAT_NAMES)
+    stats_all = stats_all[stats_all["AB"] >= 10]
+    if not stats_all.empty:
+        stats_all = calculate_saber_metrics(stats_all)
+
+    # 直近10打席（四死球・犠飛含む）
+    df_selected["打順_num"] = pd.to_numeric(df_selected["打順"], errors="coerce")
+    df_sorted = df_selected.sort_values(by=["date", "打順_num"], ascending=[True, True])
+    df_pa = df_sorted[df_sorted["is_pa"] == 1]
+    df_recent10 = df_pa.groupby("選手名", observed=True).tail(10)
+
+    stats_recent = df_recent10.groupby("選手名", observed=True).agg(STAT_AGG).reset_index().rename(columns=STAT_NAMES)
+    stats_recent = stats_recent[(stats_recent["AB"] + stats_recent["BB"] + stats_recent["SF"]) > 0]
+    if not stats_recent.empty:
+        stats_recent = calculate_saber_metrics(stats_recent)
+
+    return {
+        "df_selected": df_selected, "season_pa_dict": season_pa_dict,
+        "stats_all": stats_all, "df_recent10": df_recent10, "stats_recent": stats_recent,
+    }
+
 def show_ideal_order_tab(df_batting, df_pitching=None):
     ALL_PLAYERS, PLAYER_NUMBERS = get_active_players()
     st.session_state["shared_player_numbers"] = PLAYER_NUMBERS
@@ -308,64 +336,23 @@ def show_ideal_order_tab(df_batting, df_pitching=None):
         st.warning("分析する打撃データがありません。")
         return
 
-    df_calc = df_batting[df_batting["選手名"] != "チーム記録"].copy()
-    df_calc["結果"] = df_calc["結果"].astype(str).str.replace(r"\s+", "", regex=True)
-
-    hit_pattern = "単打|二塁打|三塁打|本塁打"
-    df_calc["is_hit"] = df_calc["結果"].str.contains(hit_pattern, na=False).astype(int)
-    non_ab_pattern = "四球|死球|四死球|犠打|犠飛|打撃妨害|得点|盗塁|牽制|代走|走塁|暴投|捕逸|ボーク|守備|交代"
-    df_calc["is_ab"] = (~df_calc["結果"].isin(["", "nan", "None", "-"]) & ~df_calc["結果"].str.contains(non_ab_pattern, na=False)).astype(int)
-    
-    df_calc["is_bb"] = df_calc["結果"].str.contains("四球|死球|四死球", na=False).astype(int)
-    df_calc["is_sf"] = df_calc["結果"].str.contains("犠飛", na=False).astype(int)
-    df_calc["is_so"] = df_calc["結果"].str.contains("三振", na=False).astype(int)
-    df_calc["is_hr"] = df_calc["結果"].str.contains("本塁打", na=False).astype(int)
-    df_calc["is_1b"] = df_calc["結果"].str.contains("単打", na=False).astype(int)
-    df_calc["is_2b"] = df_calc["結果"].str.contains("二塁打", na=False).astype(int)
-    df_calc["is_3b"] = df_calc["結果"].str.contains("三塁打", na=False).astype(int)
-    df_calc["bases"] = df_calc["is_1b"] + (df_calc["is_2b"] * 2) + (df_calc["is_3b"] * 3) + (df_calc["is_hr"] * 4)
-    df_calc["is_pa"] = ((df_calc["is_ab"] == 1) | (df_calc["is_bb"] == 1) | (df_calc["is_sf"] == 1)).astype(int)
-
-    for c in ["打点", "盗塁"]:
-        df_calc[c] = pd.to_numeric(df_calc[c], errors='coerce').fillna(0)
+    cleaned_selected_players = tuple(p.split(" (")[0] for p in selected_players)
+    inputs = _lineup_inputs(data_version(df_batting), cleaned_selected_players, datetime.datetime.now().year, df_batting)
 
-    cleaned_selected_players = [p.split(" (")[0] for p in selected_players]
-    
-    # データ側の選手名も安全のためにクレンジング用列を作成
-    df_calc["選手名_clean"] = df_calc["選手名"].astype(str).apply(lambda x: x.split(" (")[0])
-    
-    df_selected = df_calc[df_calc["選手名_clean"].isin(cleaned_selected_players)].copy()
-
-    if df_selected.empty:
+    if inputs is None:
         st.warning("選択された選手の打席データがありません。")
         return
 
-    df_selected["日付_dt"] = pd.to_datetime(df_selected["日付"], errors="coerce")
-    current_year = datetime.datetime.now().year
-    df_this_season = df_selected[df_selected["日付_dt"].dt.year == current_year]
-    
-    season_pa_series = df_this_season.groupby("選手名")["is_pa"].sum()
-    season_pa_dict = season_pa_series.to_dict()
+    df_selected = inputs["df_selected"]
+    season_pa_dict = inputs["season_pa_dict"]
 
     tab_all, tab_recent = st.tabs(["📊 通算成績オーダー", "🔥 直近10打席オーダー"])
 
     with tab_all:
         st.write("全期間の通算成績をベースにした理想オーダーです。（※規定打数10打数以上の選手が対象）")
         
-        stats_all = df_selected.groupby("選手名").agg({
-            "is_ab": "sum", "is_hit": "sum", "is_bb": "sum", "is_sf": "sum",
-            "bases": "sum", "盗塁": "sum", "打点": "sum", "is_hr": "sum", "is_so": "sum"
-        }).reset_index()
-
-        stats_all = stats_all.rename(columns={
-            "is_ab": "AB", "is_hit": "Hit", "is_bb": "BB", "is_sf": "SF",
-            "bases": "TB", "盗塁": "SB", "打点": "RBI", "is_hr": "HR", "is_so": "SO"
-        })
-
-        stats_all = stats_all[stats_all["AB"] >= 10]
-
+        stats_all = inputs["stats_all"]
         if not stats_all.empty:
-            stats_all = calculate_saber_metrics(stats_all)
             assign_and_display_lineup(stats_all, df_selected, selected_players, season_pa_dict=season_pa_dict, df_pitching=df_pitching)
         else:
             st.warning("規定打数（10打数）に到達している選択選手がいません。")
@@ -373,25 +360,8 @@ def show_ideal_order_tab(df_batting, df_pitching=None):
     with tab_recent:
         st.write("各選手の直近10打席（四死球・犠飛含む）の成績をベースにした、現在の調子重視のオーダーです[cite: 3]。")
         
-        df_selected["打順_num"] = pd.to_numeric(df_selected["打順"], errors="coerce")
-        df_sorted = df_selected.sort_values(by=["日付_dt", "打順_num"], ascending=[True, True])
-        df_pa = df_sorted[df_sorted["is_pa"] == 1]
-        df_recent10 = df_pa.groupby("選手名").tail(10)
-        
-        stats_recent = df_recent10.groupby("選手名").agg({
-            "is_ab": "sum", "is_hit": "sum", "is_bb": "sum", "is_sf": "sum",
-            "bases": "sum", "盗塁": "sum", "打点": "sum", "is_hr": "sum", "is_so": "sum"
-        }).reset_index()
-
-        stats_recent = stats_recent.rename(columns={
-            "is_ab": "AB", "is_hit": "Hit", "is_bb": "BB", "is_sf": "SF",
-            "bases": "TB", "盗塁": "SB", "打点": "RBI", "is_hr": "HR", "is_so": "SO"
-        })
-
-        stats_recent = stats_recent[(stats_recent["AB"] + stats_recent["BB"] + stats_recent["SF"]) > 0]
-
+        stats_recent = inputs["stats_recent"]
         if not stats_recent.empty:
-            stats_recent = calculate_saber_metrics(stats_recent)
-            assign_and_display_lineup(stats_recent, df_recent10, selected_players, season_pa_dict=season_pa_dict, df_pitching=df_pitching)
+            assign_and_display_lineup(stats_recent, inputs["df_recent10"], selected_players, season_pa_dict=season_pa_dict, df_pitching=df_pitching)
         else:
             st.warning("直近の打席データを持つ選択選手がいません。")
\ No newline at end of file
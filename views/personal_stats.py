@@ -1,10 +1,182 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import datetime
 import unicodedata
 from config.settings import OFFICIAL_GAME_TYPES
 from utils.players import get_stats_active_players
 from utils.ui import fmt_player_name
+from utils.stats_kernel import enrich_batting
+from utils.db import data_version
+from utils import metrics
+
+# ==========================================
+# 🏆 ランキング用の集計（データのバージョンごとに1回）
+# ==========================================
+# 年度・月・規定打席などを切り替えるたびに全打席から集計し直さないよう、
+# 判定フラグ付きのデータ（勝敗の割り当て済み）と、期間（年度別・月間・直近3試合・歴代）ごとの
+# 選手別集計と率の指標をまとめて作っておく。画面側は規定打席・規定投球回で絞り込んで並べるだけ。
+# 毎回の再実行で複製（pickle）しないよう st.cache_resource で1つだけ持ち、全セッションで共有する
+# （utils.dataset と同じく、共有している DataFrame そのものは書き換えない約束）。
+
+AGG_RULES_B = {
+    "is_hit": "sum", "is_ab": "sum", "is_hr": "sum", "is_so": "sum",
+    "is_1b": "sum", "is_2b": "sum", "is_3b": "sum", "is_bb": "sum",
+    "is_sf": "sum", 
+    "打点": "sum", "盗塁": "sum", "盗塁死": "sum", "得点": "sum", "bases": "sum"
+}
+AGG_RULES_P = {
+    "アウト数": "sum", "自責点": "sum", "失点": "sum", 
+    "is_win": "sum", "is_lose": "sum", "被安打": "sum", 
+    "total_bb": "sum", "is_so": "sum", "奪三振": "sum"
+}
+# 歴代記録（シーズン最高）の規定：その年の試合数 × 係数
+REC_COEFF_AB = 1.0
+REC_COEFF_INN = 0.8
+
+def _prepare_batting(df_batting):
+    if df_batting.empty:
+        return pd.DataFrame(columns=["Year", "選手名", "結果", "is_hit", "is_ab", "is_hr", "is_so", "is_1b", "is_2b", "is_3b", "is_bb", "bases", "打点", "盗塁", "盗塁死", "得点"])
+    # Year は読み込み時に日付から作成済み
+    df_b_calc = df_batting[df_batting["選手名"] != "チーム記録"].copy()
+
+    # 打席結果の判定フラグ（安打・打数・塁打など）は共通カーネルで付与する
+    return enrich_batting(df_b_calc)
+
+def _prepare_pitching(df_pitching):
+    if df_pitching.empty:
+        return pd.DataFrame()
+    if "選手名" in df_pitching.columns:
+        df_p_calc = df_pitching[df_pitching["選手名"] != "チーム記録"].copy()
+    else:
+        df_p_calc = df_pitching.copy()
+
+    if "選手名" in df_p_calc.columns:
+        df_p_calc = df_p_calc[df_p_calc["選手名"] != "チーム記録"]
+        df_p_calc["選手名"] = df_p_calc["選手名"].replace("", pd.NA).fillna(df_p_calc["選手名"])
+    else:
+        df_p_calc["選手名"] = df_p_calc["選手名"]
+
+    df_p_calc = df_p_calc[df_p_calc["選手名"] != "チーム記録"]
+
+    df_p_calc["is_win"] = 0
+    df_p_calc["is_lose"] = 0
+
+    if "勝敗" in df_p_calc.columns:
+        match_keys = ["日付", "対戦相手"] if "対戦相手" in df_p_calc.columns else ["日付"]
+        for (player, *match_info), group in df_p_calc.groupby(["選手名"] + match_keys, observed=True):
+            r_str = "".join(group["勝敗"].dropna().astype(str).tolist())
+            if "勝" in r_str or "○" in r_str:
+                df_p_calc.loc[group.index[0], "is_win"] = 1
+            elif "負" in r_str or "敗" in r_str or "●" in r_str:
+                df_p_calc.loc[group.index[0], "is_lose"] = 1
+    for c in ["自責点", "失点", "アウト数", "被安打", "与四球", "奪三振"]:
+        if c not in df_p_calc.columns: df_p_calc[c] = 0
+        df_p_calc[c] = pd.to_numeric(df_p_calc[c], errors='coerce').fillna(0)
+
+    if "処理野手" not in df_p_calc.columns: df_p_calc["処理野手"] = ""
+
+    temp_so = df_p_calc["結果"].isin(["三振", "振り逃げ三振"]).astype(int)
+    df_p_calc["奪三振"] = df_p_calc[["奪三振"]].assign(flag=temp_so).max(axis=1)
+    df_p_calc["is_so"] = 0
+
+    temp_bb = df_p_calc["結果"].isin(["四球", "死球"]).astype(int)
+    df_p_calc["total_bb"] = df_p_calc[["与四球"]].assign(flag=temp_bb).max(axis=1)
+
+    temp_hit = df_p_calc["結果"].isin(["安打", "単打", "二塁打", "三塁打", "本塁打"]).astype(int)
+    df_p_calc["被安打"] = df_p_calc[["被安打"]].assign(flag=temp_hit).max(axis=1)
+    return df_p_calc
+
+def _add_batting_rates(rank_b):
+    rank_b["Total_PA"] = rank_b["is_ab"] + rank_b["is_bb"] 
+    rank_b["AVG"] = metrics.batting_avg(rank_b["is_hit"], rank_b["is_ab"])
+    rank_b["OBP"] = metrics.on_base_pct(rank_b["is_hit"], rank_b["is_bb"], rank_b["is_ab"] + rank_b["is_bb"] + rank_b["is_sf"])
+    rank_b["SLG"] = metrics.slugging_pct(rank_b["bases"], rank_b["is_ab"])
+    rank_b["OPS"] = rank_b["OBP"] + rank_b["SLG"]
+    return rank_b
+
+def _add_pitching_rates(rank_p):
+    rank_p["Innings"] = rank_p["アウト数"]/3
+    rank_p["ERA"] = metrics.era(rank_p["自責点"], rank_p["アウト数"], default=99.99)
+    rank_p["TotalSO"] = rank_p["is_so"] + rank_p["奪三振"]
+    rank_p["WHIP"] = metrics.whip(rank_p["total_bb"], rank_p["被安打"], rank_p["アウト数"], default=99.99)
+    return rank_p
+
+def _per_period(df, period_keys, agg_rules, add_rates):
+    """期間の値 → その期間の選手別集計（率の指標つき）の辞書"""
+    if df.empty:
+        return {}
+    rank = df.groupby([period_keys.rename("_period"), "選手名"], observed=True).agg(agg_rules).reset_index()
+    return {
+        value: add_rates(group.drop(columns="_period").reset_index(drop=True))
+        for value, group in rank.groupby("_period", observed=True)
+    }
+
+def _period_tables(df_b, df_p, b_keys, p_keys):
+    rank_b = _per_period(df_b, b_keys, AGG_RULES_B, _add_batting_rates)
+    rank_p = _per_period(df_p, p_keys, AGG_RULES_P, _add_pitching_rates)
+    games = df_b.groupby(b_keys, observed=True)["日付"].nunique().to_dict() if not df_b.empty else {}
+    return {
+        value: {"batting": rank_b[value], "pitching": rank_p.get(value, pd.DataFrame()), "games": games.get(value, 0)}
+        for value in sorted(rank_b, reverse=True)
+    }
+
+def _record_tables(df_b, df_p, season):
+    """歴代記録の集計（season なら 年度×選手、そうでなければ選手ごとの生涯通算）"""
+    keys = ["Year", "選手名"] if season else ["選手名"]
+    bat = pd.DataFrame()
+    pit = pd.DataFrame()
+    if not df_b.empty:
+        bat = _add_batting_rates(df_b.groupby(keys, observed=True).agg(AGG_RULES_B).reset_index())
+    if not df_p.empty:
+        pit = _add_pitching_rates(df_p.groupby(keys, observed=True).agg(AGG_RULES_P).reset_index())
+
+    for df, coeff, src in [(bat, REC_COEFF_AB, df_b), (pit, REC_COEFF_INN, df_p)]:
+        if df.empty:
+            continue
+        if season:
+            df["Year"] = df["Year"].astype(str)
+            df["Display"] = (df["選手名"].astype(str) + " (" + df["Year"] + ")").str.replace(r'\.0\)', ')', regex=True)
+            games_by_year = src.groupby(src["Year"].astype(str))["日付"].nunique().to_dict()
+            df["Req_Quota"] = df["Year"].map(games_by_year).fillna(0) * coeff
+        else:
+            df["Display"] = df["選手名"]
+    return {"batting": bat, "pitching": pit}
+
+@st.cache_resource(ttl=600, max_entries=8)
+def _ranking_engine(version_b, version_p, allowed_names, _df_batting, _df_pitching):
+    """判定フラグ付きデータと期間別の選手別集計（データのバージョンと表示対象の選手が同じなら使い回す）"""
+    df_b_calc = _prepare_batting(_df_batting)
+    df_p_calc = _prepare_pitching(_df_pitching)
+
+    has_b = not df_b_calc.empty
+    has_p = not df_p_calc.empty
+    empty = pd.Series(dtype=object)
+    periods = {
+        "年度別": _period_tables(
+            df_b_calc, df_p_calc,
+            df_b_calc["date"].dt.year if has_b else empty, df_p_calc["date"].dt.year if has_p else empty,
+        ),
+        "月間": _period_tables(
+            df_b_calc, df_p_calc,
+            df_b_calc["year_month"] if has_b else empty, df_p_calc["year_month"] if has_p else empty,
+        ),
+    }
+    # 直近3試合：打撃データの日付で直近3日を決め、投手データも同じ日で絞る
+    recent = sorted(df_b_calc["date"].unique(), reverse=True)[:3] if has_b else []
+    df_b_recent = df_b_calc[df_b_calc["date"].isin(recent)] if has_b else df_b_calc
+    df_p_recent = df_p_calc[df_p_calc["date"].isin(recent)] if has_p else df_p_calc
+    periods["直近3試合"] = _period_tables(
+        df_b_recent, df_p_recent,
+        pd.Series("recent", index=df_b_recent.index), pd.Series("recent", index=df_p_recent.index),
+    )
+
+    return {
+        "batting": df_b_calc,
+        "pitching": df_p_calc,
+        "periods": periods,
+        "records": {"season": _record_tables(df_b_calc, df_p_calc, True), "lifetime": _record_tables(df_b_calc, df_p_calc, False)},
+    }
 
 def show_personal_stats(df_batting, df_pitching):
     st.title(" 📊 個人成績")
@@ -17,6 +189,9 @@ def show_personal_stats(df_batting, df_pitching):
     
     # チーム記録は残しつつ、非表示対象の選手を除外する
     allowed_names = STATS_PLAYERS + ["チーム記録"]
+    # 集計のキャッシュは絞り込む前のデータのバージョンと表示対象の選手で引く
+    version_b = data_version(df_batting)
+    version_p = data_version(df_pitching)
     
     if not df_batting.empty:
         df_batting = df_batting[df_batting["選手名"].isin(allowed_names)].copy()
@@ -26,103 +201,12 @@ def show_personal_stats(df_batting, df_pitching):
     # ▲▲▲ 追加ここまで ▲▲▲
 
     # =========================================================
-    # 1. データ前処理
+    # 1. データ前処理（判定フラグ・勝敗の割り当て・ランキング用の集計はキャッシュから）
     # =========================================================
-    
-    # --- 打撃データ ---
-    if not df_batting.empty:
-        # 日付からYearを作成 (2026.0問題の解消)
-        df_batting["Year"] = pd.to_datetime(df_batting["日付"], errors='coerce').dt.strftime('%Y')
-        df_batting["Year"] = df_batting["Year"].fillna("不明")
-        
-        df_b_calc = df_batting[df_batting["選手名"] != "チーム記録"].copy()
-
-        df_b_calc["結果"] = df_b_calc["結果"].astype(str).str.replace(r"\s+", "", regex=True)
-
-        # 1. 安打の判定
-        df_b_calc["is_hit"] = df_b_calc["結果"].str.contains("単打|二塁打|三塁打|本塁打", na=False).astype(int)
-
-        # 2. 打数(AB)の判定方法
-        non_ab_pattern = "四球|死球|四死球|犠打|犠飛|打撃妨害|得点|盗塁|牽制|代走|走塁|暴投|捕逸|ボーク|守備|交代"
-        is_valid = ~df_b_calc["結果"].isin(["", "nan", "None", "-"])
-        is_not_excluded = ~df_b_calc["結果"].str.contains(non_ab_pattern, na=False)
-        df_b_calc["is_ab"] = (is_valid & is_not_excluded).astype(int)
-        
-        df_b_calc["is_hr"] = df_b_calc["結果"].str.contains("本塁打", na=False).astype(int)
-        df_b_calc["is_so"] = df_b_calc["結果"].str.contains("三振", na=False).astype(int)
-
-        # 長打率計算用の塁打フラグ
-        df_b_calc["is_1b"] = df_b_calc["結果"].str.contains("単打", na=False).astype(int)
-        df_b_calc["is_2b"] = df_b_calc["結果"].str.contains("二塁打", na=False).astype(int)
-        df_b_calc["is_3b"] = df_b_calc["結果"].str.contains("三塁打", na=False).astype(int)
-        
-        # 四死球・犠飛
-        df_b_calc["is_bb"] = df_b_calc["結果"].str.contains("四球|死球|四死球", na=False).astype(int)
-        df_b_calc["is_sf"] = df_b_calc["結果"].str.contains("犠飛", na=False).astype(int)
-        
-        df_b_calc["bases"] = (
-            df_b_calc["is_1b"] * 1 + 
-            df_b_calc["is_2b"] * 2 + 
-            df_b_calc["is_3b"] * 3 + 
-            df_b_calc["is_hr"] * 4
-        )
-
-        for c in ["打点", "盗塁", "得点", "盗塁死"]: 
-            if c not in df_b_calc.columns:
-                df_b_calc[c] = 0
-            df_b_calc[c] = pd.to_numeric(df_b_calc[c], errors='coerce').fillna(0)
-    else:
-        df_b_calc = pd.DataFrame(columns=["Year", "選手名", "結果", "is_hit", "is_ab", "is_hr", "is_so", "is_1b", "is_2b", "is_3b", "is_bb", "bases", "打点", "盗塁", "盗塁死", "得点"])
-        
-    # --- 投手データ ---
-    if not df_pitching.empty:
-        df_pitching["Year"] = pd.to_datetime(df_pitching["日付"], errors='coerce').dt.strftime('%Y')
-        df_pitching["Year"] = df_pitching["Year"].fillna("不明")
-        
-        if "選手名" in df_pitching.columns:
-            df_p_calc = df_pitching[df_pitching["選手名"] != "チーム記録"].copy()
-        else:
-            df_p_calc = df_pitching.copy()
-
-        if "選手名" in df_p_calc.columns:
-            df_p_calc = df_p_calc[df_p_calc["選手名"] != "チーム記録"]
-            df_p_calc["選手名"] = df_p_calc["選手名"].replace("", pd.NA).fillna(df_p_calc["選手名"])
-        else:
-            df_p_calc["選手名"] = df_p_calc["選手名"]
-
-        df_p_calc = df_p_calc[df_p_calc["選手名"] != "チーム記録"]
-
-        df_p_calc["is_win"] = 0
-        df_p_calc["is_lose"] = 0
-        
-        if "勝敗" in df_p_calc.columns:
-            match_keys = ["日付", "対戦相手"] if "対戦相手" in df_p_calc.columns else ["日付"]
-            for (player, *match_info), group in df_p_calc.groupby(["選手名"] + match_keys):
-                r_str = "".join(group["勝敗"].dropna().astype(str).tolist())
-                if "勝" in r_str or "○" in r_str:
-                    df_p_calc.loc[group.index[0], "is_win"] = 1
-                elif "負" in r_str or "敗" in r_str or "●" in r_str:
-                    df_p_calc.loc[group.index[0], "is_lose"] = 1
-        for c in ["自責点", "失点", "アウト数", "被安打", "与四球", "奪三振"]:
-            if c not in df_p_calc.columns: df_p_calc[c] = 0
-            df_p_calc[c] = pd.to_numeric(df_p_calc[c], errors='coerce').fillna(0)
-            
-        if "処理野手" not in df_p_calc.columns: df_p_calc["処理野手"] = ""
-
-        temp_so = df_p_calc["結果"].isin(["三振", "振り逃げ三振"]).astype(int)
-        df_p_calc["奪三振"] = df_p_calc[["奪三振"]].assign(flag=temp_so).max(axis=1)
-        df_p_calc["is_so"] = 0
-        
-        temp_bb = df_p_calc["結果"].isin(["四球", "死球"]).astype(int)
-        df_p_calc["total_bb"] = df_p_calc[["与四球"]].assign(flag=temp_bb).max(axis=1)
-        
-        temp_hit = df_p_calc["結果"].isin(["安打", "単打", "二塁打", "三塁打", "本塁打"]).astype(int)
-        df_p_calc["被安打"] = df_p_calc[["被安打"]].assign(flag=temp_hit).max(axis=1)
-    else:
-        df_p_calc = pd.DataFrame()
-
-    def get_ranking_df(df, group_keys, agg_dict):
-        return df.groupby(group_keys).agg(agg_dict).reset_index()
+    # 共有の集計表は読むだけ。列を足すことのある全体のデータは浅いコピーで受け取る
+    engine = _ranking_engine(version_b, version_p, tuple(allowed_names), df_batting, df_pitching)
+    df_b_calc = engine["batting"].copy(deep=False)
+    df_p_calc = engine["pitching"].copy(deep=False)
 
     def show_top5(title, df, sort_col, label_col, value_col, ascending=False, suffix="", format_float=False):
         st.markdown(f"**{title}**")
@@ -146,18 +230,6 @@ def show_personal_stats(df_batting, df_pitching):
                     val_str = f"{int(val)}"
                 st.write(f"{icon} **{row[label_col]}** : {val_str}{suffix}")
 
-    agg_rules_b = {
-        "is_hit": "sum", "is_ab": "sum", "is_hr": "sum", "is_so": "sum",
-        "is_1b": "sum", "is_2b": "sum", "is_3b": "sum", "is_bb": "sum",
-        "is_sf": "sum", 
-        "打点": "sum", "盗塁": "sum", "盗塁死": "sum", "得点": "sum", "bases": "sum"
-    }
-    agg_rules_p = {
-        "アウト数": "sum", "自責点": "sum", "失点": "sum", 
-        "is_win": "sum", "is_lose": "sum", "被安打": "sum", 
-        "total_bb": "sum", "is_so": "sum", "奪三振": "sum"
-    }
-
     t_total, t_year, t_rank, t_rec, t_saber = st.tabs(["個人通算", "個人年度別", "期間別ランキング", "歴代記録", "総合貢献度"])
 
     # ----------------------------------------------------
@@ -192,20 +264,18 @@ def show_personal_stats(df_batting, df_pitching):
         
         with st_bat:
             if not df_b_tg.empty:
-                stats = df_b_tg.groupby("選手名").agg(agg_rules_b).reset_index()
+                stats = df_b_tg.groupby("選手名", observed=True).agg(AGG_RULES_B).reset_index()
                 
                 stats["PA"] = stats["is_ab"] + stats["is_bb"] + stats["is_sf"]
-                stats["打率"] = stats.apply(lambda x: x["is_hit"]/x["is_ab"] if x["is_ab"]>0 else 0, axis=1)
-                stats["出塁率"] = stats.apply(
-                    lambda x: (x["is_hit"] + x["is_bb"]) / x["PA"] if x["PA"] > 0 else 0, axis=1
-                )
-                stats["TotalBases"] = stats["is_1b"] + (stats["is_2b"] * 2) + (stats["is_3b"] * 3) + (stats["is_hr"] * 4)
-                stats["長打率"] = stats.apply(lambda x: x["TotalBases"] / x["is_ab"] if x["is_ab"] > 0 else 0, axis=1)
+                stats["TotalBases"] = metrics.total_bases(stats["is_1b"], stats["is_2b"], stats["is_3b"], stats["is_hr"])
+                stats["打率"] = metrics.batting_avg(stats["is_hit"], stats["is_ab"])
+                stats["出塁率"] = metrics.on_base_pct(stats["is_hit"], stats["is_bb"], stats["PA"])
+                stats["長打率"] = metrics.slugging_pct(stats["TotalBases"], stats["is_ab"])
                 stats["OPS"] = stats["出塁率"] + stats["長打率"]
 
-                stats["三振率"] = stats.apply(lambda x: x["is_so"] / x["PA"] if x["PA"] > 0 else 0, axis=1)
-                stats["盗塁成功率"] = stats.apply(lambda x: x["盗塁"] / (x["盗塁"] + x["盗塁死"]) if (x["盗塁"] + x["盗塁死"]) > 0 else 0, axis=1)
-                stats["BB/K"] = stats.apply(lambda x: x["is_bb"] / x["is_so"] if x["is_so"] > 0 else x["is_bb"], axis=1)
+                stats["三振率"] = metrics.k_rate(stats["is_so"], stats["PA"])
+                stats["盗塁成功率"] = metrics.sb_success_rate(stats["盗塁"], stats["盗塁死"])
+                stats["BB/K"] = metrics.bb_per_k(stats["is_bb"], stats["is_so"])
                 stats["IsoP"] = stats["長打率"] - stats["打率"]
                 stats["IsoD"] = stats["出塁率"] - stats["打率"]
 
@@ -249,10 +319,10 @@ def show_personal_stats(df_batting, df_pitching):
 
         with st_pit:
             if not df_p_tg.empty:
-                stats_p = df_p_tg.groupby("選手名").agg(agg_rules_p).reset_index()
+                stats_p = df_p_tg.groupby("選手名", observed=True).agg(AGG_RULES_P).reset_index()
                 stats_p["TotalSO"] = stats_p["is_so"] + stats_p["奪三振"]
-                stats_p["防御率"] = stats_p.apply(lambda x: (x["自責点"]*7)/(x["アウト数"]/3) if x["アウト数"]>0 else 0, axis=1)
-                stats_p["投球回"] = stats_p["アウト数"].apply(lambda x: f"{int(x//3)}.{int(x%3)}")
+                stats_p["防御率"] = metrics.era(stats_p["自責点"], stats_p["アウト数"])
+                stats_p["投球回"] = metrics.innings_str(stats_p["アウト数"])
                 for c in ["is_win", "is_lose", "TotalSO", "自責点", "total_bb"]: stats_p[c] = stats_p[c].astype(int)
 
                 disp_p = stats_p[["選手名", "防御率", "is_win", "is_lose", "投球回", "TotalSO", "total_bb", "自責点"]].copy()
@@ -298,7 +368,7 @@ def show_personal_stats(df_batting, df_pitching):
 
                         group_keys = ["Original_Idx", "FielderName", "FielderPos"]
 
-                        fld_unique = fld_expanded.groupby(group_keys).agg(
+                        fld_unique = fld_expanded.groupby(group_keys, observed=True).agg(
                             is_error=("is_error", "max")
                         ).reset_index()
 
@@ -307,10 +377,7 @@ def show_personal_stats(df_batting, df_pitching):
                             失策数=("is_error", "sum")
                         ).reset_index()
                         
-                        stats_f["守備率"] = stats_f.apply(
-                            lambda x: (x["守備機会"] - x["失策数"]) / x["守備機会"] if x["守備機会"] > 0 else 0.0, 
-                            axis=1
-                        )
+                        stats_f["守備率"] = metrics.fielding_pct(stats_f["守備機会"], stats_f["失策数"], default=0.0)
                         
                         pos_order = ["投", "捕", "一", "二", "三", "遊", "左", "中", "右"]
                         stats_f["SortKey"] = stats_f["FielderPos"].apply(
@@ -343,18 +410,11 @@ def show_personal_stats(df_batting, df_pitching):
                 df_all_logs = pd.concat([df_b_target, df_p_target], ignore_index=True)
 
                 if not df_all_logs.empty:
-                    for col in ["日付", "試合種別", "選手名"]:
-                        if col in df_all_logs.columns:
-                            df_all_logs[col] = df_all_logs[col].fillna("").astype(str).str.strip()
-                    if "対戦相手" in df_all_logs.columns:
-                        df_all_logs["対戦相手"] = df_all_logs["対戦相手"].fillna("").astype(str).str.strip()
-                    else:
-                        df_all_logs["対戦相手"] = ""
+                    df_all_logs["選手名"] = df_all_logs["選手名"].fillna("").astype(str)
 
-                    df_all_logs["Game_ID"] = df_all_logs["日付"] + "_" + df_all_logs["対戦相手"] + "_" + df_all_logs["試合種別"]
+                    # チームの試合数は、渡された（表示対象の選手に絞った）データにある試合から数える
+                    team_games = df_all_logs[["game_id", "試合種別"]].drop_duplicates("game_id")
 
-                    team_games = df_all_logs[["Game_ID", "試合種別"]].drop_duplicates()
-                    
                     official_games = len(team_games[team_games["試合種別"].isin(OFFICIAL_GAME_TYPES)])
                     practice_games = len(team_games[team_games["試合種別"] == "練習試合"])
                     other_games = len(team_games[~team_games["試合種別"].isin(OFFICIAL_GAME_TYPES) & (team_games["試合種別"] != "練習試合")])
@@ -365,11 +425,8 @@ def show_personal_stats(df_batting, df_pitching):
                     df_valid_players = df_personal_logs.copy()
 
                     if not df_valid_players.empty:
-                        # 🌟 日付型への変換と最新活動日の特定
-                        df_valid_players["Date_dt"] = pd.to_datetime(df_valid_players["日付"], errors='coerce')
-                        df_all_logs["Date_dt"] = pd.to_datetime(df_all_logs["日付"], errors='coerce')
-                        
-                        latest_game_date = df_all_logs["Date_dt"].max()
+                        # 🌟 最新活動日の特定
+                        latest_game_date = df_all_logs["date"].max()
                         ref_date = latest_game_date if pd.notna(latest_game_date) else pd.to_datetime(datetime.date.today())
                         
                         # 直近1年間（365日以内）の境界日
@@ -379,14 +436,14 @@ def show_personal_stats(df_batting, df_pitching):
                         df_prac = df_valid_players[df_valid_players["試合種別"] == "練習試合"]
                         df_other = df_valid_players[~df_valid_players["試合種別"].isin(OFFICIAL_GAME_TYPES) & (df_valid_players["試合種別"] != "練習試合")]
 
-                        off_counts = df_off.groupby("選手名")["Game_ID"].nunique().reset_index(name="公式戦参加数")
-                        prac_counts = df_prac.groupby("選手名")["Game_ID"].nunique().reset_index(name="練習試合参加数")
-                        other_counts = df_other.groupby("選手名")["Game_ID"].nunique().reset_index(name="その他参加数")
+                        off_counts = df_off.groupby("選手名", observed=True)["game_id"].nunique().reset_index(name="公式戦参加数")
+                        prac_counts = df_prac.groupby("選手名", observed=True)["game_id"].nunique().reset_index(name="練習試合参加数")
+                        other_counts = df_other.groupby("選手名", observed=True)["game_id"].nunique().reset_index(name="その他参加数")
                         
                         # 🌟 直近1年参加数と最終参加日の集計
-                        df_1y = df_valid_players[df_valid_players["Date_dt"] >= one_year_ago]
-                        counts_1y = df_1y.groupby("選手名")["Game_ID"].nunique().reset_index(name="直近1年参加数")
-                        last_dates = df_valid_players.groupby("選手名")["Date_dt"].max().reset_index(name="最終参加日")
+                        df_1y = df_valid_players[df_valid_players["date"] >= one_year_ago]
+                        counts_1y = df_1y.groupby("選手名", observed=True)["game_id"].nunique().reset_index(name="直近1年参加数")
+                        last_dates = df_valid_players.groupby("選手名", observed=True)["date"].max().reset_index(name="最終参加日")
 
                         base_players = df_valid_players[["選手名"]].drop_duplicates()
 
@@ -492,23 +549,23 @@ def show_personal_stats(df_batting, df_pitching):
             if not df_b_calc.empty:
                 my_b = df_b_calc[df_b_calc["選手名"] == sel_player]
                 if not my_b.empty:
-                    hist = my_b.groupby("Year").agg(agg_rules_b).sort_index(ascending=False)
-                    total_s = my_b.agg(agg_rules_b)
+                    hist = my_b.groupby("Year").agg(AGG_RULES_B).sort_index(ascending=False)
+                    total_s = my_b.agg(AGG_RULES_B)
                     hist_total = pd.DataFrame(total_s).T
                     hist_total.index = ["通算"]
 
                     combined_hist = pd.concat([hist_total, hist])
 
                     combined_hist["PA"] = combined_hist["is_ab"] + combined_hist["is_bb"] + combined_hist["is_sf"]
-                    combined_hist["打率"] = combined_hist.apply(lambda x: x["is_hit"]/x["is_ab"] if x["is_ab"]>0 else 0, axis=1)
-                    combined_hist["出塁率"] = combined_hist.apply(lambda x: (x["is_hit"] + x["is_bb"]) / x["PA"] if x["PA"] > 0 else 0, axis=1)
-                    combined_hist["TotalBases"] = combined_hist["is_1b"] + (combined_hist["is_2b"] * 2) + (combined_hist["is_3b"] * 3) + (combined_hist["is_hr"] * 4)
-                    combined_hist["長打率"] = combined_hist.apply(lambda x: x["TotalBases"] / x["is_ab"] if x["is_ab"] > 0 else 0, axis=1)
+                    combined_hist["TotalBases"] = metrics.total_bases(combined_hist["is_1b"], combined_hist["is_2b"], combined_hist["is_3b"], combined_hist["is_hr"])
+                    combined_hist["打率"] = metrics.batting_avg(combined_hist["is_hit"], combined_hist["is_ab"])
+                    combined_hist["出塁率"] = metrics.on_base_pct(combined_hist["is_hit"], combined_hist["is_bb"], combined_hist["PA"])
+                    combined_hist["長打率"] = metrics.slugging_pct(combined_hist["TotalBases"], combined_hist["is_ab"])
                     combined_hist["OPS"] = combined_hist["出塁率"] + combined_hist["長打率"]
 
-                    combined_hist["三振率"] = combined_hist.apply(lambda x: x["is_so"] / x["PA"] if x["PA"] > 0 else 0, axis=1)
-                    combined_hist["盗塁成功率"] = combined_hist.apply(lambda x: x["盗塁"] / (x["盗塁"] + x["盗塁死"]) if (x["盗塁"] + x["盗塁死"]) > 0 else 0, axis=1)
-                    combined_hist["BB/K"] = combined_hist.apply(lambda x: x["is_bb"] / x["is_so"] if x["is_so"] > 0 else x["is_bb"], axis=1)
+                    combined_hist["三振率"] = metrics.k_rate(combined_hist["is_so"], combined_hist["PA"])
+                    combined_hist["盗塁成功率"] = metrics.sb_success_rate(combined_hist["盗塁"], combined_hist["盗塁死"])
+                    combined_hist["BB/K"] = metrics.bb_per_k(combined_hist["is_bb"], combined_hist["is_so"])
                     combined_hist["IsoP"] = combined_hist["長打率"] - combined_hist["打率"]
                     combined_hist["IsoD"] = combined_hist["出塁率"] - combined_hist["打率"]
 
@@ -549,8 +606,8 @@ def show_personal_stats(df_batting, df_pitching):
             if not df_p_calc.empty:
                 my_p = df_p_calc[df_p_calc["選手名"] == sel_player]
                 if not my_p.empty:
-                    hist_p = my_p.groupby("Year").agg(agg_rules_p).sort_index(ascending=False)
-                    total_p_s = my_p.agg(agg_rules_p)
+                    hist_p = my_p.groupby("Year").agg(AGG_RULES_P).sort_index(ascending=False)
+                    total_p_s = my_p.agg(AGG_RULES_P)
                     hist_p_total = pd.DataFrame(total_p_s).T
                     hist_p_total.index = ["通算"]
 
@@ -558,22 +615,11 @@ def show_personal_stats(df_batting, df_pitching):
 
                     combined_p["TotalSO"] = combined_p["is_so"] + combined_p["奪三振"]
                     combined_p["Innings"] = combined_p["アウト数"] / 3
-                    combined_p["防御率"] = combined_p.apply(
-                        lambda x: (x["自責点"]*7)/x["Innings"] if x["Innings"]>0 else 0, axis=1
-                    )
-                    combined_p["勝率"] = combined_p.apply(
-                        lambda x: x["is_win"] / (x["is_win"] + x["is_lose"]) 
-                        if (x["is_win"] + x["is_lose"]) > 0 else 0, axis=1
-                    )
-                    combined_p["奪三振率"] = combined_p.apply(
-                        lambda x: (x["TotalSO"] * 7) / x["Innings"] 
-                        if x["Innings"] > 0 else 0, axis=1
-                    )
-                    combined_p["WHIP"] = combined_p.apply(
-                        lambda x: (x["total_bb"] + x["被安打"]) / x["Innings"] 
-                        if x["Innings"] > 0 else 0, axis=1
-                    )
-                    combined_p["回"] = combined_p["アウト数"].apply(lambda x: f"{int(x//3)}.{int(x%3)}")
+                    combined_p["防御率"] = metrics.era(combined_p["自責点"], combined_p["アウト数"])
+                    combined_p["勝率"] = metrics.win_pct(combined_p["is_win"], combined_p["is_lose"])
+                    combined_p["奪三振率"] = metrics.k_per_game(combined_p["TotalSO"], combined_p["アウト数"])
+                    combined_p["WHIP"] = metrics.whip(combined_p["total_bb"], combined_p["被安打"], combined_p["アウト数"])
+                    combined_p["回"] = metrics.innings_str(combined_p["アウト数"])
                     
                     for col in ["is_win", "is_lose", "TotalSO", "total_bb"]: 
                         combined_p[col] = combined_p[col].astype(int)
@@ -629,7 +675,7 @@ def show_personal_stats(df_batting, df_pitching):
 
                                 group_keys = ["Original_Idx", "FielderName", "FielderPos"]
 
-                                fld_unique = my_f.groupby(group_keys).agg(
+                                fld_unique = my_f.groupby(group_keys, observed=True).agg(
                                     Year=("Year", "first"),
                                     is_error=("is_error", "max")
                                 ).reset_index()
@@ -648,10 +694,7 @@ def show_personal_stats(df_batting, df_pitching):
                                 
                                 combined_f = pd.concat([hist_f_total, hist_f])
                                 
-                                combined_f["守備率"] = combined_f.apply(
-                                    lambda x: (x["守備機会"] - x["失策数"]) / x["守備機会"] if x["守備機会"] > 0 else 0.0, 
-                                    axis=1
-                                )
+                                combined_f["守備率"] = metrics.fielding_pct(combined_f["守備機会"], combined_f["失策数"], default=0.0)
                                 
                                 disp_f_hist = pd.DataFrame()
                                 disp_f_hist["守備率"] = combined_f["守備率"]
@@ -670,54 +713,44 @@ def show_personal_stats(df_batting, df_pitching):
     with t_rank:
         st.markdown("#### 🏆 期間別ランキング")
         period = st.radio("集計期間", ["年度別", "月間", "直近3試合"], horizontal=True)
-        df_b_sub = df_b_calc.copy(); df_p_sub = df_p_calc.copy()
-        df_b_sub["Date"] = pd.to_datetime(df_b_sub["日付"]); df_p_sub["Date"] = pd.to_datetime(df_p_sub["日付"])
+        tables = engine["periods"][period]
         
         def_ab = 1; def_inn = 1
         key_suffix = ""
 
         if period == "年度別":
-            ys = sorted(df_b_sub["Date"].dt.year.unique(), reverse=True)
+            ys = list(tables)
             sy = st.selectbox("年度選択", ys) if len(ys)>0 else datetime.date.today().year
             key_suffix = str(sy) 
 
-            df_b_sub = df_b_sub[df_b_sub["Date"].dt.year == sy]
-            df_p_sub = df_p_sub[df_p_sub["Date"].dt.year == sy]
-            if not df_b_sub.empty: def_ab = int(df_b_sub["日付"].nunique() * 1.0); def_inn = int(df_b_sub["日付"].nunique() * 0.8)
+            sub = tables.get(sy)
+            if sub: def_ab = int(sub["games"] * 1.0); def_inn = int(sub["games"] * 0.8)
         
         elif period == "月間":
-            df_b_sub["YM"] = df_b_sub["Date"].dt.strftime('%Y-%m')
-            ms = sorted(df_b_sub["YM"].unique(), reverse=True)
+            ms = list(tables)
             sm = st.selectbox("月選択", ms) if len(ms)>0 else None
             
+            sub = tables.get(sm) if sm else None
             if sm:
                 key_suffix = str(sm)
-                df_b_sub = df_b_sub[df_b_sub["YM"] == sm]
-                df_p_sub["YM"] = df_p_sub["Date"].dt.strftime('%Y-%m')
-                df_p_sub = df_p_sub[df_p_sub["YM"] == sm]
-                def_ab = int(df_b_sub["日付"].nunique()); def_inn = def_ab
-            else: df_b_sub = pd.DataFrame(); df_p_sub = pd.DataFrame()
+                def_ab = sub["games"]; def_inn = def_ab
         
         else:
-            dates = sorted(df_b_sub["Date"].unique(), reverse=True)[:3]
-            df_b_sub = df_b_sub[df_b_sub["Date"].isin(dates)]; df_p_sub = df_p_sub[df_p_sub["Date"].isin(dates)]
+            sub = tables.get("recent")
             def_ab = 3; def_inn = 3
             key_suffix = "recent"
 
+        # 選手別の集計は期間ごとに作り置き済み。ここからは規定で絞り込んで並べるだけ
+        rank_b = sub["batting"] if sub else pd.DataFrame()
+        rank_p = sub["pitching"] if sub else pd.DataFrame()
+
         c_f1, c_f2 = st.columns(2)
         min_ab = c_f1.number_input("規定打席", value=max(1, def_ab), min_value=1, key=f"ab_{period}_{key_suffix}")
         min_inn = c_f2.number_input("規定投球回", value=max(1, def_inn), min_value=1, key=f"inn_{period}_{key_suffix}")
         
         st.divider()
 
-        if not df_b_sub.empty:
-            rank_b = get_ranking_df(df_b_sub, ["選手名"], agg_rules_b)
-            rank_b["Total_PA"] = rank_b["is_ab"] + rank_b["is_bb"] 
-            rank_b["AVG"] = rank_b.apply(lambda x: x["is_hit"]/x["is_ab"] if x["is_ab"]>0 else 0, axis=1)
-            rank_b["OBP"] = (rank_b["is_hit"] + rank_b["is_bb"]) / (rank_b["is_ab"] + rank_b["is_bb"] + rank_b["is_sf"])
-            rank_b["SLG"] = rank_b["bases"] / rank_b["is_ab"]
-            rank_b["OPS"] = (rank_b["OBP"] + rank_b["SLG"]).fillna(0)
-            
+        if not rank_b.empty:
             st.markdown("##### ⚔️ 打撃部門")
             r1, r2, r3 = st.columns(3)
             with r1: show_top5("打率", rank_b[rank_b["Total_PA"]>=min_ab], "AVG", "選手名", "AVG", format_float=True)
@@ -732,13 +765,7 @@ def show_personal_stats(df_batting, df_pitching):
         else: st.info("データなし")
         st.divider()
 
-        if not df_p_sub.empty:
-            rank_p = get_ranking_df(df_p_sub, ["選手名"], agg_rules_p)
-            rank_p["Innings"] = rank_p["アウト数"]/3
-            rank_p["ERA"] = rank_p.apply(lambda x: (x["自責点"]*7)/x["Innings"] if x["Innings"]>0 else 99.99, axis=1)
-            rank_p["TotalSO"] = rank_p["is_so"] + rank_p["奪三振"]
-            rank_p["WHIP"] = rank_p.apply(lambda x: (x["total_bb"]+x["被安打"])/x["Innings"] if x["Innings"]>0 else 99.99, axis=1)
-
+        if not rank_p.empty:
             st.markdown("##### 🛡️ 投手部門")
             st.caption("※ WHIP: (被安打 + 与四死球) ÷ 投球回。1イニングあたりに出した走者の数。")
             p1, p2, p3, p4 = st.columns(4)
@@ -756,72 +783,29 @@ def show_personal_stats(df_batting, df_pitching):
         rc1, rc2 = st.columns([1, 2])
         rec_mode = rc1.radio("対象", ["シーズン最高", "生涯通算"], horizontal=True)
         
-        df_b_target = df_b_calc.copy()
-        df_p_target = df_p_calc.copy()
-
-        if not df_b_target.empty:
-            df_b_target["Date"] = pd.to_datetime(df_b_target["日付"])
-            df_b_target["Year"] = df_b_target["Date"].dt.year.astype(str)
-        
-        if not df_p_target.empty:
-            df_p_target["Date"] = pd.to_datetime(df_p_target["日付"])
-            df_p_target["Year"] = df_p_target["Date"].dt.year.astype(str)
+        records = engine["records"]["season" if "シーズン" in rec_mode else "lifetime"]
+        df_bat_res = records["batting"]
+        df_pit_res = records["pitching"]
 
         if "シーズン" in rec_mode:
-            COEFF_AB  = 1.0
-            COEFF_INN = 0.8
             MIN_AB  = 10
             MIN_INN = 10
 
-            games_by_year_b = df_b_target.groupby("Year")["日付"].nunique().to_dict()
-            games_by_year_p = df_p_target.groupby("Year")["日付"].nunique().to_dict()
-
-            df_bat_res = get_ranking_df(df_b_target, ["Year", "選手名"], agg_rules_b)
-            df_bat_res["Display"] = df_bat_res["選手名"] + " (" + df_bat_res["Year"] + ")"
-            df_bat_res["Req_Quota"] = df_bat_res["Year"].map(games_by_year_b).fillna(0) * COEFF_AB
-            
             df_bat_rate_target = df_bat_res[
                 (df_bat_res["is_ab"] >= df_bat_res["Req_Quota"]) & 
                 (df_bat_res["is_ab"] >= MIN_AB)
-            ].copy()
-
-            df_pit_res = get_ranking_df(df_p_target, ["Year", "選手名"], agg_rules_p)
-            df_pit_res["Display"] = df_pit_res["選手名"] + " (" + df_pit_res["Year"] + ")"
-            df_pit_res["Innings"] = df_pit_res["アウト数"] / 3
-            df_pit_res["Req_Quota"] = df_pit_res["Year"].map(games_by_year_p).fillna(0) * COEFF_INN
-
+            ] if not df_bat_res.empty else df_bat_res
             df_pit_rate_target = df_pit_res[
                 (df_pit_res["Innings"] >= df_pit_res["Req_Quota"]) & 
                 (df_pit_res["Innings"] >= MIN_INN)
-            ].copy()
+            ] if not df_pit_res.empty else df_pit_res
 
         else:
             MIN_AB_LIFETIME = 20
             MIN_INN_LIFETIME = 15
 
-            df_bat_res = get_ranking_df(df_b_target, ["選手名"], agg_rules_b)
-            df_bat_res["Display"] = df_bat_res["選手名"]
-            df_bat_rate_target = df_bat_res[df_bat_res["is_ab"] >= MIN_AB_LIFETIME].copy()
-            
-            df_pit_res = get_ranking_df(df_p_target, ["選手名"], agg_rules_p)
-            df_pit_res["Display"] = df_pit_res["選手名"]
-            df_pit_res["Innings"] = df_pit_res["アウト数"]/3
-            df_pit_rate_target = df_pit_res[df_pit_res["Innings"] >= MIN_INN_LIFETIME].copy()
-
-        if not df_bat_res.empty:
-            for df in [df_bat_res, df_bat_rate_target]:
-                if df.empty: continue
-                df["AVG"] = df.apply(lambda x: x["is_hit"]/x["is_ab"] if x["is_ab"]>0 else 0, axis=1)
-                obp = (df["is_hit"] + df["is_bb"]) / (df["is_ab"] + df["is_bb"] + df["is_sf"] + 1e-9)
-                slg = df["bases"] / (df["is_ab"] + 1e-9)
-                df["OPS"] = obp + slg
-
-        if not df_pit_res.empty:
-            for df in [df_pit_res, df_pit_rate_target]:
-                if df.empty: continue
-                df["ERA"] = df.apply(lambda x: (x["自責点"]*7)/x["Innings"] if x["Innings"]>0 else 99.99, axis=1)
-                df["TotalSO"] = df["is_so"] + df["奪三振"]
-                df["WHIP"] = df.apply(lambda x: (x["total_bb"]+x["被安打"])/x["Innings"] if x["Innings"]>0 else 99.99, axis=1)
+            df_bat_rate_target = df_bat_res[df_bat_res["is_ab"] >= MIN_AB_LIFETIME] if not df_bat_res.empty else df_bat_res
+            df_pit_rate_target = df_pit_res[df_pit_res["Innings"] >= MIN_INN_LIFETIME] if not df_pit_res.empty else df_pit_res
 
         st.divider()
 
@@ -843,11 +827,6 @@ def show_personal_stats(df_batting, df_pitching):
         st.divider()
 
         if not df_pit_res.empty:
-            if "Display" in df_pit_res.columns:
-                df_pit_res["Display"] = df_pit_res["Display"].astype(str).str.replace(r'\.0\)', ')', regex=True)
-            if "Display" in df_pit_rate_target.columns:
-                df_pit_rate_target["Display"] = df_pit_rate_target["Display"].astype(str).str.replace(r'\.0\)', ')', regex=True)
-
             st.markdown(f"##### 🛡️ 歴代投手トップ5")
             tp1, tp2, tp3, tp4 = st.columns(4)
             with tp1: show_top5("防御率", df_pit_rate_target, "ERA", "Display", "ERA", ascending=True, suffix="", format_float=True)
@@ -888,29 +867,26 @@ def show_personal_stats(df_batting, df_pitching):
             if not df_b_target.empty:
                 df_b_saber = df_b_target.copy()
                 if not df_b_saber.empty:
-                    saber_stats_b = df_b_saber.groupby("選手名").agg(agg_rules_b).reset_index()
+                    saber_stats_b = df_b_saber.groupby("選手名", observed=True).agg(AGG_RULES_B).reset_index()
                     saber_stats_b["PA"] = saber_stats_b["is_ab"] + saber_stats_b["is_bb"] + saber_stats_b["is_sf"]
-                    saber_stats_b["打率"] = saber_stats_b.apply(lambda x: x["is_hit"]/x["is_ab"] if x["is_ab"]>0 else 0, axis=1)
-                    saber_stats_b["出塁率"] = saber_stats_b.apply(lambda x: (x["is_hit"] + x["is_bb"]) / x["PA"] if x["PA"] > 0 else 0, axis=1)
-                    saber_stats_b["TotalBases"] = saber_stats_b["is_1b"] + (saber_stats_b["is_2b"] * 2) + (saber_stats_b["is_3b"] * 3) + (saber_stats_b["is_hr"] * 4)
-                    saber_stats_b["長打率"] = (saber_stats_b["TotalBases"] / saber_stats_b["is_ab"]).fillna(0)
+                    saber_stats_b["TotalBases"] = metrics.total_bases(saber_stats_b["is_1b"], saber_stats_b["is_2b"], saber_stats_b["is_3b"], saber_stats_b["is_hr"])
+                    saber_stats_b["打率"] = metrics.batting_avg(saber_stats_b["is_hit"], saber_stats_b["is_ab"])
+                    saber_stats_b["出塁率"] = metrics.on_base_pct(saber_stats_b["is_hit"], saber_stats_b["is_bb"], saber_stats_b["PA"])
+                    saber_stats_b["長打率"] = metrics.slugging_pct(saber_stats_b["TotalBases"], saber_stats_b["is_ab"])
                     saber_stats_b["OPS"] = saber_stats_b["出塁率"] + saber_stats_b["長打率"]
 
                     # RC (得点創出)
-                    saber_stats_b["RC"] = saber_stats_b.apply(
-                        lambda x: ((x["is_hit"] + x["is_bb"]) * x["TotalBases"]) / (x["is_ab"] + x["is_bb"])
-                        if (x["is_ab"] + x["is_bb"]) > 0 else 0, axis=1
-                    )
+                    saber_stats_b["RC"] = metrics.runs_created(saber_stats_b["is_hit"], saber_stats_b["is_bb"], saber_stats_b["TotalBases"], saber_stats_b["is_ab"])
 
             # 2. 選手ごとの投手スタッツを集計
             saber_stats_p = pd.DataFrame()
             if not df_p_target.empty:
                 df_p_saber = df_p_target.copy()
                 if not df_p_saber.empty:
-                    saber_stats_p = df_p_saber.groupby("選手名").agg(agg_rules_p).reset_index()
+                    saber_stats_p = df_p_saber.groupby("選手名", observed=True).agg(AGG_RULES_P).reset_index()
                     saber_stats_p["投球回"] = saber_stats_p["アウト数"] / 3
                     saber_stats_p["投手_勝利"] = saber_stats_p["is_win"]
-                    saber_stats_p["投手_防御率"] = saber_stats_p.apply(lambda x: (x["自責点"] * 7) / x["投球回"] if x["投球回"] > 0 else 99.0, axis=1)
+                    saber_stats_p["投手_防御率"] = metrics.era(saber_stats_p["自責点"], saber_stats_p["アウト数"], default=99.0)
                     saber_stats_p["投手_奪三振"] = saber_stats_p["is_so"] + saber_stats_p["奪三振"]
 
             # 3. 選手ごとの守備スタッツを集計（捕手守備機会の別枠集計を追加）
@@ -936,7 +912,7 @@ def show_personal_stats(df_batting, df_pitching):
                         
                         group_keys = ["Original_Idx", "FielderName", "FielderPos"]
 
-                        fld_unique = fld_expanded.groupby(group_keys).agg(
+                        fld_unique = fld_expanded.groupby(group_keys, observed=True).agg(
                             is_error=("is_error", "max")
                         ).reset_index()
                         
@@ -945,27 +921,20 @@ def show_personal_stats(df_batting, df_pitching):
                             失策数=("is_error", "sum"),
                             捕手守備機会=("FielderPos", lambda x: (x == "捕").sum())
                         ).reset_index()
-                        stats_f_agg["守備率"] = stats_f_agg.apply(lambda x: (x["守備機会"] - x["失策数"]) / x["守備機会"] if x["守備機会"] > 0 else 1.0, axis=1)
+                        stats_f_agg["守備率"] = metrics.fielding_pct(stats_f_agg["守備機会"], stats_f_agg["失策数"])
                         saber_stats_f = stats_f_agg.rename(columns={"FielderName": "選手名"})
 
             # 4. 選手ごとの試合参加数を集計
             saber_stats_g = pd.DataFrame()
             df_all_logs = pd.concat([df_b_target, df_p_target], ignore_index=True) if not df_b_target.empty or not df_p_target.empty else pd.DataFrame()
             if not df_all_logs.empty:
-                for col in ["日付", "試合種別", "選手名"]:
-                    if col in df_all_logs.columns:
-                        df_all_logs[col] = df_all_logs[col].fillna("").astype(str).str.strip()
-                if "対戦相手" in df_all_logs.columns:
-                    df_all_logs["対戦相手"] = df_all_logs["対戦相手"].fillna("").astype(str).str.strip()
-                else:
-                    df_all_logs["対戦相手"] = ""
+                df_all_logs["選手名"] = df_all_logs["選手名"].fillna("").astype(str)
 
                 df_all_logs = df_all_logs[df_all_logs["選手名"] != "チーム記録"]
-                df_all_logs["Game_ID"] = df_all_logs["日付"] + "_" + df_all_logs["対戦相手"] + "_" + df_all_logs["試合種別"]
                 df_valid_games = df_all_logs.copy()
                 
                 if not df_valid_games.empty:
-                    game_counts = df_valid_games.groupby("選手名")["Game_ID"].nunique().reset_index(name="試合参加数")
+                    game_counts = df_valid_games.groupby("選手名", observed=True)["game_id"].nunique().reset_index(name="試合参加数")
                     saber_stats_g = game_counts
 
             # 5. すべてのデータを「選手名」でマージ
@@ -997,41 +966,17 @@ def show_personal_stats(df_batting, df_pitching):
                 # ==========================================
                 # 6. 部門別貢献度 ＆ 総合MVPスコアの算出（バランス調整＆投手純粋評価版）
                 # ==========================================
-                def calc_batting_score(row):
-                    return (row.get("OPS", 0) * 50.0) + (row.get("RC", 0) * 3.0) + (row.get("盗塁", 0) * 1.0)
+                def saber_col(name, default=0.0):
+                    return merged_saber[name] if name in merged_saber.columns else default
 
-                def calc_pitching_score(row):
-                    p_inn = row.get("投球回", 0)
-                    p_era = row.get("投手_防御率", 99.0)
-                    p_so = row.get("投手_奪三振", 0)
-                    
-                    if p_inn <= 0 or p_era >= 90:
-                        return 0.0
-                    
-                    inn_pts = p_inn * 1.0
-                    so_pts = p_so * 0.3
-                    
-                    if p_era <= 3.50:
-                        era_pts = (3.50 - p_era) * p_inn * 0.5
-                    else:
-                        era_pts = (3.50 - p_era) * p_inn * 0.2
-                    
-                    total_score = inn_pts + so_pts + era_pts
-                    return max(0.0, total_score)
-
-                def calc_defense_score(row):
-                    f_opp = row.get("守備機会", 0)
-                    f_err = row.get("失策数", 0)
-                    f_pct = row.get("守備率", 1.0)
-                    catcher_opp = row.get("捕手守備機会", 0)
-                    
-                    non_catcher_opp = max(0, f_opp - catcher_opp)
-                    defense_pts = (non_catcher_opp * 1.0 + catcher_opp * 2.5) * f_pct - (f_err * 2.0)
-                    return max(0.0, defense_pts)
+                merged_saber["Batting_Score"] = (saber_col("OPS") * 50.0) + (saber_col("RC") * 3.0) + (saber_col("盗塁") * 1.0)
+                merged_saber["Pitching_Score"] = metrics.pitching_score(saber_col("投球回"), saber_col("投手_防御率", 99.0), saber_col("投手_奪三振"))
 
-                merged_saber["Batting_Score"] = merged_saber.apply(calc_batting_score, axis=1)
-                merged_saber["Pitching_Score"] = merged_saber.apply(calc_pitching_score, axis=1)
-                merged_saber["Defense_Score"] = merged_saber.apply(calc_defense_score, axis=1)
+                # 捕手の守備機会は 2.5 倍で評価し、失策は 1 つにつき 2 点減点
+                catcher_opp = saber_col("捕手守備機会")
+                non_catcher_opp = np.maximum(0, saber_col("守備機会") - catcher_opp)
+                defense_pts = (non_catcher_opp * 1.0 + catcher_opp * 2.5) * saber_col("守備率", 1.0) - (saber_col("失策数") * 2.0)
+                merged_saber["Defense_Score"] = np.maximum(0.0, defense_pts)
                 merged_saber["Game_Score"] = merged_saber.get("試合参加数", 0) * 1.0
 
                 # チーム全体で守備機会を持つ人が一人でもいるか判定
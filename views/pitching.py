@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
-from streamlit_gsheets import GSheetsConnection
-from config.settings import SPREADSHEET_URL, MY_TEAM
+from config.settings import MY_TEAM
+from utils.db import update_cells, make_game_id
+from utils.dataset import date_rows, game_rows
+from utils.game_state import batting_game_state, pitching_game_state
+from utils.write_queue import enqueue_rows
+from utils.cache_registry import invalidate
 from utils.players import get_active_players
 from utils.ui import fmt_player_name
-from utils.ui import render_scoreboard, render_out_indicator_3
+from utils.ui import render_scoreboard, render_out_indicator_3, render_write_status
 import re
 
 def local_fmt(name):
@@ -18,14 +22,13 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
     ws_pitching = "投手成績"
     is_kagura_top = (kagura_order == "先攻 (表)")
 
-    conn = st.connection("gsheets", type=GSheetsConnection)
-
-    # フィルタリング
-    today_batting_df = df_batting[df_batting["日付"].astype(str) == selected_date_str] if not df_batting.empty and "日付" in df_batting.columns else pd.DataFrame()
-    today_pitching_df = df_pitching[df_pitching["日付"].astype(str) == selected_date_str] if not df_pitching.empty and "日付" in df_pitching.columns else pd.DataFrame()
+    # フィルタリング（その日の行は date_str の索引から直接引く）
+    today_batting_df = date_rows("batting", selected_date_str) if not df_batting.empty else pd.DataFrame()
+    today_pitching_df = date_rows("pitching", selected_date_str) if not df_pitching.empty else pd.DataFrame()
     
     scoreboard_df = today_batting_df[today_batting_df["イニング"] != "まとめ入力"] if not today_batting_df.empty and "イニング" in today_batting_df.columns else df_batting
     render_scoreboard(scoreboard_df, today_pitching_df, selected_date_str, match_type, ground_name, opp_team, is_kagura_top)
+    render_write_status()
 
     # ---------------------------------------------------------
     # 詳細入力モード (1打席ごと)
@@ -81,9 +84,9 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
 
     # --- 成績計算ロジック ---
     current_season_pitching = {}
-    if not df_pitching.empty and "日付" in df_pitching.columns:
+    if not df_pitching.empty and "Year" in df_pitching.columns:
         target_year = str(pd.to_datetime(selected_date_str).year)
-        df_p_season = df_pitching[pd.to_datetime(df_pitching["日付"], errors='coerce').dt.year.astype(str) == target_year].copy()
+        df_p_season = df_pitching[df_pitching["Year"] == target_year].copy()
         for p in ALL_PLAYERS:
             p_df = df_p_season[(df_p_season.get("投手名") == p) | (df_p_season.get("選手名") == p)]
             p_key = local_fmt(p)
@@ -108,13 +111,13 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
     inn_options = [f"{i}回{p_inning_suffix}" for i in range(1, 10)] + [f"延長{p_inning_suffix}"]
     current_inn_val = st.session_state.get("p_det_inn", f"1回{p_inning_suffix}")
     
-    current_outs_total = 0
-    if not today_pitching_df.empty and "イニング" in today_pitching_df.columns:
-        p_inn_df_check = today_pitching_df[today_pitching_df["イニング"] == current_inn_val]
-        single_out_list = ["三振", "凡退(ゴロ)", "凡退(フライ)", "犠打(ゴロ)", "犠打(フライ)", "犠飛", "野選", "牽制死", "盗塁死", "走塁死", "振り逃げ三振"]
-        single_outs = len(p_inn_df_check[p_inn_df_check["結果"].isin(single_out_list)]) if "結果" in p_inn_df_check.columns else 0
-        double_outs = len(p_inn_df_check[p_inn_df_check["結果"] == "併殺打"]) * 2 if "結果" in p_inn_df_check.columns else 0
-        current_outs_total = single_outs + double_outs
+    # 守備位置 → 守っている選手は、打撃入力と同じ試合の状態（スタメン・交代・守備変更から更新）を使う
+    game_id = make_game_id(selected_date_str, opp_team, match_type)
+    fielders = batting_game_state(game_id, game_rows("batting", game_id)).fielders
+
+    # イニングごとのアウト数・失点・走者は、増えた行だけを取り込んで数え直さない
+    p_state = pitching_game_state(selected_date_str, today_pitching_df)
+    current_outs_total = p_state.outs(current_inn_val)
 
     if current_outs_total >= 3:
         try:
@@ -143,14 +146,9 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
             st.session_state["p_det_inn"] = current_inn
         
         with c_outs:
-            disp_outs = 0
-            if not today_pitching_df.empty and "イニング" in today_pitching_df.columns:
-                p_inn_df_disp = today_pitching_df[today_pitching_df["イニング"] == current_inn]
-                single_out_list = ["三振", "凡退(ゴロ)", "凡退(フライ)", "犠打(ゴロ)", "犠打(フライ)", "犠飛", "野選", "牽制死", "盗塁死", "走塁死", "振り逃げ三振"]
-                s_outs = len(p_inn_df_disp[p_inn_df_disp["結果"].isin(single_out_list)]) if "結果" in p_inn_df_disp.columns else 0
-                d_outs = len(p_inn_df_disp[p_inn_df_disp["結果"] == "併殺打"]) * 2 if "結果" in p_inn_df_disp.columns else 0
-                disp_outs = (s_outs + d_outs) % 3
+            disp_outs = p_state.outs(current_inn) % 3
             st.markdown(render_out_indicator_3(disp_outs), unsafe_allow_html=True)
+            st.caption(f"走者 {p_state.runners(current_inn)}人 ・ このイニングの失点 {p_state.runs(current_inn)}")
 
         st.divider()
 
@@ -167,20 +165,7 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
             # セッションに値がない、またはリストに含まれない場合は打順・スタメンから自動取得を試みる
             current_p = st.session_state.get("p_det_pitcher")
             if not current_p or current_p not in ALL_PLAYERS:
-                def_pitcher = ""
-                if not today_batting_df.empty and "守備位置" in today_batting_df.columns:
-                    latest_pitcher_rows = today_batting_df[today_batting_df["守備位置"] == "投"]
-                    if not latest_pitcher_rows.empty:
-                        def_pitcher = str(latest_pitcher_rows.iloc[-1]["選手名"])
-                if not def_pitcher:
-                    lineup = st.session_state.get("saved_lineup")
-                    if isinstance(lineup, dict):
-                        for i in range(20):
-                            if lineup.get(f"pos_{i}") == "投":
-                                raw_name = lineup.get(f"name_{i}", "")
-                                if raw_name:
-                                    def_pitcher = str(raw_name).split(" (")[0]
-                                break
+                def_pitcher = fielders.get("投", "")
                 if not def_pitcher:
                     def_pitcher = str(st.session_state.get("shared_starting_pitcher", ""))
                 
@@ -208,21 +193,8 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
             
             current_c = st.session_state.get("p_det_catcher")
             if not current_c or current_c not in ALL_PLAYERS:
-                def_catcher = ""
-                if not today_batting_df.empty and "守備位置" in today_batting_df.columns:
-                    latest_catcher_rows = today_batting_df[today_batting_df["守備位置"] == "捕"]
-                    if not latest_catcher_rows.empty:
-                        def_catcher = str(latest_catcher_rows.iloc[-1]["選手名"])
-                if not def_catcher:
-                    lineup = st.session_state.get("saved_lineup")
-                    if isinstance(lineup, dict):
-                        for i in range(20):
-                            if lineup.get(f"pos_{i}") == "捕":
-                                raw_name = lineup.get(f"name_{i}", "")
-                                if raw_name:
-                                    def_catcher = str(raw_name).split(" (")[0]
-                                break
-                
+                def_catcher = fielders.get("捕", "")
+
                 matched_c = next((p for p in ALL_PLAYERS if p.split(" (")[0].strip() == def_catcher.strip() or p == def_catcher), None)
                 st.session_state["p_det_catcher"] = matched_c if matched_c else None
 
@@ -345,11 +317,11 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
                         st.error("内容を選択してください")
                     else:
                         target_player = dec_p.split(" (")[0]
-                        mask = (df_pitching["日付"].astype(str) == selected_date_str) & (df_pitching["選手名"] == target_player) if not df_pitching.empty and "日付" in df_pitching.columns and "選手名" in df_pitching.columns else pd.Series([False]*len(df_pitching))
+                        mask = (df_pitching["date_str"] == selected_date_str) & (df_pitching["選手名"] == target_player) if not df_pitching.empty and "date_str" in df_pitching.columns and "選手名" in df_pitching.columns else pd.Series([False]*len(df_pitching))
                         if not df_pitching.empty and not df_pitching[mask].empty:
-                            df_pitching.loc[mask, "勝敗"] = dec_t
-                            conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_pitching, data=df_pitching)
-                            st.cache_data.clear()
+                            # 該当行の「勝敗」セルだけを書き換える
+                            update_cells(ws_pitching, df_pitching.index[mask], "勝敗", dec_t)
+                            invalidate("pitching")
                             st.success(f"✅ {target_player} 選手を「{dec_t}」で確定しました！")
                             st.session_state["quick_dec_pitcher"] = None
                             st.session_state["quick_dec_type"] = None
@@ -394,26 +366,8 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
 
             fielder_display = ""
             if target_fielder_pos_list:
-                lineup = st.session_state.get("saved_lineup", {})
-                name_parts = []
-                for pos in target_fielder_pos_list:
-                    found_name = ""
-                    # 1. saved_lineup から検索
-                    for i in range(20):
-                        if lineup.get(f"pos_{i}") == pos:
-                            found_name = lineup.get(f"name_{i}", "").split(" (")[0].strip()
-                            break
-                    
-                    # 2. saved_lineup で見つからない場合、本日のオーダー/打撃データからポジションで検索
-                    if not found_name and not today_batting_df.empty and "守備位置" in today_batting_df.columns:
-                        match_pos = today_batting_df[today_batting_df["守備位置"] == pos]
-                        if not match_pos.empty:
-                            found_name = str(match_pos.iloc[-1]["選手名"]).split(" (")[0].strip()
-
-                    if found_name:
-                        name_parts.append(found_name)
-                    else:
-                        name_parts.append(f"({pos})")  # どちらにも存在しない場合のみ (二) 等にする
+                # 見つからない位置だけ (二) のように位置名で残す
+                name_parts = [fielders.get(pos) or f"({pos})" for pos in target_fielder_pos_list]
                 fielder_display = "-".join(name_parts)
 
             add_outs = 0
@@ -453,19 +407,12 @@ def show_pitching_page(df_batting, df_pitching, selected_date_str, match_type, g
 
             records_to_save = [rec] 
 
-            conn.update(
-                spreadsheet=SPREADSHEET_URL, worksheet=ws_pitching, data=pd.concat([df_pitching, pd.DataFrame(records_to_save)], 
-                ignore_index=True)
-            )
-            st.cache_data.clear()
+            enqueue_rows(ws_pitching, records_to_save)
+            invalidate("pitching")
 
             st.session_state["needs_pitching_form_clear"] = True
             
-            p_inn_df = today_pitching_df[today_pitching_df["イニング"] == current_inn] if not today_pitching_df.empty and "イニング" in today_pitching_df.columns else pd.DataFrame()
-            single_out_list = ["三振", "凡退(ゴロ)", "凡退(フライ)", "犠打(ゴロ)", "犠打(フライ)", "犠飛", "野選", "牽制死", "盗塁死", "走塁死", "振り逃げ三振"]
-            existing_single_outs = len(p_inn_df[p_inn_df["結果"].isin(single_out_list)]) if not p_inn_df.empty and "結果" in p_inn_df.columns else 0
-            existing_double_outs = len(p_inn_df[p_inn_df["結果"] == "併殺打"]) * 2 if not p_inn_df.empty and "結果" in p_inn_df.columns else 0
-            total_outs_after = existing_single_outs + existing_double_outs + add_outs
+            total_outs_after = p_state.outs(current_inn) + add_outs
             
             if total_outs_after >= 3:
                 try:
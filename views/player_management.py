@@ -1,13 +1,13 @@
 import streamlit as st
 import pandas as pd
-from streamlit_gsheets import GSheetsConnection
-from config.settings import SPREADSHEET_URL
+from utils.storage import get_storage
+from utils.cache_registry import invalidate
 
 def show_player_management():
     st.title("👥 登録・管理")
     st.markdown("選手、相手チーム、グラウンドの追加、情報の変更、非表示設定ができます。")
     
-    conn = st.connection("gsheets", type=GSheetsConnection)
+    storage = get_storage()
     
     # 🌟 タブで「選手管理」「相手チーム管理」「グラウンド管理」を切り替え
     tab_player, tab_opponent, tab_ground = st.tabs(["👤 選手管理", "🏟️ 相手チーム管理", "📍 グラウンド管理"])
@@ -19,7 +19,7 @@ def show_player_management():
         ws_name = "選手登録"
         
         try:
-            df_players = conn.read(spreadsheet=SPREADSHEET_URL, worksheet=ws_name)
+            df_players = storage.read(ws_name)
         except Exception:
             st.error("「選手登録」シートが見つかりません。スプレッドシートをご確認ください。")
             return
@@ -56,8 +56,8 @@ def show_player_management():
                         }])
                         updated_df = pd.concat([df_players, new_row], ignore_index=True)
                         try:
-                            conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_name, data=updated_df)
-                            st.cache_data.clear()
+                            storage.update(ws_name, updated_df)
+                            invalidate("players")
                             st.success(f"✅ 選手「{new_name.strip()}」(背番号: {new_num.strip()}) を追加しました！")
                             import time
                             time.sleep(1)
@@ -85,8 +85,8 @@ def show_player_management():
 
         if st.button("💾 選手情報の変更を保存", type="primary", key="save_player_btn"):
             try:
-                conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_name, data=edited_df)
-                st.cache_data.clear()
+                storage.update(ws_name, edited_df)
+                invalidate("players")
                 st.success("✅ 選手情報を更新しました！")
                 import time
                 time.sleep(1)
@@ -101,7 +101,7 @@ def show_player_management():
         ws_opp_name = "相手チーム登録"
         
         try:
-            df_opponents = conn.read(spreadsheet=SPREADSHEET_URL, worksheet=ws_opp_name)
+            df_opponents = storage.read(ws_opp_name)
         except Exception:
             df_opponents = pd.DataFrame(columns=["チーム名"])
 
@@ -125,8 +125,8 @@ def show_player_management():
                         new_opp_row = pd.DataFrame([{"チーム名": new_opp_name.strip()}])
                         updated_opp_df = pd.concat([df_opponents, new_opp_row], ignore_index=True)
                         try:
-                            conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_opp_name, data=updated_opp_df)
-                            st.cache_data.clear()
+                            storage.update(ws_opp_name, updated_opp_df)
+                            invalidate("opponents")
                             st.success(f"✅ 相手チーム「{new_opp_name.strip()}」を追加しました！")
                             import time
                             time.sleep(1)
@@ -151,8 +151,8 @@ def show_player_management():
 
         if st.button("💾 相手チームの変更を保存", type="primary", key="save_opp_btn"):
             try:
-                conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_opp_name, data=edited_opp_df)
-                st.cache_data.clear()
+                storage.update(ws_opp_name, edited_opp_df)
+                invalidate("opponents")
                 st.success("✅ 相手チーム情報を更新しました！")
                 import time
                 time.sleep(1)
@@ -167,7 +167,7 @@ def show_player_management():
         ws_ground_name = "グラウンド登録"
         
         try:
-            df_grounds = conn.read(spreadsheet=SPREADSHEET_URL, worksheet=ws_ground_name)
+            df_grounds = storage.read(ws_ground_name)
         except Exception:
             df_grounds = pd.DataFrame(columns=["グラウンド名"])
 
@@ -191,8 +191,8 @@ def show_player_management():
                         new_g_row = pd.DataFrame([{"グラウンド名": new_ground_name.strip()}])
                         updated_g_df = pd.concat([df_grounds, new_g_row], ignore_index=True)
                         try:
-                            conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_ground_name, data=updated_g_df)
-                            st.cache_data.clear()
+                            storage.update(ws_ground_name, updated_g_df)
+                            invalidate("grounds")
                             st.success(f"✅ グラウンド「{new_ground_name.strip()}」を追加しました！")
                             import time
                             time.sleep(1)
@@ -217,8 +217,8 @@ def show_player_management():
 
         if st.button("💾 グラウンドの変更を保存", type="primary", key="save_ground_btn"):
             try:
-                conn.update(spreadsheet=SPREADSHEET_URL, worksheet=ws_ground_name, data=edited_g_df)
-                st.cache_data.clear()
+                storage.update(ws_ground_name, edited_g_df)
+                invalidate("grounds")
                 st.success("✅ グラウンド情報を更新しました！")
                 import time
                 time.sleep(1)
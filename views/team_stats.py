@@ -2,48 +2,69 @@ import streamlit as st
 import pandas as pd
 from config.settings import OFFICIAL_GAME_TYPES
 from utils.ui import render_scoreboard
+from utils.line_score import load_line_scores, line_score_for, game_key
+from utils.db import make_game_id
+from utils.dataset import game_rows
+from utils.game_state import BattingGameState
 import re
 from utils.players import get_stats_active_players
+from utils.game_summary import load_game_summary
+from utils import metrics
 
-# ★ 集計計算を共通化
-def calc_metrics(df):
+# ★ 集計計算を共通化（列の合計と勝敗の件数から、分割ごとにまとめて計算する）
+METRIC_SUM_COLS = ["得点", "失点", "打数", "安打", "本塁打", "盗塁", "自責点", "投球回", "失策"]
+EMPTY_METRICS = {"games":0, "wins":0, "losses":0, "draws":0, "win_pct":0.0, "avg":0.0, "avg_runs":0.0, "hr":0, "sb":0, "era":0.0, "avg_lost":0.0, "diff":0, "err":0, "total_score":0, "total_lost":0}
+
+def calc_metrics_by(df, by):
+    """試合サマリーを by の列で分割し、分割ごとの集計指標を1行ずつ持つ DataFrame を返す"""
     if df.empty:
-        return {"games":0, "wins":0, "losses":0, "draws":0, "win_pct":0.0, "avg":0.0, "avg_runs":0.0, "hr":0, "sb":0, "era":0.0, "avg_lost":0.0, "diff":0, "err":0, "total_score":0, "total_lost":0}
-    
-    wins = 0; losses = 0; draws = 0
-    total_score = 0; total_lost = 0
-    total_ab = 0; total_hits = 0; total_hr = 0; total_sb = 0; total_er = 0; total_ip = 0.0
-    total_errors = 0
-    
-    for _, row in df.iterrows():
-        s = row.get("得点", 0)
-        l = row.get("失点", 0)
-        total_score += s
-        total_lost += l
-        total_ab += row.get("打数", 0) 
-        total_hits += row.get("安打", 0)
-        total_hr += row.get("本塁打", 0)
-        total_sb += row.get("盗塁", 0)
-        total_er += row.get("自責点", 0)
-        total_ip += row.get("投球回", 0)
-        total_errors += row.get("失策", 0)
-        
-        if s > l: wins += 1
-        elif s < l: losses += 1
-        else: draws += 1
-            
-    total_games = wins + losses + draws
-    return {
-        "games": total_games, "wins": wins, "losses": losses, "draws": draws,
-        "win_pct": wins / total_games if total_games > 0 else 0.0,
-        "avg": total_hits / total_ab if total_ab > 0 else 0.0,
-        "avg_runs": total_score / total_games if total_games > 0 else 0.0,
-        "hr": total_hr, "sb": total_sb,
-        "era": (total_er * 7) / total_ip if total_ip > 0 else 0.0,
-        "avg_lost": total_lost / total_games if total_games > 0 else 0.0,
-        "diff": total_score - total_lost, "err": total_errors,
-        "total_score": total_score, "total_lost": total_lost
-    }
+        return pd.DataFrame(columns=list(EMPTY_METRICS))
+
+    work = df[by].copy()
+    for c in METRIC_SUM_COLS:
+        work[c] = pd.to_numeric(df[c], errors='coerce').fillna(0) if c in df.columns else 0
+    work["wins"] = (work["得点"] > work["失点"]).astype(int)
+    work["losses"] = (work["得点"] < work["失点"]).astype(int)
+    work["draws"] = (work["得点"] == work["失点"]).astype(int)
+
+    t = work.groupby(by, observed=True).sum()
+    games = t["wins"] + t["losses"] + t["draws"]
+    return pd.DataFrame({
+        "games": games, "wins": t["wins"], "losses": t["losses"], "draws": t["draws"],
+        "win_pct": metrics.safe_div(t["wins"], games),
+        "avg": metrics.safe_div(t["安打"], t["打数"]),
+        "avg_runs": metrics.safe_div(t["得点"], games),
+        "hr": t["本塁打"], "sb": t["盗塁"],
+        "era": metrics.safe_div(t["自責点"] * metrics.INNINGS_PER_GAME, t["投球回"]),
+        "avg_lost": metrics.safe_div(t["失点"], games),
+        "diff": t["得点"] - t["失点"], "err": t["失策"],
+        "total_score": t["得点"], "total_lost": t["失点"],
+    })
+
+@st.cache_data(ttl=60)
+def calc_split_metrics(df_games):
+    """年度（通算を含む）× 試合種別（全種別・公式戦トータルを含む）の全組み合わせを一度に集計する"""
+    if df_games.empty:
+        return pd.DataFrame(columns=list(EMPTY_METRICS))
+
+    base = df_games.assign(種別=df_games["試合種別"])
+    splits = [base, base.assign(種別="全種別")]
+    official = base[base["試合種別"].isin(OFFICIAL_GAME_TYPES)]
+    if not official.empty:
+        splits.append(official.assign(種別="公式戦 (トータル)"))
+    by_type = pd.concat(splits, ignore_index=True)
+    by_year = pd.concat([by_type.assign(年度=by_type["Year"]), by_type.assign(年度="通算")], ignore_index=True)
+    return calc_metrics_by(by_year, ["年度", "種別"])
+
+def lookup_metrics(split_metrics, year, game_type):
+    """分割済みの集計表から1つの分割を取り出す（該当試合がなければ None）"""
+    key = (year, game_type)
+    if key not in split_metrics.index:
+        return None
+    row = split_metrics.loc[key].to_dict()
+    for c in ["games", "wins", "losses", "draws"]:
+        row[c] = int(row[c])
+    return row
 
 def show_team_stats(df_batting, df_pitching):
     st.title(" 🏆 チーム成績ダッシュボード")
@@ -53,165 +74,11 @@ def show_team_stats(df_batting, df_pitching):
         st.info("データがまだありません。")
         return
 
-    games_map = {}
-
-    # --- A. 打撃データから集計 ---
-    df_b_work = df_batting.copy()
-    df_b_work["DateStr"] = pd.to_datetime(df_b_work["日付"]).dt.strftime('%Y-%m-%d')
-    
-    for (d_str, opp, m_type), group in df_b_work.groupby(["DateStr", "対戦相手", "試合種別"]):
-        team_rec_rows = group[group["選手名"] == "チーム記録"]
-        if not team_rec_rows.empty:
-            runs = pd.to_numeric(team_rec_rows["得点"], errors='coerce').fillna(0).sum()
-            is_team_record = True
-        else:
-            valid_batting = group[group["イニング"] != "まとめ入力"]
-            runs = pd.to_numeric(valid_batting["得点"], errors='coerce').fillna(0).sum()
-            is_team_record = False
-
-        individuals = group[group["選手名"] != "チーム記録"]
-        total_hits = 0; total_ab = 0; total_hr = 0; total_sb = 0
-
-        if not individuals.empty:
-            ab_results = [
-                "単打", "二塁打", "三塁打", "本塁打", "三振", 
-                "凡退", "失策", "併殺打", "野選", "振り逃げ三振", "犠飛"
-            ]
-            hit_results = ["単打", "二塁打", "三塁打", "本塁打", "安打"]
-
-            for _, row in individuals.iterrows():
-                res_str = str(row.get("結果", "")).strip()
-                
-                ab_val = pd.to_numeric(row.get("打数", 0), errors='coerce')
-                hits_val = pd.to_numeric(row.get("安打", 0), errors='coerce')
-                hr_val = pd.to_numeric(row.get("本塁打", 0), errors='coerce')
-                sb_val = pd.to_numeric(row.get("盗塁", 0), errors='coerce')
-                
-                ab = int(ab_val) if pd.notna(ab_val) else 0
-                hits = int(hits_val) if pd.notna(hits_val) else 0
-                hr = int(hr_val) if pd.notna(hr_val) else 0
-                sb = int(sb_val) if pd.notna(sb_val) else 0
-                
-                if ab > 0 or hits > 0:
-                    total_ab += ab
-                    total_hits += hits
-                    total_hr += hr
-                    total_sb += sb
-                else:
-                    if res_str in ab_results or "凡退" in res_str or "失策" in res_str:
-                        total_ab += 1
-                    
-                    if res_str in hit_results:
-                        total_hits += 1
-                        if res_str == "本塁打":
-                            total_hr += 1
-                    
-                    total_sb += sb
-
-        top_bottom = "不明"
-        if "イニング" in group.columns:
-            innings = group["イニング"].dropna().astype(str).tolist()
-            if any("表" in i for i in innings):
-                top_bottom = "先攻"
-            elif any("裏" in i for i in innings):
-                top_bottom = "後攻"
-        
-        if top_bottom == "不明" and is_team_record:
-            p_info = str(team_rec_rows.iloc[0].get("位置", ""))
-            if "後攻" in p_info or "裏" in p_info:
-                top_bottom = "後攻"
-            elif "先攻" in p_info or "表" in p_info:
-                top_bottom = "先攻"
-
-        gr = group["グラウンド"].iloc[0] if not group.empty else ""
-        key = (d_str, opp, m_type)
-
-        if key not in games_map:
-            games_map[key] = {
-                "日付": d_str, "対戦相手": opp, "試合種別": m_type, "グラウンド": gr,
-                "先攻後攻": top_bottom,
-                "得点": 0, "失点": 0, "打数": 0, "安打": 0, "本塁打": 0, "盗塁": 0,
-                "自責点": 0, "投球回": 0.0, "失策": 0,
-                "has_team_record": False
-            }
-        
-        games_map[key]["得点"] = runs
-        games_map[key]["打数"] = total_ab
-        games_map[key]["安打"] = total_hits
-        games_map[key]["本塁打"] = total_hr
-        games_map[key]["盗塁"] = total_sb
-        games_map[key]["先攻後攻"] = top_bottom
-        if is_team_record:
-            games_map[key]["has_team_record"] = True
-
-    # --- B. 投手データから集計 ---
-    df_p_work = df_pitching.copy()
-    df_p_work["DateStr"] = pd.to_datetime(df_p_work["日付"]).dt.strftime('%Y-%m-%d')
-
-    for (d_str, opp, m_type), group in df_p_work.groupby(["DateStr", "対戦相手", "試合種別"]):
-        team_rec_rows = group[group["選手名"] == "チーム記録"]
-        if not team_rec_rows.empty:
-            runs_allowed = pd.to_numeric(team_rec_rows["失点"], errors='coerce').fillna(0).sum()
-            col_errors = pd.to_numeric(team_rec_rows["失策"], errors='coerce').fillna(0).sum() if "失策" in team_rec_rows.columns else 0
-        else:
-            runs_allowed = pd.to_numeric(group["失点"], errors='coerce').fillna(0).sum()
-            col_errors = pd.to_numeric(group["失策"], errors='coerce').fillna(0).sum() if "失策" in group.columns else 0
-            
-        res_errors = group["結果"].astype(str).str.contains("失策").sum() if "結果" in group.columns else 0
-        errors = col_errors + res_errors
-
-        if "投手名" in group.columns:
-            individuals_p = group[group["投手名"] != "チーム記録"]
-        else:
-            individuals_p = group[group["選手名"] != "チーム記録"]
-
-        er = 0; outs = 0.0
-        if not individuals_p.empty:
-            if "自責点" in individuals_p.columns:
-                er = pd.to_numeric(individuals_p["自責点"], errors='coerce').fillna(0).sum()
-            
-            if "アウト数" in individuals_p.columns:
-                total_outs = pd.to_numeric(individuals_p["アウト数"], errors='coerce').fillna(0).sum()
-                outs = total_outs / 3
-            elif "投球回" in individuals_p.columns:
-                outs = pd.to_numeric(individuals_p["投球回"], errors='coerce').fillna(0).sum()
-
-        key = (d_str, opp, m_type)
-        if key not in games_map:
-            gr = group["グラウンド"].iloc[0] if not group.empty else ""
-            games_map[key] = {
-                "日付": d_str, "対戦相手": opp, "試合種別": m_type, "グラウンド": gr,
-                "先攻後攻": "不明",
-                "得点": 0, "失点": 0, "打数": 0, "安打": 0, "本塁打": 0, "盗塁": 0,
-                "自責点": 0, "投球回": 0.0, "失策": 0,
-                "has_team_record": False
-            }
-            
-        if games_map[key]["先攻後攻"] == "不明":
-            tb_pitch = "不明"
-            if "イニング" in group.columns:
-                innings = group["イニング"].dropna().astype(str).tolist()
-                if any("表" in i for i in innings):
-                    tb_pitch = "後攻"
-                elif any("裏" in i for i in innings):
-                    tb_pitch = "先攻"
-            games_map[key]["先攻後攻"] = tb_pitch
-        
-        games_map[key]["失点"] = runs_allowed
-        games_map[key]["自責点"] += er
-        games_map[key]["投球回"] += outs
-        games_map[key]["失策"] = errors
-
-    match_results = list(games_map.values())
-    df_team_stats = pd.DataFrame(match_results)
-
-    if not df_team_stats.empty:
-        df_team_stats["日付"] = pd.to_datetime(df_team_stats["日付"])
-        df_team_stats = df_team_stats.sort_values("日付", ascending=False)
+    # 試合単位の集計（得点・失点・先攻後攻など）は共通のサマリーテーブルを使う
+    df_team_stats = load_game_summary().copy()
 
     # 2. フィルタリング
     if not df_team_stats.empty:
-        df_team_stats["Year"] = df_team_stats["日付"].dt.year.astype(str)
         all_years = sorted(list(df_team_stats["Year"].unique()), reverse=True)
         
         c_filter1, c_filter2 = st.columns(2)
@@ -226,46 +93,39 @@ def show_team_stats(df_batting, df_pitching):
             target_type = st.selectbox("試合種別", all_types, key="team_stats_type")
             
         df_display = df_team_stats.copy()
-        prev_display = pd.DataFrame()
+        prev_year_str = None
 
         if target_year != "通算":
             df_display = df_display[df_display["Year"] == target_year]
             prev_year_str = str(int(target_year) - 1)
-            prev_display = df_team_stats[df_team_stats["Year"] == prev_year_str]
 
         if target_type == "全種別": pass
         elif target_type == "公式戦 (トータル)":
             df_display = df_display[df_display["試合種別"].isin(OFFICIAL_GAME_TYPES)]
-            if not prev_display.empty:
-                prev_display = prev_display[prev_display["試合種別"].isin(OFFICIAL_GAME_TYPES)]
         else:
             df_display = df_display[df_display["試合種別"] == target_type]
-            if not prev_display.empty:
-                prev_display = prev_display[prev_display["試合種別"] == target_type]
+
+        split_metrics = calc_split_metrics(df_team_stats)
+        curr = lookup_metrics(split_metrics, target_year, target_type) or dict(EMPTY_METRICS)
+        prev = lookup_metrics(split_metrics, prev_year_str, target_type) if prev_year_str else None
     else:
         df_display = pd.DataFrame()
-        prev_display = pd.DataFrame()
+        curr = dict(EMPTY_METRICS)
+        prev = None
 
     st.divider()
 
     # 3. 集計 & メトリクス
-    curr = calc_metrics(df_display)
-    prev = calc_metrics(prev_display)
-    
     viewer_options = []
     if not df_display.empty:
-        for index, row in df_display.iterrows():
-            s = row["得点"]; l = row["失点"]
-            res_txt = "-"
-            if s > l: res_txt = " 🔴 勝ち"
-            elif s < l: res_txt = " 🔵 敗け"
-            else: res_txt = " △ 引き分け"
-            df_display.at[index, "勝敗"] = res_txt
-            d_str = row["日付"].strftime('%Y-%m-%d')
-            label = f"{d_str} vs {row['対戦相手']} ({res_txt}) - {row['試合種別']}"
-            viewer_options.append(label)
-
-    has_prev = not prev_display.empty
+        df_display["勝敗"] = df_display["Result"].map({"Win": " 🔴 勝ち", "Lose": " 🔵 敗け", "Draw": " △ 引き分け"})
+        viewer_options = (
+            df_display["日付"].dt.strftime('%Y-%m-%d') + " vs " + df_display["対戦相手"].astype(str)
+            + " (" + df_display["勝敗"] + ") - " + df_display["試合種別"].astype(str)
+        ).tolist()
+
+    has_prev = prev is not None
+    prev = prev or dict(EMPTY_METRICS)
     
     m1, m2, m3, m4, m5 = st.columns(5)
     m1.metric("試合数", f"{curr['games']}", delta=int(curr['games'] - prev['games']) if has_prev else None)
@@ -291,7 +151,7 @@ def show_team_stats(df_batting, df_pitching):
     # 4. 試合履歴
     st.subheader(" 📋  試合履歴")
     if not df_display.empty:
-        df_display["日付"] = pd.to_datetime(df_display["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
+        df_display["日付"] = df_display["日付"].dt.strftime('%Y-%m-%d')
         cols = ["日付", "対戦相手", "先攻後攻", "得点", "失点", "失策", "勝敗", "試合種別", "グラウンド"]
         st.dataframe(df_display[cols], use_container_width=True, hide_index=True)
     else:
@@ -330,7 +190,7 @@ def show_team_stats(df_batting, df_pitching):
 
             if target_date_str:
                 matched_rows = df_display[
-                    (pd.to_datetime(df_display["日付"], errors='coerce').dt.strftime('%Y-%m-%d') == target_date_str) & 
+                    (df_display["日付"] == target_date_str) & 
                     (df_display["対戦相手"] == target_opp)
                 ]
                 
@@ -339,27 +199,13 @@ def show_team_stats(df_batting, df_pitching):
                     return
                 
                 target_row = matched_rows.iloc[0]
-                has_team_rec = target_row["has_team_record"]
                 tb_val = target_row.get("先攻後攻", "不明")
                 target_m_type = target_row.get("試合種別", "")
 
-                df_b_filtered = df_batting.copy()
-                df_b_filtered["DateStr"] = pd.to_datetime(df_b_filtered["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
-                
-                df_p_filtered = df_pitching.copy()
-                df_p_filtered["DateStr"] = pd.to_datetime(df_p_filtered["日付"], errors='coerce').dt.strftime('%Y-%m-%d')
-
-                match_bat = df_b_filtered[
-                    (df_b_filtered["DateStr"] == target_date_str) & 
-                    (df_b_filtered["対戦相手"] == target_opp) & 
-                    (df_b_filtered["試合種別"] == target_m_type)
-                ].copy()
-                
-                match_pit = df_p_filtered[
-                    (df_p_filtered["DateStr"] == target_date_str) & 
-                    (df_p_filtered["対戦相手"] == target_opp) & 
-                    (df_p_filtered["試合種別"] == target_m_type)
-                ].copy()
+                # 選んだ試合の行は game_id の索引から直接引く
+                target_game_id = make_game_id(target_date_str, target_opp, target_m_type)
+                match_bat = game_rows("batting_stats", target_game_id)
+                match_pit = game_rows("pitching", target_game_id)
 
                 if tb_val == "先攻":
                     detected_top = True
@@ -375,40 +221,13 @@ def show_team_stats(df_batting, df_pitching):
                 opp_errors = match_bat["結果"].astype(str).str.contains("失策").sum()
                 my_errors = target_row.get("失策", 0)
 
-                if has_team_rec:
-                    sb_bat = match_bat[match_bat["選手名"] == "チーム記録"].copy()
-                    sb_pit = match_pit[match_pit["選手名"] == "チーム記録"].copy()
-                    
-                    sb_pit["失策"] = 0
-                    if not sb_pit.empty:
-                        sb_pit.iloc[0, sb_pit.columns.get_loc("失策")] = my_errors
-                        
-                    sb_bat["失策"] = 0
-                    if not sb_bat.empty:
-                        sb_bat.iloc[0, sb_bat.columns.get_loc("失策")] = opp_errors
-                else:
-                    sb_bat = match_bat.copy()
-                    sb_pit = match_pit.copy()
-                    
-                    if "失策" not in sb_pit.columns:
-                        sb_pit["失策"] = 0
-                    else:
-                        sb_pit["失策"] = 0
-                        
-                    if not sb_pit.empty:
-                        sb_pit.iloc[0, sb_pit.columns.get_loc("失策")] = my_errors
-                        
-                    if "失策" not in sb_bat.columns:
-                        sb_bat["失策"] = 0
-                    else:
-                        sb_bat["失策"] = 0
-                        
-                    if not sb_bat.empty:
-                        sb_bat.iloc[0, sb_bat.columns.get_loc("失策")] = opp_errors
+                # イニング別得点・安打は全試合分をまとめて作ったラインスコア表から引く
+                # （チーム記録がある試合はチーム記録の行だけで集計済み）
+                line = line_score_for(load_line_scores(), game_key(target_date_str, target_opp, target_m_type))
 
                 st.markdown("<div id='viewer-top' style='scroll-margin-top: 100px;'></div>", unsafe_allow_html=True)
 
-                render_scoreboard(sb_bat, sb_pit, target_date_str, target_row["試合種別"], target_row["グラウンド"], target_opp, is_top_first=detected_top)
+                render_scoreboard(match_bat, match_pit, target_date_str, target_row["試合種別"], target_row["グラウンド"], target_opp, is_top_first=detected_top, line=line, errors=(my_errors, opp_errors))
 
                 st.divider()
                 st.markdown("#### 🏏  打撃成績")
@@ -436,13 +255,13 @@ def show_team_stats(df_batting, df_pitching):
 
                     if not df_active.empty:
                         summary_list = []
+                        bat_state = BattingGameState(target_game_id).sync(match_bat)
                         df_active["選手名_統一"] = df_active["選手名"].astype(str).str.replace(r'[\s ]+', '', regex=True)
                         
                         for player_key, player_group in df_active.groupby("選手名_統一", sort=False):
                             player_name = player_group["選手名"].iloc[0]
                             order_val = player_group["打順"].iloc[0] if "打順" in player_group.columns else ""
                             
-                            pos_col = "守備位置" if "守備位置" in player_group.columns else ("守備" if "守備" in player_group.columns else ("位置" if "位置" in player_group.columns else None))
                             seen_pos = []
                             pos_map = {"1":"投", "2":"捕", "3":"一", "4":"二", "5":"三", "6":"遊", "7":"左", "8":"中", "9":"右", "10":"指", "DH":"指"}
 
@@ -454,10 +273,9 @@ def show_team_stats(df_batting, df_pitching):
 
                             events = []
 
-                            if pos_col:
-                                for _, row in player_group.iterrows():
-                                    inn = str(row.get("イニング", ""))
-                                    p_val = str(row.get(pos_col, ""))
+                            # 打撃側の守備位置は試合の状態に選手ごとに記録済み
+                            for name in player_group["選手名"].astype(str).str.strip().unique():
+                                for inn, p_val in bat_state.position_log.get(name, []):
                                     events.append({"inning": inn, "order": get_inn_order(inn), "pos": p_val, "source": "batting"})
 
                             for _, row in match_pit.iterrows():
@@ -558,7 +376,7 @@ def show_team_stats(df_batting, df_pitching):
 
                         df_summary = pd.DataFrame(summary_list)
                         
-                        first_app = df_batting.reset_index().groupby("選手名")["index"].min()
+                        first_app = df_batting.reset_index().groupby("選手名", observed=True)["index"].min()
                         if "選手名" in df_summary.columns:
                             df_summary["登場順"] = df_summary["選手名"].map(first_app)
                         else: